@@ -6,15 +6,16 @@ from quantopian.pipeline.data import morningstar
 from quantopian.pipeline.filters.morningstar import Q1500US
 from quantopian.pipeline.factors.eventvestor import BusinessDaysUntilNextEarnings, BusinessDaysSincePreviousEarnings
 
+# The number of days before/after an announcement that you want to avoid an earnings call for.
+AVOID_EARNINGS_DAYS = 1
+
 def make_pipeline():
     """
     Risk Framework
     """
     ne = BusinessDaysUntilNextEarnings()
     pe = BusinessDaysSincePreviousEarnings()
-    # The number of days before/after an announcement that you want to avoid an earnings call for.
-    avoid_earnings_days = 1
-    does_not_have_earnings = ((ne.isnan() | (ne > avoid_earnings_days)) & (pe > avoid_earnings_days))
+    does_not_have_earnings = ((ne.isnan() | (ne > AVOID_EARNINGS_DAYS)) & (pe > AVOID_EARNINGS_DAYS))
     """
     End of Risk Framework
     """
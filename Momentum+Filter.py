@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 
 from quantopian.algorithm import attach_pipeline, pipeline_output
+import quantopian.optimize as opt
 from quantopian.pipeline import Pipeline
 from quantopian.pipeline.classifiers.morningstar import Sector
 from quantopian.pipeline.data import morningstar as mstar
@@ -12,11 +13,72 @@ from quantopian.pipeline.factors.eventvestor import BusinessDaysUntilNextEarning
 class CrossSectionalMomentum(CustomFactor):
     inputs = [USEquityPricing.close]
     window_length = 252
+    # Number of days used for each momentum ratio (prices / prices.shift(lag)).
+    lag = 100
 
     def compute(self, today, assets, out, prices):
-        prices = pd.DataFrame(prices)
-        R = (prices / prices.shift(100))
-        out[:] = (R.T - R.T.mean()).T.mean()
+        self.init(today, assets, out, prices)
+
+    def init(self, today, assets, out, prices):
+        # Full pass over the window: one ratio per (day, asset) without building any DataFrames.
+        ratios = np.empty((prices.shape[0] - self.lag, prices.shape[1]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(prices[self.lag:], prices[:-self.lag], out=ratios)
+        for row in ratios:
+            self._demean(row)
+        valid = ~np.isnan(ratios)
+        state = {
+            'ratios': ratios,
+            'sums': np.where(valid, ratios, 0.0).sum(axis=0),
+            'counts': valid.sum(axis=0),
+            'pos': 0,
+            # The last `lag` closes, oldest first once rotated by 'close_pos'.
+            'closes': np.array(prices[-self.lag:], dtype=np.float64),
+            'close_pos': 0,
+        }
+        self._write(state, out)
+        return state
+
+    def update(self, state, today, assets, out, entering, leaving):
+        # O(N) step: the window rolled forward one day over the same assets, so
+        # only the newest ratio enters and the oldest one leaves.
+        close = entering[0]
+        closes = state['closes']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            row = close / closes[state['close_pos']]
+        closes[state['close_pos']] = close
+        state['close_pos'] = (state['close_pos'] + 1) % len(closes)
+        self._demean(row)
+        # Swap the oldest ratio row out of the ring buffer and the newest one in.
+        ratios = state['ratios']
+        oldest = ratios[state['pos']]
+        valid = ~np.isnan(oldest)
+        state['sums'] -= np.where(valid, oldest, 0.0)
+        state['counts'] -= valid
+        oldest[:] = row
+        valid = ~np.isnan(row)
+        state['sums'] += np.where(valid, row, 0.0)
+        state['counts'] += valid
+        state['pos'] = (state['pos'] + 1) % len(ratios)
+        if state['pos'] == 0:
+            # Re-sum once per full turn of the ring so floating point drift stays bounded.
+            state['sums'] = np.where(np.isnan(ratios), 0.0, ratios).sum(axis=0)
+        self._write(state, out)
+        return state
+
+    @staticmethod
+    def _demean(row):
+        # Subtract the cross-sectional mean of the day, skipping missing ratios like pandas does.
+        valid = ~np.isnan(row)
+        count = valid.sum()
+        if count:
+            row -= np.where(valid, row, 0.0).sum() / count
+
+    @staticmethod
+    def _write(state, out):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(state['sums'], state['counts'], out=out)
+        out[state['counts'] == 0] = np.nan
 
 def make_pipeline():
 """
@@ -134,24 +196,11 @@ def cancel_open_orders(context, data):
             cancel_order(order)
 
 def momentum(context, data):
-    # Logic for buying long on selected stocks.
-    for security in context.longs.index:
-        if get_open_orders(security):
-            continue
-        if security in data:
-            order_target_percent(security, 0.5 / len(context.longs.index))
-
-    # Logic for shorting stocks.
-    for security in context.shorts.index:
-        if get_open_orders(security):
-            continue
-        if security in data:
-            order_target_percent(security, -0.5 / len(context.shorts.index))
-
-    # Logic for rebalancing portfolio once a stock fails to meet long or short criteria.
-    for security in context.portfolio.positions:
-        if get_open_orders(security):
-            continue
-        if security in data:
-            if security not in (context.longs.index | context.shorts.index):
-                order_target_percent(security, 0)
+    # Rebalance the whole book in one batch: equal weights with half the capital
+    # long and half short. Anything held outside the two lists is closed.
+    longs = pd.Series(0.5, index=context.longs.index) / len(context.longs.index)
+    shorts = pd.Series(-0.5, index=context.shorts.index) / len(context.shorts.index)
+    weights = pd.concat([longs, shorts])
+    # A name in both lists stays long, as it did when orders were placed one by one.
+    weights = weights[~weights.index.duplicated()]
+    order_optimal_portfolio(opt.TargetWeights(weights), constraints=[])
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 
 from quantopian.algorithm import attach_pipeline, pipeline_output
+import quantopian.optimize as opt
 from quantopian.pipeline import Pipeline
 from quantopian.pipeline.classifiers.morningstar import Sector
 from quantopian.pipeline.data import morningstar as mstar
@@ -21,11 +22,141 @@ __longdescr__ = 'A two-part strategy for trading volatility during earnings anno
 class CrossSectionalMomentum(CustomFactor):
     inputs = [USEquityPricing.close]
     window_length = 252
+    # Number of days used for each momentum ratio (prices / prices.shift(lag)).
+    lag = 100
 
     def compute(self, today, assets, out, prices):
-        prices = pd.DataFrame(prices)
-        R = (prices / prices.shift(100))
-        out[:] = (R.T - R.T.mean()).T.mean()
+        self.init(today, assets, out, prices)
+
+    def init(self, today, assets, out, prices):
+        # Full pass over the window: one ratio per (day, asset) without building any DataFrames.
+        ratios = np.empty((prices.shape[0] - self.lag, prices.shape[1]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(prices[self.lag:], prices[:-self.lag], out=ratios)
+        for row in ratios:
+            self._demean(row)
+        valid = ~np.isnan(ratios)
+        state = {
+            'ratios': ratios,
+            'sums': np.where(valid, ratios, 0.0).sum(axis=0),
+            'counts': valid.sum(axis=0),
+            'pos': 0,
+            # The last `lag` closes, oldest first once rotated by 'close_pos'.
+            'closes': np.array(prices[-self.lag:], dtype=np.float64),
+            'close_pos': 0,
+        }
+        self._write(state, out)
+        return state
+
+    def update(self, state, today, assets, out, entering, leaving):
+        # O(N) step: the window rolled forward one day over the same assets, so
+        # only the newest ratio enters and the oldest one leaves.
+        close = entering[0]
+        closes = state['closes']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            row = close / closes[state['close_pos']]
+        closes[state['close_pos']] = close
+        state['close_pos'] = (state['close_pos'] + 1) % len(closes)
+        self._demean(row)
+        # Swap the oldest ratio row out of the ring buffer and the newest one in.
+        ratios = state['ratios']
+        oldest = ratios[state['pos']]
+        valid = ~np.isnan(oldest)
+        state['sums'] -= np.where(valid, oldest, 0.0)
+        state['counts'] -= valid
+        oldest[:] = row
+        valid = ~np.isnan(row)
+        state['sums'] += np.where(valid, row, 0.0)
+        state['counts'] += valid
+        state['pos'] = (state['pos'] + 1) % len(ratios)
+        if state['pos'] == 0:
+            # Re-sum once per full turn of the ring so floating point drift stays bounded.
+            state['sums'] = np.where(np.isnan(ratios), 0.0, ratios).sum(axis=0)
+        self._write(state, out)
+        return state
+
+    @staticmethod
+    def _demean(row):
+        # Subtract the cross-sectional mean of the day, skipping missing ratios like pandas does.
+        valid = ~np.isnan(row)
+        count = valid.sum()
+        if count:
+            row -= np.where(valid, row, 0.0).sum() / count
+
+    @staticmethod
+    def _write(state, out):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(state['sums'], state['counts'], out=out)
+        out[state['counts'] == 0] = np.nan
+
+class HoldingRecord(object):
+    """
+    Names picked on each of the last few days, newest first, in a fixed ring of
+    `max_days_to_hold` slots. Rotating in a new day only touches the slots that
+    drop out, and a per-name count makes membership checks O(1).
+    """
+
+    def __init__(self, days_to_hold, max_days_to_hold):
+        self.days_to_hold = days_to_hold
+        self.slots = [()] * max(days_to_hold, max_days_to_hold)
+        self.head = 0
+        # Starts with `days_to_hold` empty days, like [[]] * days_to_hold did.
+        self.length = days_to_hold
+        self.filled_days = 0
+        self.size = 0
+        self.counts = {}
+
+    def __len__(self):
+        # Picks over all held days, counting a name once per day it was picked.
+        return self.size
+
+    def __contains__(self, asset):
+        return asset in self.counts
+
+    def push(self, picks):
+        """Add today's picks and drop the days that fall out of the window."""
+        capacity = len(self.slots)
+        self.head = (self.head - 1) % capacity
+        if self.length == capacity:
+            self._forget(self.slots[self.head])
+        else:
+            self.length += 1
+        self.slots[self.head] = tuple(picks)
+        self._remember(self.slots[self.head])
+        while self.length > self.days_to_hold and not self._oldest():
+            self._drop_oldest()
+        if self.filled_days > self.days_to_hold:
+            self._drop_oldest()
+
+    def weights(self, gross, max_in_one):
+        """Equal weight per distinct name, `gross` split over all picks and capped."""
+        if not self.size:
+            return pd.Series([], dtype=float)
+        return pd.Series(min(gross / self.size, max_in_one), index=list(self.counts))
+
+    def _oldest(self):
+        return self.slots[(self.head + self.length - 1) % len(self.slots)]
+
+    def _drop_oldest(self):
+        self._forget(self._oldest())
+        self.slots[(self.head + self.length - 1) % len(self.slots)] = ()
+        self.length -= 1
+
+    def _remember(self, picks):
+        for asset in picks:
+            self.counts[asset] = self.counts.get(asset, 0) + 1
+        self.size += len(picks)
+        self.filled_days += 1 if picks else 0
+
+    def _forget(self, picks):
+        for asset in picks:
+            if self.counts[asset] == 1:
+                del self.counts[asset]
+            else:
+                self.counts[asset] -= 1
+        self.size -= len(picks)
+        self.filled_days -= 1 if picks else 0
+
 
 def make_pipeline(context):
     """
@@ -130,19 +261,10 @@ def before_trading_start(context, data):
     context.results = pipeline_output('momentum_metrics')
     context.stocks_to_trade = context.output.index
 
-    def update_record(record, new_item):
-        record.insert(0, new_item)
-        if len(record) > context.max_days_to_hold:
-            del(record[-1])
-        while len(record) > context.days_to_hold and len(record[-1]) == 0:
-            del(record[-1])
-        if sum(map(lambda l: 0 if len(l) == 0 else 1, record)) > context.days_to_hold:
-            del(record[-1])
-
-    update_record(context.longstock, context.output.index[
+    context.longstock.push(context.output.index[
         context.output['quantile_returns'] == 0
     ])
-    update_record(context.shortstock, context.output.index[
+    context.shortstock.push(context.output.index[
         context.output['quantile_returns'] ==
             context.returns_quantiles - 1
     ])
@@ -172,8 +294,8 @@ def initialize(context):
     context.longs = None
     context.output = None
 
-    context.longstock = [[]] * context.days_to_hold
-    context.shortstock = [[]] * context.days_to_hold
+    context.longstock = HoldingRecord(context.days_to_hold, context.max_days_to_hold)
+    context.shortstock = HoldingRecord(context.days_to_hold, context.max_days_to_hold)
 
     schedule_function(func = reversal, date_rule = date_rules.every_day(), time_rule = time_rules.market_open())
     # Schedule momentum function weekly. Open orders are cancelled daily.
@@ -190,27 +312,14 @@ def cancel_open_orders(context, data):
             cancel_order(order)
 
 def momentum(context, data):
-    # Logic for buying long on selected stocks.
-    for security in context.longs.index:
-        if get_open_orders(security):
-            continue
-        if security in data:
-            order_target_percent(security, 0.5 / len(context.longs.index))
-
-    # Logic for shorting stocks.
-    for security in context.shorts.index:
-        if get_open_orders(security):
-            continue
-        if security in data:
-            order_target_percent(security, -0.5 / len(context.shorts.index))
-
-    # Logic for rebalancing portfolio once a stock fails to meet long or short criteria.
-    for security in context.portfolio.positions:
-        if get_open_orders(security):
-            continue
-        if security in data:
-            if security not in (context.longs.index | context.shorts.index):
-                order_target_percent(security, 0)
+    # Rebalance the whole book in one batch: equal weights with half the capital
+    # long and half short. Anything held outside the two lists is closed.
+    longs = pd.Series(0.5, index=context.longs.index) / len(context.longs.index)
+    shorts = pd.Series(-0.5, index=context.shorts.index) / len(context.shorts.index)
+    weights = pd.concat([longs, shorts])
+    # A name in both lists stays long, as it did when orders were placed one by one.
+    weights = weights[~weights.index.duplicated()]
+    order_optimal_portfolio(opt.TargetWeights(weights), constraints=[])
 
 def earnings_call(context, data):
     # Will cease momentum trading a stock if the date falls within 2 days of a company's earning call.
@@ -219,19 +328,11 @@ def earnings_call(context, data):
             order_target_percent(stock, 0)
 
 def reversal(context, data):
-    long_list = [equity for sublist in context.longstock for equity in sublist]
-    short_list = [equity for sublist in context.shortstock for equity in sublist]
-
-    for equity in long_list:
-        if data.can_trade(equity):
-            order_target_percent(equity, min(0.5 / len(long_list), context.max_in_one))
-    for equity in short_list:
-        if data.can_trade(equity):
-            order_target_percent(equity, -min(0.5 / len(short_list), context.max_in_one))
-
-    for position in context.portfolio.positions:
-        if position not in long_list + short_list:
-            order_target_percent(position, 0)
+    # Long the bottom-quantile names and short the top-quantile names picked over
+    # the held days, in one batch. Anything else in the portfolio is closed.
+    weights = context.longstock.weights(0.5, context.max_in_one).sub(
+        context.shortstock.weights(0.5, context.max_in_one), fill_value=0)
+    order_optimal_portfolio(opt.TargetWeights(weights), constraints=[])
 
 # Will be called on every trade event for the securities specified to record the leverage.
 def handle_data(context, data):
@@ -0,0 +1,13 @@
+"""
+Offline backtesting for the Quantopian-style algorithms in this repository.
+"""
+from .algorithm import TradingAlgorithm, run_algorithm
+from .data import BarData, DailyBarReader, MinuteBarReader
+
+__all__ = [
+    'BarData',
+    'DailyBarReader',
+    'MinuteBarReader',
+    'TradingAlgorithm',
+    'run_algorithm',
+]
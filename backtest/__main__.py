@@ -0,0 +1,112 @@
+"""
+Run an algorithm file against local bars::
+
+    python -m backtest meanReversion.py --bars daily.npz --start 2014-01-02
+"""
+import argparse
+import logging
+import os
+
+from .algorithm import load_algorithm
+from .data import DailyBarReader, MinuteBarReader
+from .profiler import Profiler
+from .store import open_daily_bars, open_loaders, open_minute_bars
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest')
+    parser.add_argument('algofile')
+    parser.add_argument('--bars', required=True,
+                        help='daily bar store directory, or an .npz file '
+                             'written by DailyBarReader.write')
+    parser.add_argument('--minute-bars',
+                        help='minute bar store directory, or an .npz file '
+                             'written by MinuteBarReader.write')
+    parser.add_argument('--earnings',
+                        help='earnings calendar store directory written by '
+                             'backtest.store.write_earnings_index')
+    parser.add_argument('--fundamentals', action='append', default=[],
+                        help='fundamentals store directory written by '
+                             'backtest.store.write_fundamentals (repeat for '
+                             'each dataset)')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--capital-base', type=float, default=1e6)
+    parser.add_argument('--output', help='write daily performance to CSV')
+    parser.add_argument('--universes',
+                        help='universe mask store directory written by '
+                             'python -m backtest.universe')
+    parser.add_argument('--records',
+                        help='write the values passed to record() to an '
+                             '.npz file')
+    parser.add_argument('--record-downsample', default='last',
+                        choices=('last', 'mean', 'max'),
+                        help='how a session\'s recorded values are reduced')
+    parser.add_argument('--record-bars', action='store_true',
+                        help='keep every recorded value in --records, not '
+                             'only the daily ones')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time spent in each callback, API '
+                             'call and pipeline term')
+    parser.add_argument('--profile-allocations', action='store_true',
+                        help='also trace memory allocated (slow)')
+    parser.add_argument('--profile-stacks',
+                        help='write collapsed stacks for flame graphs here')
+    parser.add_argument('--checkpoint-dir',
+                        help='write checkpoints of the run\'s state here')
+    parser.add_argument('--checkpoint-every', type=int, default=None,
+                        help='sessions between checkpoints')
+    parser.add_argument('--checkpoint-at-end', action='store_true',
+                        help='also write a checkpoint after the last session')
+    parser.add_argument('--resume',
+                        help='resume from a checkpoint file')
+    args = parser.parse_args(argv)
+    if (args.checkpoint_every or args.checkpoint_at_end) and \
+            not args.checkpoint_dir:
+        parser.error('checkpoints need --checkpoint-dir')
+
+    logging.basicConfig(level=logging.INFO)
+    if os.path.isdir(args.bars):
+        daily = open_daily_bars(args.bars)
+    else:
+        daily = DailyBarReader.load(args.bars)
+    kwargs = {}
+    if args.earnings or args.fundamentals:
+        kwargs['loaders'] = open_loaders(daily, args.earnings,
+                                         args.fundamentals)
+    if args.minute_bars:
+        if os.path.isdir(args.minute_bars):
+            minute = open_minute_bars(args.minute_bars, daily.calendar)
+        else:
+            minute = MinuteBarReader.load(args.minute_bars, daily.calendar)
+        kwargs['minute_reader'] = minute
+        kwargs['data_frequency'] = 'minute'
+    profiler = None
+    if args.profile or args.profile_allocations or args.profile_stacks:
+        profiler = Profiler(allocations=args.profile_allocations)
+    if args.checkpoint_every:
+        kwargs.update(checkpoint_dir=args.checkpoint_dir,
+                      checkpoint_every=args.checkpoint_every)
+    algo = load_algorithm(args.algofile, daily, start=args.start,
+                          end=args.end, capital_base=args.capital_base,
+                          record_downsample=args.record_downsample,
+                          record_bars=args.record_bars,
+                          record_path=args.records,
+                          universes=args.universes, profiler=profiler,
+                          resume_from=args.resume, **kwargs)
+    perf = algo.run()
+    if args.checkpoint_at_end and len(perf):
+        algo.save_checkpoint(os.path.join(
+            args.checkpoint_dir, '%s.ckpt' % perf.index[-1].date()))
+    if args.output:
+        perf.to_csv(args.output)
+    else:
+        print(perf.tail())
+    if profiler is not None:
+        print(profiler.summary().to_string())
+        if args.profile_stacks:
+            profiler.write_folded(args.profile_stacks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,706 @@
+"""
+The simulation: runs an algorithm's callbacks over locally stored bars.
+"""
+import dis
+import functools
+import hashlib
+import logging
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import checkpoint
+from .analytics import PerformanceTracker
+from .data import BarData
+from .errors import (
+    AttachPipelineAfterInitialize,
+    DatesOutsideData,
+    DuplicatePipelineName,
+    NoSuchPipeline,
+    ScheduleFunctionOutsideInitialize,
+    UnknownParameter,
+)
+from .finance import commission, slippage
+from .finance.blotter import Blotter
+from .finance.ledger import Ledger
+from .optimize import TargetWeights
+from .pipeline.engine import PipelineEngine
+from .recorder import Recorder
+from .scheduling import EventManager, date_rules, time_rules
+from .store import open_universe_masks
+
+log = logging.getLogger('backtest.algorithm')
+
+API_METHODS = []
+
+_local = threading.local()
+
+
+def api_method(f):
+    """
+    Expose a `TradingAlgorithm` method to algorithm scripts by name. Calls
+    are timed by the algorithm's profiler, if it has an enabled one.
+    """
+    API_METHODS.append(f.__name__)
+    label = 'api:' + f.__name__
+
+    @functools.wraps(f)
+    def method(self, *args, **kwargs):
+        profiler = self.profiler
+        if profiler is None or not profiler.enabled:
+            return f(self, *args, **kwargs)
+        with profiler.span(label):
+            return f(self, *args, **kwargs)
+    return method
+
+
+def _is_noop(func):
+    """Whether calling `func` does nothing (``def handle_data(...): pass``)."""
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return False
+    for instruction in dis.get_instructions(code):
+        if instruction.opname in ('RESUME', 'NOP', 'RETURN_VALUE'):
+            continue
+        if instruction.opname in ('LOAD_CONST', 'RETURN_CONST') and \
+                instruction.argval is None:
+            continue
+        return False
+    return True
+
+
+def get_algo_instance():
+    return getattr(_local, 'algo', None)
+
+
+def set_algo_instance(algo):
+    _local.algo = algo
+
+
+class AlgorithmContext(object):
+    """The ``context`` argument: free-form state plus portfolio/account."""
+
+    def __init__(self, algo, pinned=None):
+        self.__dict__['_algo'] = algo
+        self.__dict__['_pinned'] = frozenset(pinned or ())
+        # Pinned names the algorithm has tried to set.
+        self.__dict__['_assigned'] = set()
+        self.__dict__.update(pinned or {})
+
+    def __setattr__(self, name, value):
+        # Pinned attributes keep the value they were given from outside, so
+        # a parameter sweep can override the constants set in initialize().
+        if name not in self._pinned:
+            object.__setattr__(self, name, value)
+        else:
+            self._assigned.add(name)
+
+    @property
+    def portfolio(self):
+        return self._algo.ledger.portfolio
+
+    @property
+    def account(self):
+        return self._algo.ledger.account
+
+    def __repr__(self):
+        attrs = sorted(k for k in self.__dict__ if not k.startswith('_'))
+        return 'AlgorithmContext(%s)' % ', '.join(attrs)
+
+
+def _round_shares(amount):
+    # Round near-integers (float noise from target calculations), otherwise
+    # truncate towards zero so we never overshoot a target.
+    nearest = round(amount)
+    if abs(amount - nearest) < 1e-4:
+        return int(nearest)
+    return int(amount)
+
+
+class TradingAlgorithm(object):
+    """
+    Parameters
+    ----------
+    daily_reader : DailyBarReader
+        Daily bars; also defines the calendar and asset universe.
+    script : str, optional
+        Source code of an algorithm. Its ``initialize``, ``handle_data``,
+        ``before_trading_start`` and ``analyze`` functions are used.
+    start, end : date-like, optional
+        First and last session to simulate. Defaults to the whole calendar.
+        `DatesOutsideData` (a ValueError) is raised when no session of the
+        bars falls between them.
+    capital_base : float
+    data_frequency : {'daily', 'minute'}
+    minute_reader : MinuteBarReader, optional
+        Required in minute mode.
+    loaders : dict[DataSet -> PipelineLoader], optional
+        Pipeline loaders for datasets other than `USEquityPricing`.
+    term_cache : TermCache, optional
+        Memoization for pipeline terms; defaults to the cache shared by
+        every algorithm in the process.
+    initialize, handle_data, before_trading_start, analyze : callable, optional
+        Used instead of (or when there is no) `script`.
+    algo_filename : str, optional
+        Filename reported in tracebacks from `script`.
+    params : dict[str -> object], optional
+        Overrides for the algorithm's tunable constants. A name that is a
+        module-level global of `script` replaces that global; any other name
+        becomes a `context` attribute that ``initialize`` cannot overwrite.
+        The run raises `UnknownParameter` if ``initialize`` never assigns
+        such an attribute, since nothing would read it.
+    record_downsample : {'last', 'mean', 'max'}
+        How the values passed to ``record()`` during a session are reduced
+        to the session's value in the performance frame.
+    record_bars : bool
+        Also keep every recorded value with the bar it was recorded on
+        (see `Recorder.bars_frame`).
+    record_path : str, optional
+        Where the recorded values are written (`Recorder.flush`) when the
+        run ends.
+    universes : UniverseMasks or str, optional
+        Precomputed universe masks, or the store directory holding them
+        (see `backtest.pipeline.universe`).
+    profiler : Profiler, optional
+        Records the time spent in callbacks, API calls and pipeline terms
+        while it is enabled (see `backtest.profiler`).
+    analytics_window : int
+        Days in the rolling Sharpe ratio and beta of the performance frame
+        (see `backtest.analytics`).
+    checkpoint_dir : str, optional
+        Directory receiving a checkpoint (``<session date>.ckpt``) every
+        `checkpoint_every` sessions (see `backtest.checkpoint`).
+    checkpoint_every : int, optional
+    resume_from : str, optional
+        Checkpoint to resume from: the run starts after the checkpoint's
+        session, with its state, and `start` defaults to the checkpoint's.
+    """
+
+    def __init__(self, daily_reader, script=None, start=None, end=None,
+                 capital_base=1e6, data_frequency='daily', minute_reader=None,
+                 loaders=None, term_cache=None, initialize=None,
+                 handle_data=None, before_trading_start=None, analyze=None,
+                 algo_filename='<algorithm>', params=None,
+                 record_downsample='last', record_bars=False,
+                 record_path=None, universes=None, profiler=None,
+                 analytics_window=126, checkpoint_dir=None,
+                 checkpoint_every=None, resume_from=None):
+        if data_frequency not in ('daily', 'minute'):
+            raise ValueError("data_frequency must be 'daily' or 'minute'")
+        if data_frequency == 'minute' and minute_reader is None:
+            raise ValueError("Minute mode needs a minute_reader.")
+        self.profiler = profiler
+        self.daily_reader = daily_reader
+        self.minute_reader = minute_reader
+        self.data_frequency = data_frequency
+        self.calendar = daily_reader.calendar
+        self.asset_finder = daily_reader.asset_finder
+        sessions = self.calendar.sessions
+        self.first_session = (self.calendar.session_index(start)
+                              if start is not None else 0)
+        self.last_session = (self.calendar.session_index(end, 'right') - 1
+                             if end is not None else len(sessions) - 1)
+        if self.first_session > self.last_session:
+            raise DatesOutsideData(start, end, sessions)
+
+        self.capital_base = capital_base
+        self.ledger = Ledger(capital_base, sessions[self.first_session])
+        self.blotter = Blotter()
+        self.data = BarData(daily_reader, minute_reader, data_frequency)
+        if isinstance(universes, str):
+            universes = open_universe_masks(universes)
+        self.pipeline_engine = PipelineEngine(daily_reader, loaders,
+                                              cache=term_cache,
+                                              universes=universes)
+        self.pipeline_engine.profiler = profiler
+        self.event_manager = EventManager(self.calendar)
+        params = dict(params or {})
+
+        self._pipelines = {}
+        self._pipeline_cache = {}
+        self.recorder = Recorder(record_downsample, keep_bars=record_bars)
+        self._record_path = record_path
+        self._benchmark = None
+        self._in_initialize = False
+        self._initialized = False
+        self._session = self.first_session
+
+        self.namespace = {}
+        self._script_digest = None
+        if script is not None:
+            self._script_digest = hashlib.sha1(
+                script.encode('utf-8')).hexdigest()
+            self.namespace.update(self._api_namespace())
+            code = compile(script, algo_filename, 'exec')
+            exec(code, self.namespace)
+        for name in list(params):
+            if name in self.namespace:
+                self.namespace[name] = params.pop(name)
+        self.context = AlgorithmContext(self, pinned=params)
+        self._initialize = initialize or self.namespace.get('initialize')
+        self._handle_data = handle_data or self.namespace.get('handle_data')
+        self._before_trading_start = (
+            before_trading_start or
+            self.namespace.get('before_trading_start')
+        )
+        self._analyze = analyze or self.namespace.get('analyze')
+
+        self.daily_perf = []
+        self.transactions = []
+        self.analytics = PerformanceTracker(capital_base,
+                                            window=analytics_window)
+        # Minute row of every scheduled function trigger (minute mode).
+        self._trigger_rows = None
+        self._skip_idle = False
+
+        if checkpoint_every is not None and checkpoint_dir is None:
+            raise ValueError("checkpoint_every needs a checkpoint_dir.")
+        self._checkpoint_dir = checkpoint_dir
+        self._checkpoint_every = checkpoint_every
+        # Last session run to completion.
+        self._completed = None
+        self._resume = None
+        if resume_from is not None:
+            self._resume = checkpoint.load(
+                checkpoint.read_checkpoint(resume_from), self
+            )
+            first = self._resume['first_session']
+            if start is not None and self.first_session != first:
+                raise ValueError(
+                    "The checkpoint belongs to a run starting on %s."
+                    % sessions[first].date()
+                )
+            self.first_session = first
+            if self._resume['session'] > self.last_session:
+                raise ValueError("The checkpoint is past the end of the run.")
+
+    def _api_namespace(self):
+        namespace = {name: getattr(self, name) for name in API_METHODS}
+        namespace.update(
+            date_rules=date_rules,
+            time_rules=time_rules,
+            slippage=slippage,
+            commission=commission,
+            log=logging.getLogger('algorithm'),
+        )
+        return namespace
+
+    # Simulation ---------------------------------------------------------
+
+    def run(self):
+        """Run the simulation and return the daily performance DataFrame."""
+        previous = get_algo_instance()
+        set_algo_instance(self)
+        try:
+            self._run_initialize()
+            first = self.first_session
+            if self._resume is not None:
+                checkpoint.restore(self, self._resume)
+                self._completed = self._resume['session']
+                first = self._completed + 1
+                self._resume = None
+            every = self._checkpoint_every
+            for i in range(first, self.last_session + 1):
+                self._run_session(i)
+                self._completed = i
+                if every and (i - self.first_session + 1) % every == 0:
+                    self.save_checkpoint(os.path.join(
+                        self._checkpoint_dir,
+                        '%s.ckpt' % self.calendar.sessions[i].date(),
+                    ))
+            return self._finish()
+        finally:
+            set_algo_instance(previous)
+
+    def save_checkpoint(self, path):
+        """
+        Write the state after the last session run to `path`, to resume
+        from with ``resume_from=path``.
+        """
+        if self._completed is None:
+            raise ValueError("No session has been run yet.")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        checkpoint.write_checkpoint(
+            path, checkpoint.capture(self, self._completed)
+        )
+
+    def _run_initialize(self):
+        self._in_initialize = True
+        if self._initialize is not None:
+            self._initialize(self.context)
+        self._in_initialize = False
+        unused = self.context._pinned - self.context._assigned
+        if unused:
+            raise UnknownParameter(unused)
+        self._initialized = True
+
+    def _finish(self):
+        perf = self._perf_frame()
+        if self._record_path is not None:
+            self.recorder.flush(self._record_path)
+        if self._analyze is not None:
+            self._analyze(self.context, perf)
+        return perf
+
+    def _run_session(self, i):
+        self._session = i
+        self._pipeline_cache.clear()
+        # Before the open, the latest bar is yesterday's close.
+        self.data._set_session(max(i - 1, 0))
+        if self._before_trading_start is not None:
+            self._call('before_trading_start', self._before_trading_start)
+        self.data._set_session(i)
+
+        if self.data_frequency == 'daily':
+            events = self.event_manager.events_for_session(i)
+            self._process_fills(self.daily_reader, i)
+            # Like the hosted platform, an order lives for one trading day:
+            # whatever did not fill on this bar is cancelled.
+            self.blotter.cancel_all(warn=True,
+                                    placed_before=self.data.current_dt)
+            for _, func in events:
+                self._call(None, func)
+            if self._handle_data is not None:
+                self._call('handle_data', self._handle_data)
+            close = self.daily_reader.field('price')[i]
+        else:
+            close = self._run_minutes(i)
+
+        self.ledger.mark_to_market(close, self.data.current_dt)
+        self._end_of_day(i)
+
+    def _call(self, name, func):
+        """
+        Call `func(context, data)`, profiled as `name`, or as a scheduled
+        function if `name` is None.
+        """
+        profiler = self.profiler
+        if profiler is None or not profiler.enabled:
+            return func(self.context, self.data)
+        if name is None:
+            name = 'schedule:' + getattr(func, '__name__', repr(func))
+        with profiler.span(name):
+            return func(self.context, self.data)
+
+    def _run_minutes(self, i):
+        reader = self.minute_reader
+        start, stop = reader.session_starts[i], reader.session_stops[i]
+        triggers = self.event_manager.triggers
+        if self._trigger_rows is None:
+            self._trigger_rows = triggers.minute_rows(reader)
+            self._skip_idle = (self._handle_data is None or
+                               _is_noop(self._handle_data))
+        k, end = triggers.offsets[i], triggers.offsets[i + 1]
+        rows, events, funcs = (self._trigger_rows, triggers.events,
+                               triggers.funcs)
+        prices = reader.field('price')
+        row = start
+        while row < stop:
+            self.data._set_minute(row)
+            self._process_fills(reader, row)
+            # Scheduled functions and handle_data see positions valued at
+            # this minute's prices.
+            self.ledger.mark_lazily(prices[row], self.data.current_dt)
+            while k < end and rows[k] == row:
+                self._call(None, funcs[events[k]])
+                k += 1
+            if self._handle_data is not None:
+                self._call('handle_data', self._handle_data)
+            row += 1
+            # With nothing to fill and nothing to do in handle_data, the
+            # bars up to the next trigger cannot change anything.
+            if self._skip_idle and not self.blotter.open_orders:
+                row = max(row, rows[k] if k < end else stop)
+        self.blotter.cancel_all(warn=True)
+        if stop > start:
+            # Skipped bars still end the session on its last minute.
+            self.data._set_minute(stop - 1)
+            return prices[stop - 1]
+        return self.daily_reader.field('price')[i]
+
+    def _process_fills(self, reader, row):
+        if not self.blotter.open_orders:
+            return
+        price = reader.field('close')[row]
+        volume = reader.field('volume')[row]
+        dt = self.data.current_dt
+        column_of = self._column_of
+        txns = self.blotter.process_bar(dt, price, volume, column_of)
+        for txn in txns:
+            self.ledger.process_transaction(txn, column_of(txn.asset))
+        self.transactions.extend(txns)
+
+    def _column_of(self, asset):
+        return int(self.asset_finder.indexer([asset])[0])
+
+    def _end_of_day(self, i):
+        ledger = self.ledger
+        portfolio_value = ledger.portfolio.portfolio_value
+        previous = (self.daily_perf[-1]['portfolio_value']
+                    if self.daily_perf else self.capital_base)
+        longs, shorts = ledger.position_counts()
+        row = {
+            'date': self.calendar.sessions[i],
+            'portfolio_value': portfolio_value,
+            'cash': ledger.cash,
+            'positions_value': ledger.positions_value,
+            'gross_leverage': ledger.account.leverage,
+            'net_leverage': ledger.account.net_leverage,
+            'longs_count': longs,
+            'shorts_count': shorts,
+            'pnl': portfolio_value - previous,
+            'returns': portfolio_value / previous - 1.0 if previous else 0.0,
+        }
+        if self._benchmark is not None:
+            col = self._column_of(self._benchmark)
+            prices = self.daily_reader.field('price')[:, col]
+            row['benchmark_returns'] = (prices[i] / prices[i - 1] - 1.0
+                                        if i > 0 else np.nan)
+        book = ledger.book
+        row.update(self.analytics.update(
+            row['returns'], portfolio_value, book.long_value,
+            book.short_value, ledger.traded_value,
+            row.get('benchmark_returns', np.nan),
+        ))
+        row.update(self.recorder.end_session(row['date']))
+        self.daily_perf.append(row)
+
+    def _perf_frame(self):
+        perf = pd.DataFrame(self.daily_perf)
+        if len(perf):
+            perf = perf.set_index('date')
+        return perf
+
+    def transactions_frame(self):
+        return pd.DataFrame([t.to_dict() for t in self.transactions])
+
+    # API: pipelines -----------------------------------------------------
+
+    @api_method
+    def attach_pipeline(self, pipeline, name, chunks=None):
+        if self._initialized:
+            raise AttachPipelineAfterInitialize()
+        if name in self._pipelines:
+            raise DuplicatePipelineName(name)
+        self._pipelines[name] = pipeline
+        return pipeline
+
+    @api_method
+    def pipeline_output(self, name):
+        if name not in self._pipelines:
+            raise NoSuchPipeline(name, self._pipelines)
+        output = self._pipeline_cache.get(name)
+        if output is None:
+            output = self.pipeline_engine.run_pipeline(
+                self._pipelines[name], self._session
+            )
+            self._pipeline_cache[name] = output
+        return output
+
+    # API: scheduling ----------------------------------------------------
+
+    @api_method
+    def schedule_function(self, func, date_rule=None, time_rule=None,
+                          half_days=True, calendar=None):
+        if not self._in_initialize:
+            raise ScheduleFunctionOutsideInitialize()
+        self.event_manager.add(func, date_rule, time_rule, half_days)
+
+    # API: orders --------------------------------------------------------
+
+    def _price(self, asset):
+        return self.data.current(asset, 'price')
+
+    @api_method
+    def order(self, asset, amount, limit_price=None, stop_price=None,
+              style=None):
+        if limit_price is not None or stop_price is not None or style:
+            raise NotImplementedError("Only market orders are supported.")
+        amount = _round_shares(amount)
+        if amount == 0:
+            return None
+        if math.isnan(self._price(asset)):
+            log.warning("Cannot order %r: it has no price yet.", asset)
+            return None
+        return self.blotter.order(asset, amount, self.data.current_dt)
+
+    @api_method
+    def order_value(self, asset, value, limit_price=None, stop_price=None,
+                    style=None):
+        return self.order(asset, value / self._price(asset), limit_price,
+                          stop_price, style)
+
+    @api_method
+    def order_percent(self, asset, percent, limit_price=None,
+                      stop_price=None, style=None):
+        value = percent * self.ledger.portfolio.portfolio_value
+        return self.order_value(asset, value, limit_price, stop_price, style)
+
+    @api_method
+    def order_target(self, asset, target, limit_price=None, stop_price=None,
+                     style=None):
+        current = self.ledger.book.amount(asset)
+        return self.order(asset, target - current, limit_price, stop_price,
+                          style)
+
+    @api_method
+    def order_target_value(self, asset, target, limit_price=None,
+                           stop_price=None, style=None):
+        return self.order_target(asset, target / self._price(asset),
+                                 limit_price, stop_price, style)
+
+    @api_method
+    def order_target_percent(self, asset, target, limit_price=None,
+                             stop_price=None, style=None):
+        value = target * self.ledger.portfolio.portfolio_value
+        return self.order_target_value(asset, value, limit_price, stop_price,
+                                       style)
+
+    @api_method
+    def order_optimal_portfolio(self, objective, constraints):
+        """
+        Rebalance the whole book to `objective` in one pass and return the
+        ids of the orders placed.
+        """
+        if constraints:
+            raise NotImplementedError(
+                "Optimize constraints are not supported."
+            )
+        if not isinstance(objective, TargetWeights):
+            raise NotImplementedError(
+                "Only TargetWeights objectives are supported, got %r."
+                % (objective,)
+            )
+        return self._order_target_weights(objective.weights)
+
+    def _order_target_weights(self, weights):
+        """
+        Order every asset in `weights` or in the portfolio towards its target
+        weight (zero if absent), netting current holdings and open orders.
+        Assets that cannot trade right now are left alone.
+        """
+        book = list(weights.index)
+        listed = set(book)
+        held, amounts = self.ledger.book.held()
+        book.extend(a for a in held if a not in listed)
+        if not book:
+            return []
+        target = np.zeros(len(book))
+        target[:len(weights)] = weights.values
+        position = dict((a, k) for k, a in enumerate(book))
+        current = np.zeros(len(book))
+        current[[position[a] for a in held]] = amounts
+        for asset, orders in self.blotter.open_orders.items():
+            k = position.get(asset)
+            if k is not None:
+                current[k] += sum(o.open_amount for o in orders)
+
+        cols = self.asset_finder.indexer(book)
+        price = self.data._current_row('price')[cols]
+        value = self.ledger.portfolio.portfolio_value
+        with np.errstate(divide='ignore', invalid='ignore'):
+            amounts = target * value / price - current
+        nearest = np.round(amounts)
+        amounts = np.where(np.abs(amounts - nearest) < 1e-4, nearest,
+                           np.trunc(amounts))
+        amounts[~(self.data._can_trade_cols(cols) & np.isfinite(amounts))] = 0
+        dt = self.data.current_dt
+        return [self.blotter.order(book[k], int(amounts[k]), dt)
+                for k in np.flatnonzero(amounts)]
+
+    @api_method
+    def get_open_orders(self, asset=None):
+        return self.blotter.get_open_orders(asset)
+
+    @api_method
+    def get_order(self, order_id):
+        return self.blotter.orders.get(order_id)
+
+    @api_method
+    def cancel_order(self, order_param):
+        order_id = getattr(order_param, 'id', order_param)
+        self.blotter.cancel(order_id)
+
+    # API: configuration -------------------------------------------------
+
+    @api_method
+    def set_slippage(self, slippage_model=None, us_equities=None):
+        self.blotter.slippage = us_equities or slippage_model
+
+    @api_method
+    def set_commission(self, commission_model=None, us_equities=None):
+        self.blotter.commission = us_equities or commission_model
+
+    @api_method
+    def set_benchmark(self, benchmark):
+        self._benchmark = benchmark
+
+    @api_method
+    def set_symbol_lookup_date(self, dt):
+        self.asset_finder.lookup_date = pd.Timestamp(dt)
+
+    @api_method
+    def update_universe(self, sids):
+        # Pre-pipeline API; every asset in the bar store is always available.
+        pass
+
+    # API: lookups and misc ----------------------------------------------
+
+    @api_method
+    def symbol(self, symbol_str):
+        return self.asset_finder.lookup_symbol(symbol_str)
+
+    @api_method
+    def symbols(self, *args):
+        return [self.symbol(s) for s in args]
+
+    @api_method
+    def sid(self, sid):
+        return self.asset_finder.retrieve_asset(sid)
+
+    @api_method
+    def get_datetime(self, tz=None):
+        dt = pd.Timestamp(self.data.current_dt)
+        if tz is not None:
+            dt = dt.tz_localize('America/New_York').tz_convert(tz)
+        return dt
+
+    @api_method
+    def record(self, *args, **kwargs):
+        if len(args) % 2:
+            raise ValueError("record() needs name/value pairs.")
+        recorder = self.recorder
+        if recorder.keep_bars:
+            recorder.clock = self.data.current_dt.to_datetime64()
+        for name, value in zip(args[::2], args[1::2]):
+            recorder.record(name, value)
+        for name, value in kwargs.items():
+            recorder.record(name, value)
+
+
+def load_algorithm(script, daily_reader, **kwargs):
+    """
+    A `TradingAlgorithm` for `script`, algorithm source code or a path to a
+    ``.py`` file; the other arguments are those of `TradingAlgorithm`.
+    ``quantopian.*`` imports in the script resolve to this package.
+    """
+    from .compat import install_quantopian_aliases
+    install_quantopian_aliases()
+    if '\n' not in script and script.endswith('.py'):
+        kwargs.setdefault('algo_filename', script)
+        with open(script) as f:
+            script = f.read()
+    return TradingAlgorithm(daily_reader, script=script, **kwargs)
+
+
+def run_algorithm(script, daily_reader, **kwargs):
+    """
+    Run an algorithm and return its daily performance (see
+    `load_algorithm` for the arguments).
+    """
+    return load_algorithm(script, daily_reader, **kwargs).run()
@@ -0,0 +1,452 @@
+"""
+Performance and risk statistics, streamed day by day or computed in bulk.
+
+`PerformanceTracker` is updated once per session as the day closes and
+gives that day's returns, cumulative returns, rolling Sharpe ratio,
+drawdown, turnover, rolling beta to the benchmark and long / short
+exposure. Rolling statistics keep a ring of the last `window` days with
+running means and centered (co)moments, updated Welford-style as days
+enter and leave (and rebuilt from the ring once per turn, or when a large
+return leaves, to bound floating point drift); everything else is a running aggregate, so memory does not
+grow with the length of the run. `summary` gives the full-period headline
+statistics from the same aggregates.
+
+`rolling_metrics` computes the same daily series from whole returns
+arrays, and `tear_sheet` the full-period statistics of many runs at once
+(one row per run of a ``runs x days`` array), both vectorized.
+`verify_tracker` checks the streaming path against the batch one.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+PERIODS_PER_YEAR = 252
+
+# Elements of the (runs, days, window) blocks `rolling_metrics` works on.
+_BLOCK = 1 << 22
+# Fraction of its largest M2 below which the tracker rebuilds its window.
+_DRIFT = 1e-4
+
+DAILY_FIELDS = ('algorithm_period_return', 'sharpe', 'drawdown',
+                'max_drawdown', 'turnover', 'beta', 'long_exposure',
+                'short_exposure')
+
+TEAR_SHEET_FIELDS = ('days', 'total_returns', 'annual_return',
+                     'annual_volatility', 'sharpe', 'sortino',
+                     'max_drawdown', 'calmar', 'beta', 'alpha')
+
+
+class PerformanceTracker(object):
+    """
+    Parameters
+    ----------
+    capital_base : float
+    window : int
+        Days in the rolling Sharpe ratio and beta.
+    periods_per_year : int
+        Used to annualise.
+    """
+
+    def __init__(self, capital_base, window=126,
+                 periods_per_year=PERIODS_PER_YEAR):
+        self.capital_base = float(capital_base)
+        self.window = window
+        self.periods_per_year = periods_per_year
+        self.days = 0
+        self.value = self.capital_base
+        self.peak = self.capital_base
+        self.max_drawdown = 0.0
+        self.max_leverage = 0.0
+        self._traded = 0.0
+        self._turnover_sum = 0.0
+        # Full period: Welford mean / M2 of returns, downside sum of
+        # squares, and the pair moments of the days with a benchmark return.
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._downside = 0.0
+        self._full_pairs = [0.0] * 5
+        # Rolling window: returns and benchmark returns, with the moments
+        # [n, mean r, M2 r] of the known returns and [n, mean r, mean b,
+        # C rb, M2 b] of the pairs where both are known.
+        self._returns = np.full(window, np.nan)
+        self._benchmark = np.full(window, np.nan)
+        self._pos = 0
+        self._moments = [0.0] * 3
+        self._pairs = [0.0] * 5
+        # Largest M2 r and M2 b since the moments were last rebuilt.
+        self._spread = [0.0, 0.0]
+
+    def __setstate__(self, state):
+        # Trackers pickled when the window kept plain sums.
+        if '_sums' in state:
+            del state['_sums']
+            n, sr, sb, srb, sbb = state.pop('_full')
+            state['_full_pairs'] = [0.0] * 5 if not n else [
+                n, sr / n, sb / n, srb - sr * sb / n, sbb - sb * sb / n]
+            self.__dict__.update(state)
+            self._resum()
+        else:
+            self.__dict__.update(state)
+
+    def update(self, returns, portfolio_value, long_value=0.0,
+               short_value=0.0, traded_value=0.0,
+               benchmark_returns=np.nan):
+        """
+        Close one day. `traded_value` is the running total of shares times
+        price traded so far. Returns the day's `DAILY_FIELDS`.
+        """
+        self.days += 1
+        self.value = portfolio_value
+        if portfolio_value > self.peak:
+            self.peak = portfolio_value
+        drawdown = portfolio_value / self.peak - 1.0 if self.peak else 0.0
+        if drawdown < self.max_drawdown:
+            self.max_drawdown = drawdown
+        with np.errstate(divide='ignore', invalid='ignore'):
+            turnover = (traded_value - self._traded) / portfolio_value \
+                if portfolio_value else np.nan
+            long_exposure = long_value / portfolio_value \
+                if portfolio_value else np.nan
+            short_exposure = short_value / portfolio_value \
+                if portfolio_value else np.nan
+        self._traded = traded_value
+        if turnover == turnover:
+            self._turnover_sum += turnover
+        leverage = long_exposure - short_exposure
+        if leverage > self.max_leverage:
+            self.max_leverage = leverage
+
+        delta = returns - self._mean
+        self._mean += delta / self.days
+        self._m2 += delta * (returns - self._mean)
+        if returns < 0:
+            self._downside += returns * returns
+        known = benchmark_returns == benchmark_returns
+        if known:
+            _add_pair(self._full_pairs, returns, benchmark_returns)
+
+        self._push(returns, benchmark_returns, known)
+        return {
+            'algorithm_period_return':
+                portfolio_value / self.capital_base - 1.0,
+            'sharpe': self._rolling_sharpe(),
+            'drawdown': drawdown,
+            'max_drawdown': self.max_drawdown,
+            'turnover': turnover,
+            'beta': _beta(self._pairs),
+            'long_exposure': long_exposure,
+            'short_exposure': short_exposure,
+        }
+
+    def _push(self, r, b, known):
+        pos = self._pos
+        old_r = float(self._returns[pos])
+        old_b = float(self._benchmark[pos])
+        self._returns[pos] = r
+        self._benchmark[pos] = b
+        self._pos = (pos + 1) % self.window
+        if self._pos == 0:
+            self._resum()
+            return
+        moments, pairs, spread = self._moments, self._pairs, self._spread
+        if old_r == old_r:
+            n = moments[0] - 1.0
+            delta = old_r - moments[1]
+            moments[0] = n
+            moments[1] = moments[1] - delta / n if n else 0.0
+            moments[2] -= delta * (old_r - moments[1])
+            if old_b == old_b:
+                _remove_pair(pairs, old_r, old_b)
+            # A removal leaves rounding error on the scale of the largest
+            # M2 since the last rebuild; rebuild when much less is left.
+            if moments[2] < spread[0] * _DRIFT or \
+                    pairs[4] < spread[1] * _DRIFT:
+                self._resum()
+                return
+        moments[0] += 1.0
+        delta = r - moments[1]
+        moments[1] += delta / moments[0]
+        moments[2] += delta * (r - moments[1])
+        if known:
+            _add_pair(pairs, r, b)
+        spread[0] = max(spread[0], moments[2])
+        spread[1] = max(spread[1], pairs[4])
+
+    def _resum(self):
+        r, b = self._returns, self._benchmark
+        seen = ~np.isnan(r)
+        rs = r[seen]
+        mean = rs.mean() if len(rs) else 0.0
+        self._moments = [float(len(rs)), float(mean),
+                         float(((rs - mean) ** 2).sum())]
+        pair = seen & ~np.isnan(b)
+        rp, bp = r[pair], b[pair]
+        if len(rp):
+            mr, mb = rp.mean(), bp.mean()
+            self._pairs = [float(len(rp)), float(mr), float(mb),
+                           float(((rp - mr) * (bp - mb)).sum()),
+                           float(((bp - mb) ** 2).sum())]
+        else:
+            self._pairs = [0.0] * 5
+        self._spread = [self._moments[2], self._pairs[4]]
+
+    def _rolling_sharpe(self):
+        n, mean, m2 = self._moments
+        return _sharpe(n, mean, m2, self.periods_per_year)
+
+    def summary(self):
+        """Full-period statistics, as `tear_sheet` gives them."""
+        days = self.days
+        ppy = self.periods_per_year
+        if not days:
+            return {'days': 0}
+        total = np.float64(self.value) / self.capital_base - 1.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(self._m2 / (days - 1)) if days > 1 else np.nan
+            annual_return = (1.0 + total) ** (ppy / days) - 1.0
+            downside = np.sqrt(self._downside / days)
+            beta = _beta(self._full_pairs)
+            n, mr, mb = self._full_pairs[:3]
+            alpha = ppy * (mr - beta * mb) if n else np.nan
+            stats = {
+                'days': days,
+                'ending_value': self.value,
+                'total_returns': total,
+                'annual_return': annual_return,
+                'annual_volatility': std * np.sqrt(ppy),
+                'sharpe': np.sqrt(ppy) * self._mean / std,
+                'sortino': np.sqrt(ppy) * self._mean / downside,
+                'max_drawdown': self.max_drawdown,
+                'calmar': (annual_return / -self.max_drawdown
+                           if self.max_drawdown < 0 else np.nan),
+                'beta': beta,
+                'alpha': alpha,
+                'max_leverage': self.max_leverage,
+                'turnover': self._turnover_sum / days,
+            }
+        return dict((k, v if k == 'days' else float(v))
+                    for k, v in stats.items())
+
+
+def _add_pair(pairs, r, b):
+    """Welford update of the moments [n, mean r, mean b, C rb, M2 b]."""
+    pairs[0] += 1.0
+    dr = r - pairs[1]
+    db = b - pairs[2]
+    pairs[1] += dr / pairs[0]
+    pairs[2] += db / pairs[0]
+    pairs[3] += dr * (b - pairs[2])
+    pairs[4] += db * (b - pairs[2])
+
+
+def _remove_pair(pairs, r, b):
+    """Undo `_add_pair` for a pair leaving the window."""
+    n = pairs[0] - 1.0
+    if not n:
+        pairs[:] = [0.0] * 5
+        return
+    dr = r - pairs[1]
+    db = b - pairs[2]
+    pairs[0] = n
+    pairs[1] -= dr / n
+    pairs[2] -= db / n
+    pairs[3] -= dr * (b - pairs[2])
+    pairs[4] -= db * (b - pairs[2])
+
+
+def _beta(pairs):
+    n, _, _, c, m2 = pairs
+    if n < 2 or m2 <= 0:
+        return np.nan
+    return c / m2
+
+
+def _sharpe(n, mean, m2, periods_per_year):
+    if n < 2 or m2 <= 0:
+        return np.nan
+    return np.sqrt(periods_per_year) * mean / np.sqrt(m2 / (n - 1))
+
+
+def _as_runs(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.newaxis] if values.ndim == 1 else values
+
+
+def _rolling_moments(r, b, window):
+    """
+    Count, mean of `r` and the centered sums C rb and M2 b over each
+    trailing `window` of the last axis of two ``runs x days`` arrays,
+    leaving out the days where either is NaN (`b` may be `r` itself).
+    Each window is summed about its own means, in blocks of days to bound
+    memory.
+    """
+    runs, days = r.shape
+    pad = np.full((runs, window - 1), np.nan)
+    rw = sliding_window_view(np.concatenate([pad, r], axis=1), window, -1)
+    bw = rw if b is r else sliding_window_view(
+        np.concatenate([pad, b], axis=1), window, -1)
+    out = np.empty((4, runs, days))
+    step = max(1, _BLOCK // max(1, runs * window))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, days, step):
+            block = slice(start, start + step)
+            x = rw[:, block]
+            known = ~np.isnan(x)
+            if b is not r:
+                y = bw[:, block]
+                known &= ~np.isnan(y)
+            n = known.sum(axis=-1)
+            dx = np.where(known, x, 0.0)
+            mx = dx.sum(axis=-1) / n
+            dx -= mx[..., np.newaxis]
+            dx *= known
+            if b is r:
+                dy, my = dx, mx
+            else:
+                dy = np.where(known, y, 0.0)
+                my = dy.sum(axis=-1) / n
+                dy -= my[..., np.newaxis]
+                dy *= known
+            out[0, :, block] = n
+            out[1, :, block] = mx
+            out[2, :, block] = np.einsum('ijk,ijk->ij', dx, dy)
+            out[3, :, block] = (out[2, :, block] if b is r else
+                                np.einsum('ijk,ijk->ij', dy, dy))
+    return out
+
+
+def rolling_metrics(returns, benchmark_returns=None, window=126,
+                    periods_per_year=PERIODS_PER_YEAR):
+    """
+    The returns-based daily series of `PerformanceTracker` for a ``runs x
+    days`` (or 1-d) array of daily returns: ``algorithm_period_return``,
+    ``sharpe``, ``drawdown``, ``max_drawdown`` and ``beta``, each an array
+    of the same shape. The rolling statistics are summed about each
+    window's own means, which costs O(window) per day but stays exact for
+    short or nearly flat windows.
+    """
+    r = _as_runs(returns)
+    value = np.cumprod(1.0 + r, axis=-1)
+    peak = np.maximum(np.maximum.accumulate(value, axis=-1), 1.0)
+    drawdown = value / peak - 1.0
+    out = {
+        'algorithm_period_return': value - 1.0,
+        'drawdown': drawdown,
+        'max_drawdown': np.minimum(np.minimum.accumulate(drawdown, axis=-1),
+                                   0.0),
+    }
+    n, mean, _, m2 = _rolling_moments(r, r, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.sqrt(periods_per_year) * mean / np.sqrt(m2 / (n - 1))
+    out['sharpe'] = np.where((n >= 2) & (m2 > 0), sharpe, np.nan)
+    if benchmark_returns is None:
+        out['beta'] = np.full(r.shape, np.nan)
+    else:
+        b = np.broadcast_to(_as_runs(benchmark_returns), r.shape)
+        n, _, c, m2 = _rolling_moments(r, b, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = c / m2
+        out['beta'] = np.where((n >= 2) & (m2 > 0), beta, np.nan)
+    if np.ndim(returns) == 1:
+        out = dict((k, v[0]) for k, v in out.items())
+    return out
+
+
+def tear_sheet(returns, benchmark_returns=None, index=None,
+               periods_per_year=PERIODS_PER_YEAR):
+    """
+    Full-period statistics of every run of a ``runs x days`` array of daily
+    returns (a 1-d array is one run), as a DataFrame with one row per run
+    and the `TEAR_SHEET_FIELDS` columns. `benchmark_returns` is one row of
+    days, or one per run; days where it is NaN are left out of beta and
+    alpha.
+    """
+    r = _as_runs(returns)
+    days = r.shape[-1]
+    ppy = periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.cumprod(1.0 + r, axis=-1)
+        peak = np.maximum(np.maximum.accumulate(value, axis=-1), 1.0)
+        max_drawdown = np.minimum((value / peak - 1.0).min(axis=-1), 0.0) \
+            if days else np.zeros(len(r))
+        total = value[:, -1] - 1.0 if days else np.zeros(len(r))
+        annual_return = (1.0 + total) ** (ppy / days) - 1.0
+        mean = r.mean(axis=-1)
+        std = r.std(axis=-1, ddof=1) if days > 1 else np.full(len(r), np.nan)
+        downside = np.sqrt((np.minimum(r, 0.0) ** 2).mean(axis=-1))
+        if benchmark_returns is None:
+            beta = alpha = np.full(len(r), np.nan)
+        else:
+            b = np.broadcast_to(_as_runs(benchmark_returns), r.shape)
+            pair = ~np.isnan(b)
+            n = pair.sum(axis=-1)
+            mr = np.where(pair, r, 0.0).sum(axis=-1) / n
+            mb = np.where(pair, b, 0.0).sum(axis=-1) / n
+            dr = np.where(pair, r - mr[:, np.newaxis], 0.0)
+            db = np.where(pair, b - mb[:, np.newaxis], 0.0)
+            var = (db * db).sum(axis=-1)
+            beta = (dr * db).sum(axis=-1) / var
+            beta = np.where((n >= 2) & (var > 0), beta, np.nan)
+            alpha = ppy * (mr - beta * mb)
+        frame = pd.DataFrame({
+            'days': np.full(len(r), days),
+            'total_returns': total,
+            'annual_return': annual_return,
+            'annual_volatility': std * np.sqrt(ppy),
+            'sharpe': np.sqrt(ppy) * mean / std,
+            'sortino': np.sqrt(ppy) * mean / downside,
+            'max_drawdown': max_drawdown,
+            'calmar': np.where(max_drawdown < 0,
+                               annual_return / -max_drawdown, np.nan),
+            'beta': beta,
+            'alpha': alpha,
+        }, columns=TEAR_SHEET_FIELDS)
+    if index is not None:
+        frame.index = index
+    return frame
+
+
+def verify_tracker(returns, benchmark_returns=None, window=126, rtol=1e-8):
+    """
+    Feed daily `returns` (1-d) through a `PerformanceTracker` and check
+    every day's returns-based series against `rolling_metrics`, and its
+    `summary` against `tear_sheet`. Returns the largest relative
+    difference seen, or raises AssertionError.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    tracker = PerformanceTracker(1.0, window=window)
+    bench = (np.full(len(returns), np.nan) if benchmark_returns is None
+             else np.asarray(benchmark_returns, dtype=np.float64))
+    rows = []
+    value = 1.0
+    for r, b in zip(returns, bench):
+        value *= 1.0 + r
+        rows.append(tracker.update(r, value, benchmark_returns=b))
+    expected = rolling_metrics(returns, benchmark_returns, window=window)
+    checks = [(name, np.array([row[name] for row in rows]), values)
+              for name, values in expected.items()]
+    sheet = tear_sheet(returns, benchmark_returns).iloc[0]
+    summary = tracker.summary()
+    checks.extend((name, np.array([summary[name]]),
+                   np.array([sheet[name]]))
+                  for name in TEAR_SHEET_FIELDS)
+    worst = 0.0
+    for name, got, want in checks:
+        if not np.array_equal(np.isnan(got), np.isnan(want)):
+            raise AssertionError("%s: NaN mismatch between the tracker and "
+                                 "the batch computation" % name)
+        finite = np.isfinite(want)
+        if not np.array_equal(got[~finite], want[~finite],
+                              equal_nan=True):
+            raise AssertionError("%s: infinite values differ between the "
+                                 "tracker and the batch computation" % name)
+        if finite.any():
+            diff = np.abs(got[finite] - want[finite]) / np.maximum(
+                np.abs(want[finite]), 1.0)
+            if diff.max() > rtol:
+                raise AssertionError(
+                    "%s: the tracker differs from the batch computation by "
+                    "%g" % (name, diff.max())
+                )
+            worst = max(worst, diff.max())
+    return worst
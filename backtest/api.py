@@ -0,0 +1,30 @@
+"""
+Module-level API for ``from quantopian.algorithm import ...``.
+
+Each function forwards to the algorithm that is currently running.
+"""
+from .algorithm import API_METHODS, get_algo_instance
+from .errors import NoActiveAlgorithm
+from .finance import commission, slippage
+from .scheduling import date_rules, time_rules
+
+
+def _forward(name):
+    def api_function(*args, **kwargs):
+        algo = get_algo_instance()
+        if algo is None:
+            raise NoActiveAlgorithm(name)
+        return getattr(algo, name)(*args, **kwargs)
+    api_function.__name__ = name
+    return api_function
+
+
+for _name in API_METHODS:
+    globals()[_name] = _forward(_name)
+
+__all__ = list(API_METHODS) + [
+    'commission',
+    'date_rules',
+    'slippage',
+    'time_rules',
+]
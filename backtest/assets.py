@@ -0,0 +1,111 @@
+"""
+Assets and symbol lookup.
+"""
+import numpy as np
+import pandas as pd
+
+from .errors import SidsNotFound, SymbolNotFound
+
+
+class Equity(object):
+    """A tradeable US equity identified by its integer sid."""
+
+    __slots__ = ('sid', 'symbol', 'start_date', 'end_date', 'exchange')
+
+    def __init__(self, sid, symbol='', start_date=None, end_date=None,
+                 exchange='NYSE'):
+        self.sid = int(sid)
+        self.symbol = symbol
+        self.start_date = start_date
+        self.end_date = end_date
+        self.exchange = exchange
+
+    def __int__(self):
+        return self.sid
+
+    def __index__(self):
+        return self.sid
+
+    def __hash__(self):
+        return self.sid
+
+    def __eq__(self, other):
+        if isinstance(other, Equity):
+            return self.sid == other.sid
+        if isinstance(other, (int, np.integer)):
+            return self.sid == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        return self.sid < int(other)
+
+    def __reduce__(self):
+        return (Equity, (self.sid, self.symbol, self.start_date,
+                         self.end_date, self.exchange))
+
+    def __repr__(self):
+        if self.symbol:
+            return 'Equity(%d [%s])' % (self.sid, self.symbol)
+        return 'Equity(%d)' % self.sid
+
+
+class AssetFinder(object):
+    """
+    Maps sids and symbols to `Equity` objects and to their column in the
+    date x asset arrays used by the engine.
+    """
+
+    def __init__(self, equities):
+        self.equities = list(equities)
+        self.sids = np.array([e.sid for e in self.equities], dtype=np.int64)
+        self._by_sid = {e.sid: e for e in self.equities}
+        self._by_symbol = {}
+        for e in self.equities:
+            if e.symbol:
+                self._by_symbol.setdefault(e.symbol.upper(), []).append(e)
+        # Column position of each sid; sids are not required to be sorted.
+        self._order = np.argsort(self.sids, kind='mergesort')
+        self._sorted_sids = self.sids[self._order]
+        self.lookup_date = None
+
+    def __len__(self):
+        return len(self.equities)
+
+    def retrieve_asset(self, sid):
+        try:
+            return self._by_sid[int(sid)]
+        except KeyError:
+            raise SidsNotFound([sid])
+
+    def retrieve_all(self, sids):
+        return [self.retrieve_asset(s) for s in sids]
+
+    def lookup_symbol(self, symbol, as_of_date=None):
+        candidates = self._by_symbol.get(symbol.upper().replace('_', '.'))
+        if candidates is None:
+            candidates = self._by_symbol.get(symbol.upper())
+        if not candidates:
+            raise SymbolNotFound(symbol)
+        as_of_date = as_of_date if as_of_date is not None else self.lookup_date
+        if as_of_date is None or len(candidates) == 1:
+            return candidates[-1]
+        as_of_date = pd.Timestamp(as_of_date)
+        for e in reversed(candidates):
+            if e.start_date is None or e.start_date <= as_of_date:
+                return e
+        return candidates[0]
+
+    def indexer(self, assets):
+        """Column positions of `assets` (Equity objects or sids)."""
+        sids = np.fromiter((int(a) for a in assets), dtype=np.int64,
+                           count=len(assets))
+        pos = np.searchsorted(self._sorted_sids, sids)
+        pos[pos == len(self._sorted_sids)] = 0
+        missing = self._sorted_sids[pos] != sids
+        if missing.any():
+            raise SidsNotFound(sids[missing])
+        return self._order[pos]
@@ -0,0 +1,456 @@
+"""
+Benchmarks the algorithms in this repository on synthetic data::
+
+    python -m backtest.bench --assets 500,3000,8000 --years 1,5 \\
+        --output bench.json --baseline baseline.json
+
+For every universe size and history length, a bar store with earnings and
+fundamentals is generated once and memory-mapped by every case. Each
+(script, size) case runs in a fresh process and reports per stage:
+
+* ``pipeline``: computing every attached pipeline (all columns) for every
+  session, from a cold cache, once per pipeline and session;
+* ``before_trading_start``, ``handle_data`` and every other function the
+  script defines (``momentum``, ``reversal``, ``rebalance``,
+  ``earnings_call``, ...), timed inclusively across the full backtest;
+* ``backtest``: the full run.
+
+Each stage records calls, wall seconds and, with ``--allocations``, the
+largest traced allocation peak of any call (a second, slower pass with the
+`backtest.profiler.Profiler` tracing allocations). Every case also records
+the process's peak RSS. The report is JSON. `compare_reports` flags stages
+slower or hungrier than a stored baseline, and the CLI exits with status 1
+if any are found.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+import pandas as pd
+
+from .algorithm import TradingAlgorithm
+from .compat import install_quantopian_aliases
+from .data import OHLCV_FIELDS
+from .pipeline.cache import TermCache
+from .pipeline.data import morningstar
+from .pipeline.engine import PipelineEngine
+from .pipeline.loaders import (
+    EarningsCalendarIndex,
+    FundamentalsLoader,
+)
+from .profiler import Profiler
+from .store import (
+    create_daily_bars,
+    open_daily_bars,
+    open_loaders,
+    write_earnings_index,
+    write_fundamentals,
+)
+
+log = logging.getLogger(__name__)
+
+SESSIONS_PER_YEAR = 252
+
+# Symbols the scripts look up, and the benchmark sid two of them set.
+NAMED = ('AAPL', 'AMZN', 'GOOG.L', 'IBM', 'MSFT', 'NFLX', 'TSLA', 'YHOO')
+BENCHMARK_SID = 8554
+
+FUNDAMENTALS = {
+    morningstar.operation_ratios: {
+        'roa': (5.0, 6.0), 'roe': (12.0, 10.0), 'roic': (9.0, 8.0),
+        'gross_margin': (0.4, 0.2), 'operation_margin': (0.12, 0.1),
+        'net_margin': (0.08, 0.08),
+    },
+    morningstar.valuation_ratios: {
+        'pe_ratio': (18.0, 9.0), 'ps_ratio': (2.0, 1.5),
+        'pb_ratio': (2.5, 1.5), 'pcf_ratio': (11.0, 6.0),
+        'dividend_yield': (0.02, 0.015),
+    },
+}
+
+STAGE_FIELDS = ('script', 'assets', 'years', 'stage', 'calls', 'seconds',
+                'alloc_peak_bytes', 'rss_peak_bytes', 'error')
+
+
+# Synthetic data -----------------------------------------------------------
+
+def write_synthetic_bars(path, n_assets, n_sessions, seed=0,
+                         start='2002-01-02', chunk_rows=252):
+    """
+    Write a daily bar store of `n_assets` over `n_sessions` business days.
+
+    Prices follow a one-factor model with per-asset volatility (15-80% a
+    year), beta and drift, starting between $2 and $300. Dollar volume is
+    heavy-tailed across assets and rises with the size of the day's move.
+    About a fifth of the assets list late or delist early, and 0.2% of bars
+    are missing. Rows are generated a chunk at a time straight into the
+    memory-mapped store, so the universe can exceed memory.
+    """
+    rng = np.random.default_rng(seed)
+    sessions = pd.bdate_range(start, periods=n_sessions)
+    sids = np.arange(1, n_assets + 1, dtype=np.int64)
+    symbols = ['S%d' % sid for sid in sids]
+    for k, name in enumerate(NAMED[:n_assets]):
+        symbols[k] = name
+    if n_assets < BENCHMARK_SID:
+        sids[-1] = BENCHMARK_SID
+        symbols[-1] = 'SPY'
+
+    vol = rng.uniform(0.15, 0.8, n_assets) / np.sqrt(SESSIONS_PER_YEAR)
+    beta = rng.uniform(0.3, 1.6, n_assets)
+    drift = rng.normal(0.05, 0.1, n_assets) / SESSIONS_PER_YEAR
+    log_price = np.log(rng.lognormal(3.0, 1.0, n_assets).clip(2, 300))
+    shares = rng.lognormal(11.0, 1.5, n_assets)
+    first = np.where(rng.random(n_assets) < 0.1,
+                     rng.integers(0, n_sessions, n_assets), 0)
+    last = np.where(rng.random(n_assets) < 0.1,
+                    rng.integers(0, n_sessions, n_assets), n_sessions - 1)
+    last = np.maximum(first, last)
+    first[-1], last[-1] = 0, n_sessions - 1
+
+    out = create_daily_bars(path, sessions, sids, symbols, first, last)
+    previous = np.full(n_assets, np.nan)
+    for lo in range(0, n_sessions, chunk_rows):
+        hi = min(lo + chunk_rows, n_sessions)
+        rows = hi - lo
+        market = rng.normal(0.0003, 0.01, (rows, 1))
+        returns = (drift + beta * market +
+                   vol * rng.standard_t(5, (rows, n_assets)) * 0.77)
+        log_close = log_price + np.cumsum(returns, axis=0)
+        log_price = log_close[-1]
+        close = np.exp(log_close)
+        gap = np.exp(rng.normal(0, 0.3, (rows, n_assets)) * vol)
+        open_ = close * gap
+        high = np.maximum(open_, close) * (1 + np.abs(
+            rng.normal(0, 0.5, (rows, n_assets))) * vol)
+        low = np.minimum(open_, close) * (1 - np.abs(
+            rng.normal(0, 0.5, (rows, n_assets))) * vol).clip(0.5, 1)
+        volume = np.round(shares * rng.lognormal(0, 0.4, (rows, n_assets)) *
+                          (1 + 20 * np.abs(returns)))
+        index = np.arange(lo, hi)[:, None]
+        missing = ((index < first) | (index > last) |
+                   (rng.random((rows, n_assets)) < 0.002))
+        for values in (open_, high, low, close, volume):
+            values[missing] = np.nan
+        price = pd.DataFrame(np.vstack([previous[None, :], close])).ffill()
+        price = price.values[1:]
+        previous = price[-1]
+        for field, values in zip(OHLCV_FIELDS + ('price',),
+                                 (open_, high, low, close, volume, price)):
+            out[field][lo:hi] = values
+    for array in out.values():
+        array.flush()
+    del out
+    return open_daily_bars(path)
+
+
+def synthetic_earnings(sessions, sids, seed=1):
+    """
+    Quarterly announcements for every asset, each published two to six
+    weeks ahead (a tenth only on the day itself).
+    """
+    rng = np.random.default_rng(seed)
+    first = sessions[0] - pd.Timedelta(days=90)
+    n_quarters = int((sessions[-1] - first).days // 91) + 2
+    phase = rng.integers(0, 91, len(sids))
+    jitter = rng.integers(-5, 6, (len(sids), n_quarters))
+    days = (phase[:, None] + 91 * np.arange(n_quarters)[None, :] + jitter)
+    dates = first + pd.to_timedelta(days.ravel(), 'D')
+    notice = rng.integers(14, 43, days.size)
+    notice[rng.random(days.size) < 0.1] = 0
+    return pd.DataFrame({
+        'sid': np.repeat(sids, n_quarters),
+        'announcement_date': dates,
+        'timestamp': dates - pd.to_timedelta(notice, 'D'),
+    })
+
+
+def synthetic_fundamentals(dataset, sessions, sids, seed=2):
+    """
+    Quarterly filings for every field of `dataset`, published 30-60 days
+    after quarter end, each field a persistent random walk per asset.
+    """
+    rng = np.random.default_rng(seed)
+    first = sessions[0] - pd.Timedelta(days=120)
+    n_quarters = int((sessions[-1] - first).days // 91) + 1
+    n = len(sids)
+    published = (first + pd.to_timedelta(
+        (91 * np.arange(n_quarters)[None, :] +
+         rng.integers(30, 61, (n, n_quarters))).ravel(), 'D'))
+    frame = pd.DataFrame({'sid': np.repeat(sids, n_quarters),
+                          'timestamp': published})
+    for name, (mean, spread) in FUNDAMENTALS[dataset].items():
+        level = rng.normal(mean, spread, (n, 1))
+        walk = np.cumsum(rng.normal(0, spread * 0.15, (n, n_quarters)),
+                         axis=1)
+        values = (level + walk).ravel()
+        values[rng.random(values.size) < 0.03] = np.nan
+        frame[name] = values
+    return frame
+
+
+def make_dataset(path, n_assets, years, seed=0):
+    """
+    Write bars (`years` plus one year of warm-up), an earnings index and
+    fundamentals stores under `path`.
+    """
+    n_sessions = SESSIONS_PER_YEAR * (years + 1)
+    daily = write_synthetic_bars(os.path.join(path, 'daily'), n_assets,
+                                 n_sessions, seed)
+    sessions, sids = daily.sessions, daily.asset_finder.sids
+    write_earnings_index(
+        os.path.join(path, 'earnings'),
+        EarningsCalendarIndex.from_events(
+            sids, synthetic_earnings(sessions, sids, seed + 1)),
+    )
+    for k, dataset in enumerate(FUNDAMENTALS):
+        loader = FundamentalsLoader.from_frame(
+            sessions, sids, dataset,
+            synthetic_fundamentals(dataset, sessions, sids, seed + 2 + k),
+        )
+        write_fundamentals(os.path.join(path, dataset.__name__), loader)
+
+
+def open_dataset(path):
+    """The bars and pipeline loaders of a `make_dataset` directory."""
+    daily = open_daily_bars(os.path.join(path, 'daily'))
+    loaders = open_loaders(
+        daily, os.path.join(path, 'earnings'),
+        [os.path.join(path, dataset.__name__) for dataset in FUNDAMENTALS],
+    )
+    return daily, loaders
+
+
+# Measurement --------------------------------------------------------------
+
+def _reset_rss_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _rss_peak():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _script_functions(namespace, script):
+    """Functions defined by the script itself (not the injected API)."""
+    return [name for name, value in namespace.items()
+            if isinstance(value, types.FunctionType) and
+            value.__globals__ is namespace and
+            value.__code__.co_filename == script]
+
+
+def run_case(script, data, years, trace=False):
+    """
+    Benchmark one script on a `make_dataset` directory. Returns one row per
+    stage (see `STAGE_FIELDS`).
+    """
+    install_quantopian_aliases()
+    logging.getLogger('algorithm').setLevel(logging.ERROR)
+    logging.getLogger('backtest').setLevel(logging.ERROR)
+    _reset_rss_peak()
+    daily, loaders = open_dataset(data)
+    base = {'script': os.path.basename(script), 'assets': daily.shape[1],
+            'years': years}
+    stages = Profiler(allocations=trace)
+    start = daily.sessions[len(daily.sessions) - SESSIONS_PER_YEAR * years]
+    try:
+        with open(script) as f:
+            source = f.read()
+        algo = TradingAlgorithm(daily, script=source, start=start,
+                                loaders=loaders, algo_filename=script)
+        for name in _script_functions(algo.namespace, script):
+            algo.namespace[name] = stages.wrap(name, algo.namespace[name])
+        for attr, name in (('_initialize', 'initialize'),
+                           ('_before_trading_start', 'before_trading_start'),
+                           ('_handle_data', 'handle_data'),
+                           ('_analyze', 'analyze')):
+            if name in algo.namespace and getattr(algo, attr) is not None:
+                setattr(algo, attr, algo.namespace[name])
+        with stages.span('backtest'):
+            algo.run()
+        engine = PipelineEngine(daily, loaders, cache=TermCache(max_bytes=0))
+        for pipeline in algo._pipelines.values():
+            for i in range(algo.first_session, algo.last_session + 1):
+                with stages.span('pipeline'):
+                    pd.DataFrame(engine.run_pipeline(pipeline, i))
+    except Exception as e:
+        row = dict(base, stage='backtest', calls=0, seconds=None,
+                   alloc_peak_bytes=None, rss_peak_bytes=_rss_peak(),
+                   error='%s: %s' % (type(e).__name__, e))
+        return [row]
+    finally:
+        stages.disable()
+    rss = _rss_peak()
+    return [
+        dict(base, stage=name, calls=stat.calls, seconds=stat.total,
+             alloc_peak_bytes=stat.alloc_peak, rss_peak_bytes=rss,
+             error=None)
+        for name, stat in sorted(stages.stats.items())
+    ]
+
+
+def _run_case_job(job):
+    script, data, years, trace = job
+    return run_case(script, data, years, trace)
+
+
+def default_scripts(root='.'):
+    return sorted(
+        os.path.join(root, name) for name in os.listdir(root)
+        if name.endswith('.py') and not name.startswith('setup')
+    )
+
+
+def run_benchmarks(scripts, assets=(500, 3000, 8000), years=(1,),
+                   allocations=False, workdir=None, seed=0):
+    """
+    Benchmark every script at every size. Returns the report as a dict
+    (``{'environment': ..., 'results': [rows]}``).
+    """
+    workdir_owned = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='backtest-bench-')
+    rows = []
+    # One process per case, so RSS peaks and caches are per case.
+    pool = multiprocessing.get_context('fork').Pool(1, maxtasksperchild=1)
+    try:
+        for n_assets in assets:
+            for n_years in years:
+                data = os.path.join(workdir, '%d-%d' % (n_assets, n_years))
+                if not os.path.exists(os.path.join(data, 'daily',
+                                                   'meta.json')):
+                    started = time.time()
+                    make_dataset(data, n_assets, n_years, seed)
+                    log.info("Generated %d assets x %d years in %.1fs",
+                             n_assets, n_years, time.time() - started)
+                for script in scripts:
+                    timed = pool.apply(_run_case_job,
+                                       ((script, data, n_years, False),))
+                    if allocations and not timed[0]['error']:
+                        traced = pool.apply(_run_case_job,
+                                            ((script, data, n_years, True),))
+                        peaks = dict((r['stage'], r['alloc_peak_bytes'])
+                                     for r in traced)
+                        for row in timed:
+                            row['alloc_peak_bytes'] = peaks.get(row['stage'])
+                    for row in timed:
+                        log.info("%(script)s %(assets)d x %(years)d "
+                                 "%(stage)s: %(seconds)s s", row)
+                    rows.extend(timed)
+    finally:
+        pool.close()
+        pool.join()
+        if workdir_owned:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {'environment': _environment(), 'results': rows}
+
+
+def _environment():
+    return {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare_reports(report, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Stages of `report` that are slower, or whose allocation or RSS peak is
+    larger, than the same stage of `baseline` by more than `tolerance`
+    (a fraction), plus stages that now fail. Time differences below
+    `min_seconds` are ignored as noise. Returns a list of dicts.
+    """
+    def key(row):
+        return (row['script'], row['assets'], row['years'], row['stage'])
+
+    before = dict((key(row), row) for row in baseline['results'])
+    regressions = []
+    for row in report['results']:
+        old = before.get(key(row))
+        if old is None:
+            continue
+        if row['error'] and not old['error']:
+            regressions.append(dict(zip(('script', 'assets', 'years',
+                                         'stage'), key(row)),
+                                    metric='error', baseline=None,
+                                    current=row['error']))
+            continue
+        for metric, floor in (('seconds', min_seconds),
+                              ('alloc_peak_bytes', 0),
+                              ('rss_peak_bytes', 0)):
+            new, ref = row.get(metric), old.get(metric)
+            if new is None or ref is None:
+                continue
+            if new > ref * (1 + tolerance) and new - ref > floor:
+                regressions.append(dict(
+                    zip(('script', 'assets', 'years', 'stage'), key(row)),
+                    metric=metric, baseline=ref, current=new,
+                ))
+    return regressions
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest.bench')
+    parser.add_argument('scripts', nargs='*',
+                        help='algorithm files (default: every .py here)')
+    parser.add_argument('--assets', type=_int_list, default=[500, 3000, 8000])
+    parser.add_argument('--years', type=_int_list, default=[1])
+    parser.add_argument('--allocations', action='store_true',
+                        help='also trace allocation peaks (slower)')
+    parser.add_argument('--workdir',
+                        help='keep generated data here and reuse it')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    report = run_benchmarks(args.scripts or default_scripts(),
+                            assets=args.assets, years=args.years,
+                            allocations=args.allocations,
+                            workdir=args.workdir)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    frame = pd.DataFrame(report['results'], columns=STAGE_FIELDS)
+    print(frame.to_string(index=False))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION %(script)s %(assets)s x %(years)s %(stage)s "
+                  "%(metric)s: %(baseline)s -> %(current)s" % r)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Trading calendar: sessions, market minutes and early closes.
+"""
+import numpy as np
+import pandas as pd
+
+# Minutes are labelled by the end of the bar, so the first bar of a regular
+# session is 09:31 and the last is 16:00 (13:00 on early-close days).
+MARKET_OPEN = pd.Timedelta(hours=9, minutes=31)
+MARKET_CLOSE = pd.Timedelta(hours=16)
+EARLY_CLOSE = pd.Timedelta(hours=13)
+TIMEZONE = 'America/New_York'
+
+
+class TradingCalendar(object):
+    """
+    An ordered set of trading sessions.
+
+    Parameters
+    ----------
+    sessions : sequence of date-like
+        Midnight labels of every trading day.
+    early_closes : sequence of date-like, optional
+        Sessions on which the market closes at 13:00.
+    """
+
+    def __init__(self, sessions, early_closes=()):
+        self.sessions = pd.DatetimeIndex(sessions).normalize()
+        if self.sessions.tz is not None:
+            self.sessions = self.sessions.tz_localize(None)
+        self.early_closes = pd.DatetimeIndex(early_closes).normalize()
+        self.is_early_close = self.sessions.isin(self.early_closes)
+
+        # Business-day bookkeeping used by the date rules.
+        iso = self.sessions.isocalendar()
+        self._week_id = (iso.year.values.astype(np.int64) * 100 +
+                         iso.week.values.astype(np.int64))
+        self._month_id = (self.sessions.year.values.astype(np.int64) * 100 +
+                          self.sessions.month.values.astype(np.int64))
+
+    @classmethod
+    def from_range(cls, start, end, holidays=(), early_closes=()):
+        """Weekday calendar between `start` and `end`, minus `holidays`."""
+        days = pd.bdate_range(start, end)
+        days = days[~days.isin(pd.DatetimeIndex(holidays).normalize())]
+        return cls(days, early_closes)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def session_index(self, dt, side='left'):
+        """Position of the session containing (or following) `dt`."""
+        dt = pd.Timestamp(dt)
+        if dt.tz is not None:
+            dt = dt.tz_convert(TIMEZONE).tz_localize(None)
+        return int(self.sessions.searchsorted(dt.normalize(), side=side))
+
+    def session_open(self, i):
+        return self.sessions[i] + MARKET_OPEN
+
+    def session_close(self, i):
+        if self.is_early_close[i]:
+            return self.sessions[i] + EARLY_CLOSE
+        return self.sessions[i] + MARKET_CLOSE
+
+    def minutes_in_session(self, i):
+        """One-minute bars in session `i` (390, or 210 on half days)."""
+        return 210 if self.is_early_close[i] else 390
+
+    def session_lengths(self):
+        """`minutes_in_session` of every session, as an array."""
+        return np.where(self.is_early_close, 210, 390)
+
+    def minutes_for_session(self, i):
+        return pd.date_range(self.session_open(i),
+                             periods=self.minutes_in_session(i), freq='min')
+
+    def position_in_week(self, from_end=False):
+        """Ordinal of each session inside its week (0 = first trading day)."""
+        return _position_in_group(self._week_id, from_end)
+
+    def position_in_month(self, from_end=False):
+        """Ordinal of each session inside its month (0 = first trading day)."""
+        return _position_in_group(self._month_id, from_end)
+
+
+def _position_in_group(group_ids, from_end):
+    # group_ids is sorted, so each group is one contiguous run.
+    n = len(group_ids)
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+    ends = np.r_[starts[1:], n]
+    lengths = ends - starts
+    run_start = np.repeat(starts, lengths)
+    pos = np.arange(n) - run_start
+    if from_end:
+        pos = np.repeat(lengths, lengths) - 1 - pos
+    return pos
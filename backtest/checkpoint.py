@@ -0,0 +1,241 @@
+"""
+Checkpoints of a backtest's state between sessions::
+
+    python -m backtest algo.py --bars daily/ --end 2014-12-31 \\
+        --checkpoint-every 21 --checkpoint-dir ckpt/
+    python -m backtest algo.py --bars daily/ --resume ckpt/2014-12-31.ckpt
+
+A checkpoint holds everything a run carries from one session to the next:
+the ``context`` attributes, the ledger (cash and positions), the blotter
+(orders and the slippage and commission models), recorded values, the
+performance rows, running statistics and transactions so far, and the
+state of the pipeline engine's streaming kernels and incremental factors.
+It is one pickle, compressed with zlib, behind a short header. Assets are
+stored as sids and the functions and classes of the algorithm script by
+name, so a checkpoint only holds data.
+
+Resuming runs the script's ``initialize`` (to schedule functions and attach
+pipelines again), then replaces the state with the checkpoint's and carries
+on from the next session. Context attributes pinned by ``params`` keep the
+new run's value, so a sweep can resume every run from one shared warmed-up
+snapshot. The rest of a resumed run is bit-identical to the original one;
+`verify_resume` checks that.
+"""
+import hashlib
+import io
+import logging
+import os
+import pickle
+import tempfile
+import types
+import zlib
+
+import numpy as np
+
+from .assets import Equity
+from .finance import order as order_module
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'BTCKPT\x00'
+FORMAT_VERSION = 1
+
+
+def data_fingerprint(daily_reader):
+    """Digest of the sessions and sids a checkpoint was taken over."""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(
+        daily_reader.sessions.values.astype('datetime64[ns]')
+    ).view(np.int64).tobytes())
+    digest.update(np.ascontiguousarray(
+        daily_reader.asset_finder.sids, dtype=np.int64
+    ).tobytes())
+    return digest.hexdigest()
+
+
+class _Pickler(pickle.Pickler):
+
+    def __init__(self, file, namespace):
+        super(_Pickler, self).__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._names = dict(
+            (id(value), name) for name, value in namespace.items()
+            if isinstance(value, (types.FunctionType, type))
+        )
+
+    def persistent_id(self, obj):
+        if type(obj) is Equity:
+            return ('sid', obj.sid)
+        name = self._names.get(id(obj))
+        if name is not None:
+            return ('script', name)
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self, file, asset_finder, namespace):
+        super(_Unpickler, self).__init__(file)
+        self._finder = asset_finder
+        self._namespace = namespace
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        if kind == 'sid':
+            return self._finder.retrieve_asset(key)
+        if kind == 'script':
+            try:
+                return self._namespace[key]
+            except KeyError:
+                raise pickle.UnpicklingError(
+                    "The algorithm script no longer defines %r." % key
+                )
+        raise pickle.UnpicklingError("Unknown reference %r." % (pid,))
+
+
+def capture(algo, session):
+    """The state of `algo` after running session index `session`."""
+    engine = algo.pipeline_engine
+    context = dict(
+        (name, value) for name, value in algo.context.__dict__.items()
+        if not name.startswith('_')
+    )
+    blotter = algo.blotter
+    book, blotter._book = blotter._book, None
+    try:
+        state = {
+            'session': session,
+            'first_session': algo.first_session,
+            'data': data_fingerprint(algo.daily_reader),
+            'data_frequency': algo.data_frequency,
+            'script': algo._script_digest,
+            'context': context,
+            'ledger': algo.ledger,
+            'blotter': blotter,
+            'next_order_id': order_module.next_order_id(),
+            'recorder': algo.recorder,
+            'daily_perf': algo.daily_perf,
+            'analytics': algo.analytics,
+            'transactions': algo.transactions,
+            'benchmark': algo._benchmark,
+            'lookup_date': algo.asset_finder.lookup_date,
+            'kernels': _picklable(engine._kernels, algo.namespace),
+            'states': _picklable(engine._states, algo.namespace),
+        }
+        return _dumps(state, algo.namespace)
+    finally:
+        blotter._book = book
+
+
+def _picklable(entries, namespace):
+    # A term whose identity or state cannot be pickled is rebuilt from its
+    # full window after resuming.
+    out = {}
+    for identity, entry in entries.items():
+        try:
+            _dumps((identity, entry), namespace)
+        except Exception as e:
+            log.warning("Not checkpointing the state of %r: %s", identity, e)
+            continue
+        out[identity] = entry
+    return out
+
+
+def _dumps(obj, namespace):
+    buf = io.BytesIO()
+    _Pickler(buf, namespace).dump(obj)
+    return buf.getvalue()
+
+
+def write_checkpoint(path, payload):
+    """Write a payload returned by `capture` to `path`, atomically."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(bytes([FORMAT_VERSION]))
+        f.write(zlib.compress(payload, 6))
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path):
+    """The payload stored in `path` by `write_checkpoint`."""
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a backtest checkpoint." % path)
+        if header[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError("%s has checkpoint format %d, expected %d."
+                             % (path, header[len(MAGIC)], FORMAT_VERSION))
+        return zlib.decompress(f.read())
+
+
+def load(payload, algo):
+    """Unpickle a checkpoint payload for `algo`, checking it fits."""
+    state = _Unpickler(io.BytesIO(payload), algo.asset_finder,
+                       algo.namespace).load()
+    if state['data'] != data_fingerprint(algo.daily_reader):
+        raise ValueError("The checkpoint was taken over other bars (other "
+                         "sessions or assets).")
+    if state['data_frequency'] != algo.data_frequency:
+        raise ValueError("The checkpoint was taken in %s mode."
+                         % state['data_frequency'])
+    if state['script'] != algo._script_digest:
+        log.warning("The checkpoint was taken with a different version of "
+                    "the algorithm script.")
+    return state
+
+
+def restore(algo, state):
+    """Replace the state of an initialized `algo` with `state`."""
+    context = algo.context
+    pinned = context._pinned
+    for name, value in state['context'].items():
+        if name not in pinned:
+            context.__dict__[name] = value
+    algo.ledger = state['ledger']
+    # Models set in initialize are rebuilt there, but the checkpoint has
+    # the ones in use when it was taken.
+    algo.blotter = state['blotter']
+    order_module.set_next_order_id(state['next_order_id'])
+    algo.recorder = state['recorder']
+    algo.daily_perf = state['daily_perf']
+    algo.analytics = state['analytics']
+    algo.transactions = state['transactions']
+    algo._benchmark = state['benchmark']
+    algo.asset_finder.lookup_date = state['lookup_date']
+    engine = algo.pipeline_engine
+    engine._kernels.update(state['kernels'])
+    engine._states.update(state['states'])
+
+
+def verify_resume(script, daily_reader, at, **kwargs):
+    """
+    Run `script` straight through, then again up to session `at` with a
+    checkpoint there, and resume a third run from that checkpoint. The
+    resumed run's performance frame and transactions must equal the
+    straight run's exactly. Returns the checkpoint's size in bytes, or
+    raises AssertionError.
+    """
+    from .algorithm import load_algorithm
+
+    def run(**extra):
+        order_module.set_next_order_id(1)
+        options = dict(kwargs)
+        options.update(extra)
+        algo = load_algorithm(script, daily_reader, **options)
+        return algo, algo.run()
+
+    straight, expected = run()
+    with tempfile.TemporaryDirectory(prefix='backtest-ckpt-') as scratch:
+        path = os.path.join(scratch, 'warm.ckpt')
+        warm, _ = run(end=at)
+        warm.save_checkpoint(path)
+        size = os.path.getsize(path)
+        resumed, got = run(resume_from=path)
+    if not got.equals(expected):
+        raise AssertionError("The resumed performance frame differs from "
+                             "the straight run.")
+    if not resumed.transactions_frame().equals(
+            straight.transactions_frame()):
+        raise AssertionError("The resumed transactions differ from the "
+                             "straight run.")
+    return size
@@ -0,0 +1,383 @@
+"""
+Run several algorithms as capital sleeves of one account::
+
+    python -m backtest.combined cross-sectionalMomentum.py=0.5 \\
+        momentumReversal-EarningsCall.py=0.3 --bars daily/
+
+Each sleeve is a `TradingAlgorithm` with its own ``context``, portfolio and
+``weight * capital_base`` of capital, so its sizing and bookkeeping are the
+same as when it runs alone. All sleeves read the same `BarData` and the same
+`PipelineEngine`, so bars, history panels and pipeline terms the sleeves have
+in common are loaded and computed once.
+
+Sleeve orders never reach the market directly. After every bar's callbacks
+the open sleeve orders are summed per asset and the account holds one order
+for the net amount. On the next bar, opposite sleeve orders in an asset
+first cross internally at the bar's close, with no commission or slippage.
+The account's fills are then shared among the remaining orders pro rata.
+Opposite orders of one sleeve net the same way. Fills use the slippage and
+commission models of the first sleeve.
+"""
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from .algorithm import (
+    TradingAlgorithm,
+    _is_noop,
+    get_algo_instance,
+    set_algo_instance,
+)
+from .compat import install_quantopian_aliases
+from .finance import order as order_status
+from .finance.order import Transaction
+from .store import open_daily_bars, open_loaders, open_minute_bars
+
+log = logging.getLogger(__name__)
+
+
+class CombinedAlgorithm(TradingAlgorithm):
+    """
+    Parameters
+    ----------
+    daily_reader : DailyBarReader
+    sleeves : dict[str -> (str, float)]
+        Sleeve name -> (algorithm source or ``.py`` path, fraction of
+        `capital_base`). Capital not given to a sleeve stays in cash.
+    start, end, capital_base, data_frequency, minute_reader, loaders,
+    term_cache, universes
+        As for `TradingAlgorithm`; shared by every sleeve.
+
+    After `run`, `sleeve_perfs` holds each sleeve's own performance frame.
+    The combined frame adds a ``<name>_value`` column per sleeve and
+    ``crossed_shares``, the shares crossed between sleeves that day.
+    """
+
+    def __init__(self, daily_reader, sleeves, start=None, end=None,
+                 capital_base=1e6, data_frequency='daily',
+                 minute_reader=None, loaders=None, term_cache=None,
+                 universes=None):
+        super(CombinedAlgorithm, self).__init__(
+            daily_reader, start=start, end=end, capital_base=capital_base,
+            data_frequency=data_frequency, minute_reader=minute_reader,
+            loaders=loaders, term_cache=term_cache, universes=universes,
+        )
+        if sum(weight for _, weight in sleeves.values()) > 1 + 1e-9:
+            raise ValueError("Sleeve weights add up to more than 1.")
+        self.sleeves = {}
+        for name, (script, weight) in sleeves.items():
+            filename = '<%s>' % name
+            if '\n' not in script and script.endswith('.py'):
+                filename = script
+                with open(script) as f:
+                    script = f.read()
+            sleeve = TradingAlgorithm(
+                daily_reader, script=script, start=start, end=end,
+                capital_base=weight * capital_base,
+                data_frequency=data_frequency, minute_reader=minute_reader,
+                loaders=loaders, term_cache=term_cache,
+                algo_filename=filename,
+            )
+            sleeve.data = self.data
+            sleeve.pipeline_engine = self.pipeline_engine
+            self.sleeves[name] = sleeve
+        self.sleeve_perfs = {}
+        self._crossed = 0
+
+    # Simulation ---------------------------------------------------------
+
+    def run(self):
+        """Run every sleeve and return the combined performance frame."""
+        previous = get_algo_instance()
+        try:
+            for sleeve in self.sleeves.values():
+                set_algo_instance(sleeve)
+                sleeve._run_initialize()
+            self._initialized = True
+            first = next(iter(self.sleeves.values()), None)
+            if first is not None:
+                self.blotter.slippage = first.blotter.slippage
+                self.blotter.commission = first.blotter.commission
+            for sleeve in self.sleeves.values():
+                if sleeve._benchmark is not None:
+                    self._benchmark = sleeve._benchmark
+                    break
+
+            for i in range(self.first_session, self.last_session + 1):
+                self._run_session(i)
+
+            for name, sleeve in self.sleeves.items():
+                set_algo_instance(sleeve)
+                self.sleeve_perfs[name] = sleeve._finish()
+            return self._perf_frame()
+        finally:
+            set_algo_instance(previous)
+
+    def _run_session(self, i):
+        self._session = i
+        sleeves = list(self.sleeves.values())
+        for sleeve in sleeves:
+            sleeve._session = i
+            sleeve._pipeline_cache.clear()
+        self.data._set_session(max(i - 1, 0))
+        for sleeve in sleeves:
+            if sleeve._before_trading_start is not None:
+                _call(sleeve, 'before_trading_start',
+                      sleeve._before_trading_start)
+        self.data._set_session(i)
+
+        if self.data_frequency == 'daily':
+            self._process_fills(self.daily_reader, i)
+            dt = self.data.current_dt
+            self.blotter.cancel_all(warn=True, placed_before=dt)
+            for sleeve in sleeves:
+                sleeve.blotter.cancel_all(placed_before=dt)
+            for sleeve in sleeves:
+                for _, func in sleeve.event_manager.events_for_session(i):
+                    _call(sleeve, None, func)
+                if sleeve._handle_data is not None:
+                    _call(sleeve, 'handle_data', sleeve._handle_data)
+            self._net_orders()
+            close = self.daily_reader.field('price')[i]
+        else:
+            close = self._run_minutes(i)
+
+        dt = self.data.current_dt
+        for sleeve in sleeves:
+            sleeve.ledger.mark_to_market(close, dt)
+            sleeve._end_of_day(i)
+        self.ledger.mark_to_market(close, dt)
+        self._end_of_day(i)
+
+    def _run_minutes(self, i):
+        reader = self.minute_reader
+        start, stop = reader.session_starts[i], reader.session_stops[i]
+        sleeves = list(self.sleeves.values())
+        if self._trigger_rows is None:
+            self._trigger_rows = [
+                s.event_manager.triggers.minute_rows(reader) for s in sleeves
+            ]
+            self._skip_idle = all(s._handle_data is None or
+                                  _is_noop(s._handle_data) for s in sleeves)
+        triggers = [s.event_manager.triggers for s in sleeves]
+        cursors = [t.offsets[i] for t in triggers]
+        ends = [t.offsets[i + 1] for t in triggers]
+        prices = reader.field('price')
+        row = start
+        while row < stop:
+            self.data._set_minute(row)
+            self._process_fills(reader, row)
+            dt = self.data.current_dt
+            self.ledger.mark_lazily(prices[row], dt)
+            for sleeve in sleeves:
+                sleeve.ledger.mark_lazily(prices[row], dt)
+            for n, sleeve in enumerate(sleeves):
+                rows, k = self._trigger_rows[n], cursors[n]
+                while k < ends[n] and rows[k] == row:
+                    t = triggers[n]
+                    _call(sleeve, None, t.funcs[t.events[k]])
+                    k += 1
+                cursors[n] = k
+                if sleeve._handle_data is not None:
+                    _call(sleeve, 'handle_data', sleeve._handle_data)
+            self._net_orders()
+            row += 1
+            if self._skip_idle and not self._orders_open():
+                due = [self._trigger_rows[n][k]
+                       for n, k in enumerate(cursors) if k < ends[n]]
+                row = max(row, min(due) if due else stop)
+        self.blotter.cancel_all(warn=True)
+        for sleeve in sleeves:
+            sleeve.blotter.cancel_all()
+        if stop > start:
+            self.data._set_minute(stop - 1)
+            return prices[stop - 1]
+        return self.daily_reader.field('price')[i]
+
+    def _orders_open(self):
+        return bool(self.blotter.open_orders) or any(
+            s.blotter.open_orders for s in self.sleeves.values()
+        )
+
+    # Netting ------------------------------------------------------------
+
+    def _sleeve_orders(self):
+        """Asset -> [(sleeve, open order)], sleeves and orders oldest first."""
+        book = {}
+        for sleeve in self.sleeves.values():
+            for asset, orders in sleeve.blotter.open_orders.items():
+                book.setdefault(asset, []).extend(
+                    (sleeve, order) for order in orders
+                )
+        return book
+
+    def _net_orders(self):
+        """Make the account's open orders the net of the sleeves' orders."""
+        wanted = dict(
+            (asset, sum(o.open_amount for _, o in entries))
+            for asset, entries in self._sleeve_orders().items()
+        )
+        placed = dict(
+            (asset, sum(o.open_amount for o in orders))
+            for asset, orders in self.blotter.open_orders.items()
+        )
+        assets = list(wanted)
+        assets.extend(a for a in placed if a not in wanted)
+        dt = self.data.current_dt
+        for asset in assets:
+            amount = wanted.get(asset, 0)
+            if amount == placed.get(asset, 0):
+                continue
+            for order in list(self.blotter.open_orders.get(asset, ())):
+                self.blotter.cancel(order.id)
+            if amount:
+                self.blotter.order(asset, amount, dt)
+
+    def _process_fills(self, reader, row):
+        if not self._orders_open():
+            return
+        price = reader.field('close')[row]
+        volume = reader.field('volume')[row]
+        dt = self.data.current_dt
+        column_of = self._column_of
+        book = self._sleeve_orders()
+        for asset, entries in book.items():
+            self._cross(asset, entries, price, dt)
+        if not self.blotter.open_orders:
+            return
+        txns = self.blotter.process_bar(dt, price, volume, column_of)
+        for txn in txns:
+            column = column_of(txn.asset)
+            self.ledger.process_transaction(txn, column)
+            entries = [(s, o) for s, o in book.get(txn.asset, ())
+                       if o.open and (o.open_amount > 0) == (txn.amount > 0)]
+            _fill_sleeves(entries, txn.amount, txn.price, txn.commission,
+                          dt, column)
+        self.transactions.extend(txns)
+
+    def _cross(self, asset, entries, price, dt):
+        """Fill opposite sleeve orders in `asset` against each other."""
+        buys = [(s, o) for s, o in entries if o.open_amount > 0]
+        sells = [(s, o) for s, o in entries if o.open_amount < 0]
+        if not buys or not sells:
+            return
+        column = self._column_of(asset)
+        if np.isnan(price[column]):
+            return
+        crossed = min(sum(o.open_amount for _, o in buys),
+                      -sum(o.open_amount for _, o in sells))
+        _fill_sleeves(buys, crossed, price[column], 0.0, dt, column)
+        _fill_sleeves(sells, -crossed, price[column], 0.0, dt, column)
+        self._crossed += crossed
+
+    def _end_of_day(self, i):
+        super(CombinedAlgorithm, self)._end_of_day(i)
+        row = self.daily_perf[-1]
+        for name, sleeve in self.sleeves.items():
+            row[name + '_value'] = sleeve.ledger.portfolio.portfolio_value
+        row['crossed_shares'] = self._crossed
+        self._crossed = 0
+
+
+def _call(sleeve, name, func):
+    set_algo_instance(sleeve)
+    sleeve._call(name, func)
+
+
+def _fill_sleeves(entries, amount, price, commission, dt, column):
+    """
+    Share a fill of `amount` shares among sleeve orders `entries` in
+    proportion to their open amounts (largest remainders get the odd
+    shares), with `commission` split by shares.
+    """
+    if not entries:
+        raise AssertionError("No sleeve order to allocate a fill of %d "
+                             "shares to." % amount)
+    opens = np.array([o.open_amount for _, o in entries], dtype=np.float64)
+    exact = opens * (amount / opens.sum())
+    shares = np.trunc(exact).astype(np.int64)
+    left = int(amount - shares.sum())
+    if left:
+        order = np.argsort(-np.abs(exact - shares), kind='stable')
+        shares[order[:abs(left)]] += np.sign(left)
+    for (sleeve, order), filled in zip(entries, shares.tolist()):
+        if not filled:
+            continue
+        cost = commission * filled / amount
+        order.filled += filled
+        order.commission += cost
+        if order.open_amount == 0:
+            order.status = order_status.FILLED
+            blotter = sleeve.blotter
+            group = blotter.open_orders[order.asset]
+            group.remove(order)
+            if not group:
+                del blotter.open_orders[order.asset]
+            blotter._book = None
+        txn = Transaction(order.asset, filled, dt, price, order.id, cost)
+        sleeve.ledger.process_transaction(txn, column)
+        sleeve.transactions.append(txn)
+
+
+def _sleeve_arg(text):
+    script, _, weight = text.rpartition('=')
+    if not script:
+        raise argparse.ArgumentTypeError("expected SCRIPT=WEIGHT")
+    return script, float(weight)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest.combined')
+    parser.add_argument('sleeves', nargs='+', type=_sleeve_arg,
+                        metavar='SCRIPT=WEIGHT')
+    parser.add_argument('--bars', required=True,
+                        help='daily bar store directory')
+    parser.add_argument('--minute-bars', help='minute bar store directory')
+    parser.add_argument('--earnings',
+                        help='earnings calendar store directory written by '
+                             'backtest.store.write_earnings_index')
+    parser.add_argument('--fundamentals', action='append', default=[],
+                        help='fundamentals store directory written by '
+                             'backtest.store.write_fundamentals (repeat for '
+                             'each dataset)')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--capital-base', type=float, default=1e6)
+    parser.add_argument('--universes',
+                        help='universe mask store directory written by '
+                             'python -m backtest.universe')
+    parser.add_argument('--output', help='write daily performance to CSV')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    install_quantopian_aliases()
+    daily = open_daily_bars(args.bars)
+    kwargs = {}
+    if args.earnings or args.fundamentals:
+        kwargs['loaders'] = open_loaders(daily, args.earnings,
+                                         args.fundamentals)
+    if args.minute_bars:
+        kwargs['minute_reader'] = open_minute_bars(args.minute_bars,
+                                                   daily.calendar)
+        kwargs['data_frequency'] = 'minute'
+    sleeves = dict(
+        (os.path.splitext(os.path.basename(script))[0], (script, weight))
+        for script, weight in args.sleeves
+    )
+    algo = CombinedAlgorithm(daily, sleeves, start=args.start, end=args.end,
+                             capital_base=args.capital_base,
+                             universes=args.universes, **kwargs)
+    perf = algo.run()
+    if args.output:
+        perf.to_csv(args.output)
+    else:
+        print(perf.tail())
+    log.info("Crossed %d shares between sleeves; paid %.2f commission.",
+             perf['crossed_shares'].sum() if len(perf) else 0,
+             sum(t.commission for t in algo.transactions))
+
+
+if __name__ == '__main__':
+    main()
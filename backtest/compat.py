@@ -0,0 +1,40 @@
+"""
+Makes ``quantopian.*`` imports in algorithm scripts resolve to this package.
+"""
+import importlib
+import sys
+import types
+
+ALIASES = {
+    'quantopian.algorithm': 'backtest.api',
+    'quantopian.optimize': 'backtest.optimize',
+    'quantopian.pipeline': 'backtest.pipeline',
+    'quantopian.pipeline.classifiers': 'backtest.pipeline.classifiers',
+    'quantopian.pipeline.classifiers.morningstar':
+        'backtest.pipeline.classifiers.morningstar',
+    'quantopian.pipeline.data': 'backtest.pipeline.data',
+    'quantopian.pipeline.data.builtin': 'backtest.pipeline.data.builtin',
+    'quantopian.pipeline.data.eventvestor':
+        'backtest.pipeline.data.eventvestor',
+    'quantopian.pipeline.data.morningstar':
+        'backtest.pipeline.data.morningstar',
+    'quantopian.pipeline.factors': 'backtest.pipeline.factors',
+    'quantopian.pipeline.factors.eventvestor':
+        'backtest.pipeline.factors.eventvestor',
+    'quantopian.pipeline.filters': 'backtest.pipeline.filters',
+    'quantopian.pipeline.filters.morningstar':
+        'backtest.pipeline.filters.morningstar',
+}
+
+
+def install_quantopian_aliases():
+    """Register the ``quantopian`` package and submodules in sys.modules."""
+    if 'quantopian' not in sys.modules:
+        root = types.ModuleType('quantopian')
+        root.__path__ = []
+        sys.modules['quantopian'] = root
+    for alias, target in sorted(ALIASES.items()):
+        module = importlib.import_module(target)
+        sys.modules[alias] = module
+        parent, _, child = alias.rpartition('.')
+        setattr(sys.modules[parent], child, module)
@@ -0,0 +1,558 @@
+"""
+Locally stored daily and minute bars, and the `data` object handed to
+algorithm callbacks.
+
+Bars are held as one float64 array per field laid out date x asset, so a
+simulation step is a row lookup rather than a per-bar object.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .assets import AssetFinder, Equity
+from .calendar import TradingCalendar
+
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def ffill_rows(values):
+    """Forward-fill NaNs down the first axis of a 2D array."""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = np.take_along_axis(values, idx, axis=0)
+    # Leading NaNs have nothing to fill from and stay NaN.
+    seen = np.logical_or.accumulate(valid, axis=0)
+    filled[~seen] = np.nan
+    return filled
+
+
+def _first_last_valid(values):
+    valid = ~np.isnan(values)
+    any_valid = valid.any(axis=0)
+    first = np.where(any_valid, valid.argmax(axis=0), len(values))
+    last = np.where(any_valid,
+                    len(values) - 1 - valid[::-1].argmax(axis=0), -1)
+    return first, last
+
+
+def _equities_from_npz(npz):
+    symbols = npz['symbols'] if 'symbols' in npz.files else None
+    return [
+        Equity(sid, str(symbols[i]) if symbols is not None else '')
+        for i, sid in enumerate(npz['sids'])
+    ]
+
+
+class DailyBarReader(object):
+    """
+    Daily OHLCV bars for a fixed set of assets.
+
+    Parameters
+    ----------
+    sessions : sequence of date-like
+        Trading days, one per row of every field array.
+    equities : sequence of Equity
+        One per column of every field array.
+    arrays : dict[str -> np.ndarray]
+        ``open``, ``high``, ``low``, ``close`` and ``volume`` arrays of shape
+        ``(len(sessions), len(equities))``. Missing bars are NaN.
+    early_closes : sequence of date-like, optional
+    derived : dict, optional
+        Precomputed ``price`` array and ``first_traded`` / ``last_traded``
+        row indices, as stored by `backtest.store`. Computed from ``close``
+        when omitted.
+    """
+
+    def __init__(self, sessions, equities, arrays, early_closes=(),
+                 derived=None):
+        self.calendar = TradingCalendar(sessions, early_closes)
+        self.asset_finder = AssetFinder(equities)
+        shape = (len(self.calendar), len(self.asset_finder))
+        self._arrays = {}
+        for field in OHLCV_FIELDS:
+            values = np.asarray(arrays[field], dtype=np.float64)
+            if values.shape != shape:
+                raise ValueError(
+                    "%s bars have shape %s, expected %s"
+                    % (field, values.shape, shape)
+                )
+            self._arrays[field] = values
+        self._init_derived(derived)
+
+    def _init_derived(self, derived=None):
+        if derived is None:
+            close = self._arrays['close']
+            derived = {'price': ffill_rows(close)}
+            derived['first_traded'], derived['last_traded'] = \
+                _first_last_valid(close)
+        self._arrays['price'] = derived['price']
+        self.first_traded = np.asarray(derived['first_traded'])
+        self.last_traded = np.asarray(derived['last_traded'])
+        sessions = self.calendar.sessions
+        for e, first, last in zip(self.asset_finder.equities,
+                                  self.first_traded, self.last_traded):
+            if e.start_date is None and first < len(sessions):
+                e.start_date = sessions[first]
+            if e.end_date is None and last >= 0:
+                e.end_date = sessions[last]
+
+    @property
+    def sessions(self):
+        return self.calendar.sessions
+
+    @property
+    def shape(self):
+        return self._arrays['close'].shape
+
+    def field(self, name):
+        """The full date x asset array for `name` (read-only by convention)."""
+        return self._arrays[name]
+
+    def window(self, name, start, stop):
+        """
+        Rows ``[start, stop)`` of field `name`. Rows before the first session
+        are padded with NaN.
+        """
+        values = self._arrays[name]
+        if start >= 0:
+            return values[start:stop]
+        pad = np.full((-start, values.shape[1]), np.nan)
+        return np.vstack([pad, values[:max(stop, 0)]])
+
+    @classmethod
+    def load(cls, path):
+        """Read bars written by `write`."""
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(
+                pd.to_datetime(npz['sessions']),
+                _equities_from_npz(npz),
+                {f: npz[f] for f in OHLCV_FIELDS},
+                pd.to_datetime(npz['early_closes'])
+                if 'early_closes' in npz.files else (),
+            )
+
+    def write(self, path):
+        finder = self.asset_finder
+        np.savez(
+            path,
+            sessions=self.sessions.values.astype('datetime64[ns]'),
+            early_closes=self.calendar.early_closes.values.astype(
+                'datetime64[ns]'),
+            sids=finder.sids,
+            symbols=np.array([e.symbol for e in finder.equities]),
+            **{f: self._arrays[f] for f in OHLCV_FIELDS}
+        )
+
+    @classmethod
+    def from_frame(cls, frame, early_closes=()):
+        """
+        Build bars from a long DataFrame with ``date``, ``sid``, OHLCV and an
+        optional ``symbol`` column.
+        """
+        frame = frame.copy()
+        frame['date'] = pd.to_datetime(frame['date']).dt.normalize()
+        sessions = pd.DatetimeIndex(sorted(frame['date'].unique()))
+        sids = np.sort(frame['sid'].unique())
+        symbols = {}
+        if 'symbol' in frame:
+            symbols = dict(zip(frame['sid'], frame['symbol']))
+        rows = sessions.get_indexer(frame['date'])
+        cols = np.searchsorted(sids, frame['sid'].values)
+        arrays = {}
+        for f in OHLCV_FIELDS:
+            values = np.full((len(sessions), len(sids)), np.nan)
+            values[rows, cols] = frame[f].values
+            arrays[f] = values
+        equities = [Equity(s, symbols.get(s, '')) for s in sids]
+        return cls(sessions, equities, arrays, early_closes)
+
+
+class MinuteBarReader(object):
+    """
+    Minute OHLCV bars sharing the asset columns of a `DailyBarReader`.
+
+    Parameters
+    ----------
+    minutes : sequence of datetime-like
+        Bar labels (end of minute, exchange-local and naive), sorted.
+    arrays : dict[str -> np.ndarray]
+        Field arrays of shape ``(len(minutes), n_assets)``.
+    calendar : TradingCalendar
+        Calendar of the daily bars; every minute must fall in one of its
+        sessions.
+    derived : dict, optional
+        Precomputed ``price`` array and ``session_starts`` /
+        ``session_stops`` row bounds, as stored by `backtest.store`.
+    """
+
+    def __init__(self, minutes, arrays, calendar, derived=None):
+        self.minutes = pd.DatetimeIndex(minutes)
+        self.calendar = calendar
+        self._arrays = {
+            f: np.asarray(arrays[f], dtype=np.float64) for f in OHLCV_FIELDS
+        }
+        if derived is None:
+            days = self.minutes.normalize()
+            derived = {
+                'price': ffill_rows(self._arrays['close']),
+                'session_starts': days.searchsorted(calendar.sessions,
+                                                    'left'),
+                'session_stops': days.searchsorted(calendar.sessions,
+                                                   'right'),
+            }
+        self._arrays['price'] = derived['price']
+        self.session_starts = np.asarray(derived['session_starts'])
+        self.session_stops = np.asarray(derived['session_stops'])
+
+    def field(self, name):
+        return self._arrays[name]
+
+    def window(self, name, start, stop):
+        values = self._arrays[name]
+        if start >= 0:
+            return values[start:stop]
+        pad = np.full((-start, values.shape[1]), np.nan)
+        return np.vstack([pad, values[:max(stop, 0)]])
+
+    @classmethod
+    def load(cls, path, calendar):
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(
+                pd.to_datetime(npz['minutes']),
+                {f: npz[f] for f in OHLCV_FIELDS},
+                calendar,
+            )
+
+    def write(self, path):
+        np.savez(
+            path,
+            minutes=self.minutes.values.astype('datetime64[ns]'),
+            **{f: self._arrays[f] for f in OHLCV_FIELDS}
+        )
+
+
+class HistoryPanel(object):
+    """
+    The trailing `capacity` rows of a date x asset array, kept resident.
+
+    Row t is written at both ``t % capacity`` and ``t % capacity + capacity``
+    of a buffer twice that size, so the last n rows are always one
+    contiguous slice and every window is a view. Moving forward one row
+    copies one row (twice). Rows before the start of `source` are NaN.
+
+    Parameters
+    ----------
+    source : np.ndarray
+        ``n_rows x n_assets`` values to follow.
+    capacity : int
+        Longest window served.
+    """
+
+    def __init__(self, source, capacity):
+        self.source = source
+        self.capacity = capacity
+        self.stop = 0
+        self._buffer = np.full((2 * capacity, source.shape[1]), np.nan)
+        # Whether the last row was replaced with `set_last`.
+        self._dirty = False
+
+    def seek(self, stop):
+        """Hold rows ``[stop - capacity, stop)`` of `source`."""
+        if self._dirty:
+            self._write(self.stop - 1, self.source[self.stop - 1])
+            self._dirty = False
+        if self.stop <= stop < self.stop + self.capacity:
+            for t in range(self.stop, stop):
+                self._write(t, self.source[t])
+        elif stop != self.stop:
+            self._buffer[:] = np.nan
+            start = max(stop - self.capacity, 0)
+            at = np.arange(start, stop) % self.capacity
+            self._buffer[at] = self.source[start:stop]
+            self._buffer[at + self.capacity] = self.source[start:stop]
+        self.stop = stop
+
+    def set_last(self, row):
+        """Replace the last row held (until the next `seek`)."""
+        self._write(self.stop - 1, row)
+        self._dirty = True
+
+    def window(self, bar_count):
+        """Read-only view of the last `bar_count` rows."""
+        end = self.stop % self.capacity + self.capacity
+        view = self._buffer[end - bar_count:end]
+        view.flags.writeable = False
+        return view
+
+    def _write(self, t, row):
+        k = t % self.capacity
+        self._buffer[k] = row
+        self._buffer[k + self.capacity] = row
+
+
+class BarData(object):
+    """
+    The ``data`` argument of algorithm callbacks.
+
+    The simulation loop moves the cursor (`_session` and, in minute mode,
+    `_minute`); every lookup is then a row or slice of the bar arrays.
+    """
+
+    def __init__(self, daily_reader, minute_reader=None,
+                 data_frequency='daily'):
+        self._daily = daily_reader
+        self._minute = minute_reader
+        self._finder = daily_reader.asset_finder
+        self.data_frequency = data_frequency
+        self._session = 0
+        self._minute_row = None
+        # field -> HistoryPanel of daily bars with today's forming bar last
+        # (minute mode).
+        self._panels = {}
+        # field -> [session, next minute row, values] of the forming bar.
+        self._forming = {}
+
+    # Cursor -------------------------------------------------------------
+
+    def _set_session(self, i):
+        self._session = i
+        self._minute_row = None
+
+    def _set_minute(self, row):
+        self._minute_row = row
+
+    @property
+    def current_dt(self):
+        if self._minute_row is not None:
+            return self._minute.minutes[self._minute_row]
+        return self._daily.calendar.session_close(self._session)
+
+    @property
+    def current_session(self):
+        return self._daily.sessions[self._session]
+
+    def _current_row(self, field):
+        """Values of `field` for every asset on the current bar."""
+        if self._minute_row is not None:
+            return self._minute.field(field)[self._minute_row]
+        return self._daily.field(field)[self._session]
+
+    # Public API ---------------------------------------------------------
+
+    def current(self, assets, fields):
+        """
+        Latest value of `fields` for `assets`. ``price`` is the last traded
+        close, forward-filled; the OHLCV fields are NaN (volume 0) when the
+        asset did not trade on the current bar.
+        """
+        single_asset = isinstance(assets, Equity)
+        single_field = isinstance(fields, str)
+        assets_ = [assets] if single_asset else list(assets)
+        fields_ = [fields] if single_field else list(fields)
+        cols = self._finder.indexer(assets_)
+        values = {}
+        for f in fields_:
+            if f == 'last_traded':
+                values[f] = self._last_traded(cols)
+                continue
+            row = self._current_row(f)[cols]
+            if f == 'volume':
+                row = np.nan_to_num(row)
+            values[f] = row
+        if single_asset and single_field:
+            return values[fields_[0]][0]
+        if single_field:
+            return pd.Series(values[fields_[0]], index=assets_)
+        if single_asset:
+            return pd.Series({f: values[f][0] for f in fields_})
+        return pd.DataFrame(values, index=assets_, columns=fields_)
+
+    def _last_traded(self, cols):
+        if self._minute_row is not None:
+            labels = self._minute.minutes
+            close = self._minute.field('close')
+            row = self._minute_row
+        else:
+            labels = self._daily.sessions
+            close = self._daily.field('close')
+            row = self._session
+        valid = ~np.isnan(close[:row + 1, cols])
+        idx = row - valid[::-1].argmax(axis=0)
+        out = labels[idx].values.copy()
+        out[~valid.any(axis=0)] = np.datetime64('NaT')
+        return out
+
+    def history(self, assets, fields, bar_count, frequency):
+        """
+        Trailing window of `bar_count` bars ending at the current bar.
+
+        Returns a Series for one asset and one field, a DataFrame of dates x
+        assets (or dates x fields) when one side is a list, and a DataFrame
+        with (field, asset) columns when both are.
+
+        For one field the result is a read-only view of the bars: nothing is
+        copied when the assets are one asset or a contiguous run of columns,
+        and other asset lists are one gather. In minute mode, daily history
+        is served from a `HistoryPanel` whose last row is today's forming
+        bar; copy the result to keep it past the current bar.
+        """
+        single_asset = isinstance(assets, Equity)
+        single_field = isinstance(fields, str)
+        assets_ = [assets] if single_asset else list(assets)
+        fields_ = [fields] if single_field else list(fields)
+        cols = self._finder.indexer(assets_)
+
+        if frequency == '1d':
+            index, blocks = self._daily_history(cols, fields_, bar_count)
+        elif frequency == '1m':
+            if self._minute_row is None:
+                raise ValueError(
+                    "Minute history is only available in minute mode."
+                )
+            stop = self._minute_row + 1
+            index = self._minute.minutes[max(stop - bar_count, 0):stop]
+            blocks = {
+                f: _columns(self._minute.window(f, stop - bar_count, stop),
+                            cols)
+                for f in fields_
+            }
+            if len(index) < bar_count:
+                index = _pad_index(index, bar_count)
+        else:
+            raise ValueError("Unsupported frequency %r" % (frequency,))
+
+        if single_asset and single_field:
+            return pd.Series(blocks[fields_[0]][:, 0], index=index,
+                             copy=False)
+        if single_field:
+            return pd.DataFrame(blocks[fields_[0]], index=index,
+                                columns=assets_, copy=False)
+        if single_asset:
+            return pd.DataFrame({f: blocks[f][:, 0] for f in fields_},
+                                index=index, columns=fields_)
+        columns = pd.MultiIndex.from_product([fields_, assets_])
+        return pd.DataFrame(np.hstack([blocks[f] for f in fields_]),
+                            index=index, columns=columns)
+
+    def _daily_history(self, cols, fields, bar_count):
+        i = self._session
+        sessions = self._daily.sessions
+        index = sessions[max(i + 1 - bar_count, 0):i + 1]
+        if len(index) < bar_count:
+            index = _pad_index(index, bar_count)
+        blocks = {}
+        for f in fields:
+            if self._minute_row is None:
+                block = self._daily.window(f, i + 1 - bar_count, i + 1)
+            else:
+                # Today's bar is still forming: aggregate the minutes so far.
+                panel = self._panels.get(f)
+                if panel is None or panel.capacity < bar_count:
+                    capacity = max(bar_count, 2 * panel.capacity
+                                   if panel is not None else 32)
+                    panel = self._panels[f] = HistoryPanel(
+                        self._daily.field(f), capacity)
+                panel.seek(i + 1)
+                panel.set_last(self._forming_bar(f))
+                block = panel.window(bar_count)
+            blocks[f] = _columns(block, cols)
+        return index, blocks
+
+    def _forming_bar(self, field):
+        """Today's bar of `field` for every asset, from the minutes so far."""
+        row = self._minute_row
+        if field in ('close', 'price'):
+            return self._minute.field('price')[row]
+        state = self._forming.get(field)
+        if state is None or state[0] != self._session or state[1] > row + 1:
+            empty = np.zeros if field == 'volume' else _nans
+            state = self._forming[field] = [
+                self._session, self._minute.session_starts[self._session],
+                empty(self._minute.field(field).shape[1]),
+            ]
+        values = self._minute.field(field)[state[1]:row + 1]
+        if len(values):
+            state[2] = _aggregate_minutes(field, state[2], values)
+        state[1] = row + 1
+        return state[2]
+
+    def can_trade(self, assets):
+        """Whether each asset is listed and has a known price right now."""
+        if isinstance(assets, Equity):
+            return bool(self._can_trade_cols(
+                self._finder.indexer([assets]))[0])
+        assets = list(assets)
+        return pd.Series(
+            self._can_trade_cols(self._finder.indexer(assets)), index=assets
+        )
+
+    def _can_trade_cols(self, cols):
+        i = self._session
+        daily = self._daily
+        alive = ((daily.first_traded[cols] <= i) &
+                 (i <= daily.last_traded[cols]))
+        return alive & ~np.isnan(self._current_row('price')[cols])
+
+    def is_stale(self, assets):
+        """Whether each asset has a price but did not trade on this bar."""
+        single = isinstance(assets, Equity)
+        assets_ = [assets] if single else list(assets)
+        cols = self._finder.indexer(assets_)
+        stale = (np.isnan(self._current_row('close')[cols]) &
+                 ~np.isnan(self._current_row('price')[cols]))
+        return bool(stale[0]) if single else pd.Series(stale, index=assets_)
+
+    def __contains__(self, asset):
+        # Legacy ``security in data`` check from the pre-2016 API.
+        try:
+            return self.can_trade(asset)
+        except Exception:
+            return False
+
+
+def _columns(block, cols):
+    """Columns `cols` of `block`, as a read-only view where possible."""
+    if len(cols) == 1:
+        c = cols[0]
+        block = block[:, c:c + 1]
+    elif len(cols) and cols[-1] - cols[0] == len(cols) - 1 and \
+            (np.diff(cols) == 1).all():
+        block = block[:, cols[0]:cols[-1] + 1]
+    else:
+        return block.take(cols, axis=1)
+    block.flags.writeable = False
+    return block
+
+
+def _nans(n):
+    return np.full(n, np.nan)
+
+
+def _aggregate_minutes(field, bar, values):
+    """`bar` (open, high, low or volume) extended with minute rows `values`."""
+    with warnings.catch_warnings():
+        # All-NaN columns just mean the asset has not traded yet today.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if field == 'open':
+            return np.where(np.isnan(bar), _first_valid(values), bar)
+        if field == 'high':
+            return np.fmax(bar, np.nanmax(values, axis=0))
+        if field == 'low':
+            return np.fmin(bar, np.nanmin(values, axis=0))
+    return bar + np.nansum(values, axis=0)
+
+
+def _pad_index(index, length):
+    missing = length - len(index)
+    return pd.DatetimeIndex([pd.NaT] * missing).append(index)
+
+
+def _first_valid(values):
+    valid = ~np.isnan(values)
+    idx = valid.argmax(axis=0)
+    out = values[idx, np.arange(values.shape[1])]
+    out[~valid.any(axis=0)] = np.nan
+    return out
+
@@ -0,0 +1,96 @@
+"""
+Exceptions raised by the local backtest engine.
+"""
+
+
+class BacktestError(Exception):
+    """Base class for every error raised by the engine."""
+
+
+class SymbolNotFound(BacktestError):
+    def __init__(self, symbol):
+        super(SymbolNotFound, self).__init__(
+            "Symbol %r was not found in the asset database." % (symbol,)
+        )
+        self.symbol = symbol
+
+
+class SidsNotFound(BacktestError):
+    def __init__(self, sids):
+        super(SidsNotFound, self).__init__(
+            "No assets found for sids: %s." % (list(sids),)
+        )
+        self.sids = sids
+
+
+class NoLoaderForColumn(BacktestError):
+    def __init__(self, column):
+        super(NoLoaderForColumn, self).__init__(
+            "No pipeline loader is registered for %s. Pass one to the "
+            "engine through `loaders`." % (column,)
+        )
+        self.column = column
+
+
+class UnsupportedPipelineTerm(BacktestError):
+    pass
+
+
+class NoSuchPipeline(BacktestError):
+    def __init__(self, name, valid):
+        super(NoSuchPipeline, self).__init__(
+            "No pipeline named %r exists. Valid pipeline names are %s. Did "
+            "you forget to call attach_pipeline()?" % (name, sorted(valid))
+        )
+        self.name = name
+
+
+class DuplicatePipelineName(BacktestError):
+    def __init__(self, name):
+        super(DuplicatePipelineName, self).__init__(
+            "Attempted to attach pipeline named %r, but the name already "
+            "exists for another pipeline." % (name,)
+        )
+        self.name = name
+
+
+class AttachPipelineAfterInitialize(BacktestError):
+    def __init__(self):
+        super(AttachPipelineAfterInitialize, self).__init__(
+            "Attempted to attach a pipeline after initialize()."
+        )
+
+
+class UnknownParameter(BacktestError):
+    def __init__(self, names):
+        super(UnknownParameter, self).__init__(
+            "Parameters %s are neither module-level globals of the script "
+            "nor context attributes set in initialize(), so nothing reads "
+            "them." % (sorted(names),)
+        )
+        self.names = names
+
+
+class DatesOutsideData(BacktestError, ValueError):
+    def __init__(self, start, end, sessions):
+        super(DatesOutsideData, self).__init__(
+            "No sessions of the bars fall between start=%s and end=%s; the "
+            "data covers %s to %s." % (
+                start, end, sessions[0].date(), sessions[-1].date())
+        )
+        self.start = start
+        self.end = end
+
+
+class ScheduleFunctionOutsideInitialize(BacktestError):
+    def __init__(self):
+        super(ScheduleFunctionOutsideInitialize, self).__init__(
+            "schedule_function() can only be called from initialize()."
+        )
+
+
+class NoActiveAlgorithm(BacktestError):
+    def __init__(self, name):
+        super(NoActiveAlgorithm, self).__init__(
+            "%s() was called while no algorithm is running." % (name,)
+        )
@@ -0,0 +1,5 @@
+from . import commission, slippage
+from .blotter import Blotter
+from .ledger import Ledger
+
+__all__ = ['Blotter', 'Ledger', 'commission', 'slippage']
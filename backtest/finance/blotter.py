@@ -0,0 +1,279 @@
+"""
+Order book: tracks open orders and fills them bar by bar.
+"""
+import copy
+import logging
+
+import numpy as np
+
+from . import order as order_status
+from .commission import PerShare
+from .order import Order, Transaction
+from .slippage import VolumeShareSlippage
+
+log = logging.getLogger(__name__)
+
+
+class Blotter(object):
+
+    def __init__(self, slippage=None, commission=None):
+        self.slippage = slippage or VolumeShareSlippage()
+        self.commission = commission or PerShare()
+        self.orders = {}
+        # asset -> list of open orders, oldest first
+        self.open_orders = {}
+        # asset -> column in the bar rows passed to `process_bar`
+        self._columns = {}
+        # Columnar copy of the open orders for vectorized fills; rebuilt
+        # after orders are placed or cancelled.
+        self._book = None
+
+    def order(self, asset, amount, dt):
+        if amount == 0:
+            return None
+        order = Order(dt, asset, amount)
+        self.orders[order.id] = order
+        self._book = None
+        self.open_orders.setdefault(asset, []).append(order)
+        return order.id
+
+    def cancel(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None or not order.open:
+            return
+        order.status = order_status.CANCELLED
+        self._book = None
+        remaining = self.open_orders.get(order.asset, [])
+        if order in remaining:
+            remaining.remove(order)
+        if not remaining:
+            self.open_orders.pop(order.asset, None)
+
+    def cancel_all(self, warn=False, placed_before=None):
+        """Cancel every open order, or those placed before `placed_before`."""
+        for asset, orders in list(self.open_orders.items()):
+            for order in list(orders):
+                if placed_before is not None and order.dt >= placed_before:
+                    continue
+                if warn:
+                    log.warning(
+                        'Order for %d shares of %s cancelled at the end of '
+                        'the day: %d shares filled, %d unfilled.',
+                        order.amount, asset.symbol, order.filled,
+                        order.open_amount,
+                    )
+                self.cancel(order.id)
+
+    def get_open_orders(self, asset=None):
+        if asset is None:
+            return {a: list(orders) for a, orders in self.open_orders.items()
+                    if orders}
+        return list(self.open_orders.get(asset, ()))
+
+    def process_bar(self, dt, price, volume, column_of):
+        """
+        Fill open orders against one bar.
+
+        `price` and `volume` are the bar's close and volume rows for every
+        asset; `column_of(asset)` gives an asset's position in them. Returns
+        the list of transactions.
+
+        When both models support it, every open order is filled in one
+        vectorized pass; otherwise orders are filled one at a time.
+        """
+        if (_batched(self.slippage, 'process_order', 'process_orders') and
+                _batched(self.commission, 'calculate', 'calculate_batch')):
+            return self._process_bar_batched(dt, price, volume, column_of)
+        return self._process_bar_per_order(dt, price, volume, column_of)
+
+    def _process_bar_batched(self, dt, price, volume, column_of):
+        book = self._book
+        if book is None:
+            book = self._book = self._build_book(column_of)
+        if not len(book.orders):
+            return []
+        # Shares open on older orders for the same asset, which fill first.
+        size = np.abs(book.open_amount)
+        before = np.cumsum(size) - size
+        before -= before[book.group_start]
+
+        fill_price, amount = self.slippage.process_orders(
+            price[book.cols], volume[book.cols], book.open_amount, before,
+        )
+        fills = np.flatnonzero(amount)
+        if not len(fills):
+            return []
+        amount = amount[fills]
+        commission = self.commission.calculate_batch(
+            book.filled[fills], book.commission[fills], fill_price[fills],
+            amount,
+        )
+        book.open_amount[fills] -= amount
+        book.filled[fills] += amount
+        book.commission[fills] += commission
+
+        transactions = []
+        for k, fill_k, price_k, commission_k in zip(
+                fills.tolist(), amount.tolist(), fill_price[fills].tolist(),
+                commission.tolist()):
+            order = book.orders[k]
+            order.filled += fill_k
+            order.commission += commission_k
+            transactions.append(Transaction(
+                order.asset, fill_k, dt, price_k, order.id, commission_k,
+            ))
+            if order.open_amount == 0:
+                order.status = order_status.FILLED
+                group = self.open_orders[order.asset]
+                group.remove(order)
+                if not group:
+                    del self.open_orders[order.asset]
+        book.drop_filled()
+        return transactions
+
+    def _build_book(self, column_of):
+        orders = [o for group in self.open_orders.values() for o in group]
+        cols = np.fromiter(
+            (self._column(o.asset, column_of) for o in orders), np.int64,
+            len(orders),
+        )
+        return _OpenOrderBook(orders, cols)
+
+    def _column(self, asset, column_of):
+        col = self._columns.get(asset)
+        if col is None:
+            col = self._columns[asset] = column_of(asset)
+        return col
+
+    def _process_bar_per_order(self, dt, price, volume, column_of):
+        transactions = []
+        for asset, orders in list(self.open_orders.items()):
+            col = column_of(asset)
+            bar_price = price[col]
+            bar_volume = volume[col]
+            volume_used = 0
+            for order in list(orders):
+                fill_price, amount = self.slippage.process_order(
+                    bar_price, bar_volume, volume_used, order,
+                )
+                if not amount:
+                    continue
+                commission = self.commission.calculate(order, fill_price,
+                                                       amount)
+                order.filled += amount
+                order.commission += commission
+                volume_used += abs(amount)
+                transactions.append(Transaction(
+                    asset, amount, dt, fill_price, order.id, commission,
+                ))
+                if order.open_amount == 0:
+                    order.status = order_status.FILLED
+                    orders.remove(order)
+            if not orders:
+                del self.open_orders[asset]
+        return transactions
+
+
+class _OpenOrderBook(object):
+    """
+    Open orders as parallel arrays, grouped by asset in the order the
+    blotter fills them (assets in `open_orders` order, oldest order first).
+    """
+
+    def __init__(self, orders, cols):
+        n = len(orders)
+        self.orders = orders
+        self.cols = cols
+        self.open_amount = np.fromiter((o.open_amount for o in orders),
+                                       np.int64, n)
+        self.filled = np.fromiter((o.filled for o in orders), np.int64, n)
+        self.commission = np.fromiter((o.commission for o in orders),
+                                      np.float64, n)
+        self._index_groups()
+
+    def _index_groups(self):
+        # Row of the first order of each row's asset.
+        rows = np.arange(len(self.cols))
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = self.cols[1:] != self.cols[:-1]
+        self.group_start = np.maximum.accumulate(np.where(first, rows, 0))
+
+    def drop_filled(self):
+        keep = self.open_amount != 0
+        if keep.all():
+            return
+        self.orders = [o for o, k in zip(self.orders, keep.tolist()) if k]
+        self.cols = self.cols[keep]
+        self.open_amount = self.open_amount[keep]
+        self.filled = self.filled[keep]
+        self.commission = self.commission[keep]
+        self._index_groups()
+
+
+def _batched(model, scalar, batch):
+    """
+    Whether `model` should be used through its `batch` method: true when the
+    most derived class defining either method defines `batch`, so a
+    subclass overriding only `scalar` is never bypassed.
+    """
+    for klass in type(model).__mro__:
+        if batch in klass.__dict__:
+            return True
+        if scalar in klass.__dict__:
+            return False
+    return False
+
+
+def verify_fill_models(slippage, commission, n_assets=20, n_orders=200,
+                       n_bars=30, seed=0):
+    """
+    Check that the vectorized fills of `slippage` and `commission` match
+    filling the same orders one at a time, on random bars with partial
+    fills, several orders per asset, zero volume, missing prices, and orders
+    placed and cancelled between bars. Returns the number of transactions
+    compared, or raises AssertionError.
+    """
+    from ..assets import Equity
+
+    rng = np.random.RandomState(seed)
+    assets = [Equity(sid, 'S%d' % sid) for sid in range(n_assets)]
+    batched = Blotter(slippage, commission)
+    reference = Blotter(slippage, commission)
+
+    def place(n, dt):
+        for _ in range(n):
+            amount = int(rng.choice([-1, 1]) * rng.randint(1, 5000))
+            order_id = batched.order(assets[rng.randint(n_assets)], amount,
+                                     dt)
+            mirror = copy.copy(batched.orders[order_id])
+            reference.orders[order_id] = mirror
+            reference.open_orders.setdefault(mirror.asset, []).append(mirror)
+
+    place(n_orders, 0)
+    column_of = int
+    compared = 0
+    for bar in range(n_bars):
+        if bar % 5 == 4:
+            place(n_orders // 10, bar)
+            open_ids = [o.id for group in batched.open_orders.values()
+                        for o in group]
+            for order_id in rng.permutation(open_ids)[:len(open_ids) // 10]:
+                batched.cancel(order_id)
+                reference.cancel(order_id)
+        price = rng.uniform(1, 100, n_assets)
+        price[rng.rand(n_assets) < 0.1] = np.nan
+        volume = np.round(rng.lognormal(9, 2, n_assets))
+        volume[rng.rand(n_assets) < 0.1] = 0
+        volume[rng.rand(n_assets) < 0.05] = np.nan
+        got = batched._process_bar_batched(bar, price, volume, column_of)
+        expected = reference._process_bar_per_order(bar, price, volume,
+                                                    column_of)
+        key = lambda t: (int(t.asset), t.amount, t.price, t.order_id,
+                         t.commission)
+        if [key(t) for t in got] != [key(t) for t in expected]:
+            raise AssertionError(
+                "%r / %r: vectorized fills differ from per-order fills on "
+                "bar %d" % (slippage, commission, bar)
+            )
+        compared += len(got)
+    return compared
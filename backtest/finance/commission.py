@@ -0,0 +1,89 @@
+"""
+Commission models charge each fill of an order.
+
+Like slippage models, they may implement `calculate_batch` to charge every
+fill of a bar in one NumPy pass, matching `calculate` fill by fill.
+"""
+import numpy as np
+
+
+class CommissionModel(object):
+
+    def calculate(self, order, fill_price, fill_amount):
+        """
+        Commission for filling `fill_amount` shares of `order` at
+        `fill_price`. `order.filled` and `order.commission` do not yet
+        include this fill.
+        """
+        raise NotImplementedError(type(self).__name__ + '.calculate')
+
+
+class PerShare(CommissionModel):
+    """
+    `cost` per share, with at least `min_trade_cost` charged per order.
+    The minimum is charged on the first fill and later fills only pay
+    once the per-share total exceeds it.
+    """
+
+    def __init__(self, cost=0.0075, min_trade_cost=1.0):
+        self.cost = cost
+        self.min_trade_cost = min_trade_cost or 0.0
+
+    def calculate(self, order, fill_price, fill_amount):
+        additional = abs(fill_amount * self.cost)
+        if order.commission == 0:
+            return max(self.min_trade_cost, additional)
+        total = abs(order.filled * self.cost) + additional
+        if total < self.min_trade_cost:
+            return 0.0
+        return total - order.commission
+
+    def calculate_batch(self, filled, commission, fill_price, fill_amount):
+        """
+        `calculate` for many fills at once: `filled` and `commission` are
+        each order's state before this fill.
+        """
+        additional = np.abs(fill_amount * self.cost)
+        total = np.abs(filled * self.cost) + additional
+        return np.where(
+            commission == 0,
+            np.maximum(self.min_trade_cost, additional),
+            np.where(total < self.min_trade_cost, 0.0, total - commission),
+        )
+
+    def __repr__(self):
+        return 'PerShare(cost=%s, min_trade_cost=%s)' % (
+            self.cost, self.min_trade_cost,
+        )
+
+
+class PerTrade(CommissionModel):
+    """A flat `cost` per order, charged on its first fill."""
+
+    def __init__(self, cost=0.0):
+        self.cost = cost
+
+    def calculate(self, order, fill_price, fill_amount):
+        return self.cost if order.filled == 0 else 0.0
+
+    def calculate_batch(self, filled, commission, fill_price, fill_amount):
+        return np.where(filled == 0, float(self.cost), 0.0)
+
+    def __repr__(self):
+        return 'PerTrade(cost=%s)' % self.cost
+
+
+class PerDollar(CommissionModel):
+    """`cost` per dollar traded."""
+
+    def __init__(self, cost=0.0015):
+        self.cost = cost
+
+    def calculate(self, order, fill_price, fill_amount):
+        return abs(fill_amount * fill_price) * self.cost
+
+    def calculate_batch(self, filled, commission, fill_price, fill_amount):
+        return np.abs(fill_amount * fill_price) * self.cost
+
+    def __repr__(self):
+        return 'PerDollar(cost=%s)' % self.cost
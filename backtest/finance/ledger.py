@@ -0,0 +1,409 @@
+"""
+Positions, portfolio and account state.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Position(object):
+    """One holding, as of when it was looked up."""
+
+    __slots__ = ('asset', 'amount', 'cost_basis', 'last_sale_price',
+                 'last_sale_date')
+
+    def __init__(self, asset, amount=0, cost_basis=0.0,
+                 last_sale_price=0.0, last_sale_date=None):
+        self.asset = asset
+        self.amount = amount
+        self.cost_basis = cost_basis
+        self.last_sale_price = last_sale_price
+        self.last_sale_date = last_sale_date
+
+    @property
+    def sid(self):
+        return self.asset
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return ('Position(asset=%r, amount=%d, cost_basis=%.4f, '
+                'last_sale_price=%.4f)' % (self.asset, self.amount,
+                                           self.cost_basis,
+                                           self.last_sale_price))
+
+
+class PositionBook(object):
+    """
+    Open positions as parallel arrays: one slot per held asset with its
+    sid, bar column, amount, cost basis, last sale price and date. Closing
+    a position moves the last slot into its place.
+
+    The market value of the long and of the short side and the number of
+    longs are kept up to date on every fill and recomputed in one pass
+    when the book is marked to market, so exposures, leverage and counts
+    are O(1).
+    """
+
+    def __init__(self, capacity=64):
+        # asset -> slot, in the order the positions were opened
+        self._slots = {}
+        self.assets = []
+        self.sids = np.zeros(capacity, dtype=np.int64)
+        self.columns = np.zeros(capacity, dtype=np.int64)
+        self.amounts = np.zeros(capacity, dtype=np.int64)
+        self.cost_basis = np.zeros(capacity)
+        self.last_price = np.zeros(capacity)
+        self.last_date = np.full(capacity, np.datetime64('NaT', 'ns'))
+        self.long_value = 0.0
+        self.short_value = 0.0
+        self.longs = 0
+
+    def __len__(self):
+        return len(self.assets)
+
+    def __contains__(self, asset):
+        return asset in self._slots
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def slot(self, asset):
+        """The slot of `asset`, or None if it is not held."""
+        return self._slots.get(asset)
+
+    def amount(self, asset):
+        slot = self._slots.get(asset)
+        return 0 if slot is None else int(self.amounts[slot])
+
+    def held(self):
+        """Assets held, in the order opened, and their amounts."""
+        order = np.fromiter(self._slots.values(), np.int64, len(self._slots))
+        return list(self._slots), self.amounts[order]
+
+    def position(self, slot):
+        """A `Position` snapshot of `slot`."""
+        date = self.last_date[slot]
+        return Position(
+            self.assets[slot], int(self.amounts[slot]),
+            float(self.cost_basis[slot]), float(self.last_price[slot]),
+            None if np.isnat(date) else pd.Timestamp(date),
+        )
+
+    def fill(self, asset, column, amount, price, dt):
+        """Apply a fill of `amount` shares at `price`."""
+        slot = self._slots.get(asset)
+        if slot is None:
+            slot = self._open(asset, column)
+        held = int(self.amounts[slot])
+        self._remove_value(held, float(self.last_price[slot]))
+        total = held + amount
+        if total == 0:
+            self._close(slot)
+            return
+        if held == 0 or (held > 0) != (total > 0):
+            # Opening, or flipping through zero.
+            self.cost_basis[slot] = price
+        elif (held > 0) == (amount > 0):
+            # Adding to the position: average in the new shares.
+            self.cost_basis[slot] = (
+                (float(self.cost_basis[slot]) * held + price * amount)
+                / total
+            )
+        self.amounts[slot] = total
+        self.last_price[slot] = price
+        self.last_date[slot] = _datetime64(dt)
+        self._add_value(total, price)
+
+    def mark(self, prices, dt):
+        """Revalue every position at `prices` (a full row of prices)."""
+        n = len(self.assets)
+        if not n:
+            return
+        price = prices[self.columns[:n]]
+        valid = price == price
+        self.last_price[:n][valid] = price[valid]
+        self.last_date[:n][valid] = _datetime64(dt)
+        self._resum()
+
+    def _resum(self):
+        n = len(self.assets)
+        amounts = self.amounts[:n]
+        value = amounts * self.last_price[:n]
+        long = amounts > 0
+        self.long_value = float(value[long].sum())
+        self.short_value = float(value[~long].sum())
+        self.longs = int(long.sum())
+
+    def _add_value(self, amount, price):
+        if amount > 0:
+            self.long_value += amount * price
+            self.longs += 1
+        elif amount < 0:
+            self.short_value += amount * price
+
+    def _remove_value(self, amount, price):
+        if amount > 0:
+            self.long_value -= amount * price
+            self.longs -= 1
+        elif amount < 0:
+            self.short_value -= amount * price
+
+    def _open(self, asset, column):
+        slot = len(self.assets)
+        if slot == len(self.amounts):
+            self._grow()
+        self._slots[asset] = slot
+        self.assets.append(asset)
+        self.sids[slot] = int(asset)
+        self.columns[slot] = column
+        self.amounts[slot] = 0
+        self.cost_basis[slot] = 0.0
+        self.last_price[slot] = 0.0
+        self.last_date[slot] = np.datetime64('NaT', 'ns')
+        return slot
+
+    def _close(self, slot):
+        asset = self.assets[slot]
+        last = len(self.assets) - 1
+        if slot != last:
+            moved = self.assets[last]
+            for values in (self.sids, self.columns, self.amounts,
+                           self.cost_basis, self.last_price, self.last_date):
+                values[slot] = values[last]
+            self.assets[slot] = moved
+            self._slots[moved] = slot
+        self.assets.pop()
+        del self._slots[asset]
+        if not self.assets:
+            # Drop the rounding left over from incremental updates.
+            self.long_value = self.short_value = 0.0
+
+    def _grow(self):
+        for name in ('sids', 'columns', 'amounts', 'cost_basis',
+                     'last_price', 'last_date'):
+            values = getattr(self, name)
+            grown = np.empty(2 * len(values), dtype=values.dtype)
+            grown[:len(values)] = values
+            setattr(self, name, grown)
+
+
+def _datetime64(dt):
+    return np.datetime64(pd.Timestamp(dt).value, 'ns') if dt is not None \
+        else np.datetime64('NaT', 'ns')
+
+
+class Positions(object):
+    """
+    Asset -> `Position` for every non-zero holding, read from a
+    `PositionBook`. Looking up an asset not held gives an empty position.
+    """
+
+    def __init__(self, book):
+        self._book = book
+
+    def __getitem__(self, asset):
+        slot = self._book.slot(asset)
+        if slot is None:
+            return Position(asset)
+        return self._book.position(slot)
+
+    def get(self, asset, default=None):
+        slot = self._book.slot(asset)
+        if slot is None:
+            return default
+        return self._book.position(slot)
+
+    def __len__(self):
+        return len(self._book)
+
+    def __contains__(self, asset):
+        return asset in self._book
+
+    def __iter__(self):
+        return iter(list(self._book))
+
+    def __bool__(self):
+        return len(self._book) > 0
+
+    def keys(self):
+        return list(self._book)
+
+    def values(self):
+        book = self._book
+        return [book.position(book.slot(a)) for a in book]
+
+    def items(self):
+        book = self._book
+        return [(a, book.position(book.slot(a))) for a in book]
+
+    # The algorithms in this repo were written for Python 2.
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def __repr__(self):
+        return 'Positions(%r)' % dict(self.items())
+
+
+class Portfolio(object):
+    """Read-only snapshot exposed as ``context.portfolio``."""
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    @property
+    def positions(self):
+        return self._ledger.positions
+
+    @property
+    def cash(self):
+        return self._ledger.cash
+
+    @property
+    def starting_cash(self):
+        return self._ledger.capital_base
+
+    @property
+    def capital_used(self):
+        return self._ledger.capital_base - self._ledger.cash
+
+    @property
+    def positions_value(self):
+        return self._ledger.positions_value
+
+    @property
+    def positions_exposure(self):
+        return self._ledger.positions_value
+
+    @property
+    def portfolio_value(self):
+        return self._ledger.cash + self._ledger.positions_value
+
+    @property
+    def pnl(self):
+        return self.portfolio_value - self._ledger.capital_base
+
+    @property
+    def returns(self):
+        return self.pnl / self._ledger.capital_base
+
+    @property
+    def start_date(self):
+        return self._ledger.start_date
+
+
+class Account(object):
+    """Read-only snapshot exposed as ``context.account``."""
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    @property
+    def net_liquidation(self):
+        return self._ledger.cash + self._ledger.positions_value
+
+    @property
+    def settled_cash(self):
+        return self._ledger.cash
+
+    @property
+    def total_positions_value(self):
+        return self._ledger.positions_value
+
+    @property
+    def total_positions_exposure(self):
+        return self._ledger.positions_value
+
+    @property
+    def available_funds(self):
+        return self._ledger.cash
+
+    @property
+    def buying_power(self):
+        return float('inf')
+
+    @property
+    def leverage(self):
+        nlv = self.net_liquidation
+        return self._ledger.gross_exposure / nlv if nlv else np.inf
+
+    gross_leverage = leverage
+
+    @property
+    def net_leverage(self):
+        nlv = self.net_liquidation
+        return self._ledger.positions_value / nlv if nlv else np.inf
+
+
+class Ledger(object):
+    """Cash and positions, updated by fills and marked to market each bar."""
+
+    # Prices and time of a mark deferred by `mark_lazily`.
+    _pending = None
+
+    def __init__(self, capital_base, start_date=None):
+        self.capital_base = float(capital_base)
+        self.cash = float(capital_base)
+        self.start_date = start_date
+        # Running total of shares times price traded, for turnover.
+        self.traded_value = 0.0
+        self.book = PositionBook()
+        self._positions = Positions(self.book)
+        self.portfolio = Portfolio(self)
+        self.account = Account(self)
+
+    def __setstate__(self, state):
+        # Ledgers pickled before positions were marked lazily.
+        if 'positions' in state:
+            state['_positions'] = state.pop('positions')
+        self.__dict__.update(state)
+
+    def process_transaction(self, txn, column):
+        self.book.fill(txn.asset, column, txn.amount, txn.price, txn.dt)
+        self.cash -= txn.amount * txn.price + txn.commission
+        self.traded_value += abs(txn.amount * txn.price)
+
+    def mark_to_market(self, prices, dt):
+        """Revalue every position at `prices` (a full row of prices)."""
+        self._pending = None
+        self.book.mark(prices, dt)
+
+    def mark_lazily(self, prices, dt):
+        """
+        Like `mark_to_market`, but only once the positions or their value
+        are next read, so bars where nothing looks at the portfolio cost
+        nothing. A later mark replaces a pending one.
+        """
+        self._pending = (prices, dt)
+
+    def _settle(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            self.book.mark(*pending)
+
+    @property
+    def positions(self):
+        self._settle()
+        return self._positions
+
+    @property
+    def positions_value(self):
+        self._settle()
+        return self.book.long_value + self.book.short_value
+
+    @property
+    def gross_exposure(self):
+        self._settle()
+        return self.book.long_value - self.book.short_value
+
+    def position_counts(self):
+        self._settle()
+        longs = self.book.longs
+        return longs, len(self.book) - longs
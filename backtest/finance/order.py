@@ -0,0 +1,80 @@
+import itertools
+
+OPEN = 'open'
+FILLED = 'filled'
+CANCELLED = 'cancelled'
+
+_ids = itertools.count(1)
+
+
+def next_order_id():
+    """The number the next order will be given."""
+    global _ids
+    n = next(_ids)
+    _ids = itertools.count(n)
+    return n
+
+
+def set_next_order_id(n):
+    """Continue numbering orders from `n` (when resuming a checkpoint)."""
+    global _ids
+    _ids = itertools.count(n)
+
+
+class Order(object):
+    """A market order for `amount` shares (negative to sell)."""
+
+    __slots__ = ('id', 'dt', 'created', 'asset', 'amount', 'filled',
+                 'commission', 'status')
+
+    def __init__(self, dt, asset, amount, id=None):
+        self.id = id if id is not None else '%08d' % next(_ids)
+        self.dt = dt
+        self.created = dt
+        self.asset = asset
+        self.amount = int(amount)
+        self.filled = 0
+        self.commission = 0.0
+        self.status = OPEN
+
+    @property
+    def open_amount(self):
+        return self.amount - self.filled
+
+    @property
+    def open(self):
+        return self.status == OPEN
+
+    @property
+    def direction(self):
+        return 1 if self.amount > 0 else -1
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return 'Order(id=%s, asset=%r, amount=%d, filled=%d, status=%s)' % (
+            self.id, self.asset, self.amount, self.filled, self.status,
+        )
+
+
+class Transaction(object):
+    """A (partial) fill of an order."""
+
+    __slots__ = ('asset', 'amount', 'dt', 'price', 'order_id', 'commission')
+
+    def __init__(self, asset, amount, dt, price, order_id, commission=0.0):
+        self.asset = asset
+        self.amount = amount
+        self.dt = dt
+        self.price = price
+        self.order_id = order_id
+        self.commission = commission
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return 'Transaction(asset=%r, amount=%d, price=%.4f, dt=%s)' % (
+            self.asset, self.amount, self.price, self.dt,
+        )
@@ -0,0 +1,100 @@
+"""
+Slippage models decide how much of an order fills on a bar, and at what
+price.
+
+Models may also implement `process_orders`, filling every open order of a
+bar in one NumPy pass. The blotter uses it when the model's most derived
+class defines it next to (or instead of) `process_order`; it must give
+exactly the fills of calling `process_order` order by order.
+"""
+import math
+
+import numpy as np
+
+
+class SlippageModel(object):
+
+    def process_order(self, price, volume, volume_used, order):
+        """
+        Fill `order` against a bar that closed at `price` and traded
+        `volume` shares, `volume_used` of which were already taken by
+        earlier orders on the same bar.
+
+        Returns ``(fill_price, signed_amount)``, or ``(None, 0)`` when
+        nothing fills.
+        """
+        raise NotImplementedError(type(self).__name__ + '.process_order')
+
+
+class VolumeShareSlippage(SlippageModel):
+    """
+    Fills at most `volume_limit` of each bar's volume, moving the price
+    against the order by ``price_impact * volume_share ** 2``.
+    """
+
+    def __init__(self, volume_limit=0.025, price_impact=0.1):
+        self.volume_limit = volume_limit
+        self.price_impact = price_impact
+
+    def process_order(self, price, volume, volume_used, order):
+        if not volume > 0 or math.isnan(price):
+            return None, 0
+        remaining = self.volume_limit * volume - volume_used
+        if remaining < 1:
+            return None, 0
+        shares = int(min(remaining, abs(order.open_amount)))
+        if shares < 1:
+            return None, 0
+        volume_share = min(shares / volume, self.volume_limit)
+        impact = volume_share ** 2 * self.price_impact * price
+        return price + order.direction * impact, order.direction * shares
+
+    def process_orders(self, price, volume, open_amount, volume_before):
+        """
+        `process_order` for a whole bar. Arrays have one entry per open
+        order: the bar's `price` and `volume` for its asset, its signed
+        `open_amount`, and `volume_before`, the shares still open on older
+        orders for the same asset. Returns ``(fill_price, signed_amount)``
+        arrays, with amount 0 where nothing fills.
+        """
+        direction = np.where(open_amount > 0, 1, -1)
+        with np.errstate(invalid='ignore'):
+            tradeable = (volume > 0) & ~np.isnan(price)
+        # Older orders on the asset fill first and never leave a fractional
+        # share of capacity behind, so what is left for an order is the
+        # whole-share cap minus everything requested before it.
+        left = np.floor(self.volume_limit * np.where(tradeable, volume, 0.0))
+        shares = np.clip(left - volume_before, 0, np.abs(open_amount))
+        shares = shares.astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_share = np.minimum(shares / volume, self.volume_limit)
+        impact = volume_share ** 2 * self.price_impact * price
+        fill_price = np.where(shares > 0, price + direction * impact, np.nan)
+        return fill_price, direction * shares
+
+    def __repr__(self):
+        return 'VolumeShareSlippage(volume_limit=%s, price_impact=%s)' % (
+            self.volume_limit, self.price_impact,
+        )
+
+
+class FixedSlippage(SlippageModel):
+    """Fills whole orders at the close plus half of a fixed `spread`."""
+
+    def __init__(self, spread=0.0):
+        self.spread = spread
+
+    def process_order(self, price, volume, volume_used, order):
+        if math.isnan(price):
+            return None, 0
+        return (price + order.direction * self.spread / 2.0,
+                order.open_amount)
+
+    def process_orders(self, price, volume, open_amount, volume_before):
+        direction = np.where(open_amount > 0, 1, -1)
+        filled = ~np.isnan(price)
+        return (price + direction * self.spread / 2.0,
+                np.where(filled, open_amount, 0))
+
+    def __repr__(self):
+        return 'FixedSlippage(spread=%s)' % self.spread
@@ -0,0 +1,31 @@
+"""
+Portfolio objectives for ``order_optimal_portfolio``, standing in for
+``quantopian.optimize``. Only targets the engine can hit exactly are
+supported; there is no solver.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Objective(object):
+    """Base class for what ``order_optimal_portfolio`` should move towards."""
+
+
+class TargetWeights(Objective):
+    """
+    Hold each asset at a fraction of portfolio value (negative for shorts).
+
+    Parameters
+    ----------
+    weights : pd.Series or dict[Equity -> float]
+        Assets missing from `weights` are targeted at zero.
+    """
+
+    def __init__(self, weights):
+        weights = pd.Series(weights, dtype=np.float64)
+        if weights.index.has_duplicates:
+            raise ValueError("TargetWeights got duplicate assets.")
+        self.weights = weights[weights.notnull()]
+
+    def __repr__(self):
+        return 'TargetWeights(%d assets)' % len(self.weights)
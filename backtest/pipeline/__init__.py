@@ -0,0 +1,21 @@
+from . import classifiers, data, factors, filters
+from .engine import PipelineEngine
+from .factors import CustomFactor
+from .filters import CustomFilter
+from .pipeline import Pipeline
+from .term import Classifier, Factor, Filter, Term
+
+__all__ = [
+    'Classifier',
+    'CustomFactor',
+    'CustomFilter',
+    'Factor',
+    'Filter',
+    'Pipeline',
+    'PipelineEngine',
+    'Term',
+    'classifiers',
+    'data',
+    'factors',
+    'filters',
+]
@@ -0,0 +1,104 @@
+"""
+Process-wide memoization of pipeline term results.
+
+Results are keyed by the data they were computed from, the session, and the
+term's structural identity (type, parameters, inputs, window_length and
+mask). Two pipelines, or two algorithms, that declare the same factor
+therefore compute it once per simulated day. Non-zero-copy loader windows
+are cached the same way.
+"""
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_tokens = itertools.count(1)
+
+
+def cache_token(obj):
+    """A process-unique integer tagging `obj` (a bar reader or loader)."""
+    token = getattr(obj, '_cache_token', None)
+    if token is None:
+        token = next(_tokens)
+        obj._cache_token = token
+    return token
+
+
+class TermCache(object):
+    """
+    LRU mapping of cache keys to read-only arrays, bounded by total size.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory ceiling. Least recently used entries are evicted once the
+        cached arrays exceed it; a single array larger than the ceiling is
+        not cached at all.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        value = np.asarray(value)
+        size = value.nbytes
+        if size > self.max_bytes:
+            return value
+        # Consumers share the cached array, so nobody may write to it.
+        value.flags.writeable = False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+_default_cache = TermCache()
+
+
+def default_term_cache():
+    """The cache shared by every engine that is not given its own."""
+    return _default_cache
@@ -0,0 +1,3 @@
+from ..term import Classifier
+
+__all__ = ['Classifier']
@@ -0,0 +1,20 @@
+from ..data.morningstar import asset_classification
+from ..factors.basic import LatestClassifier
+
+
+class Sector(LatestClassifier):
+    """Morningstar sector code of each asset."""
+
+    inputs = [asset_classification.morningstar_sector_code]
+
+    BASIC_MATERIALS = 101
+    CONSUMER_CYCLICAL = 102
+    FINANCIAL_SERVICES = 103
+    REAL_ESTATE = 104
+    CONSUMER_DEFENSIVE = 205
+    HEALTHCARE = 206
+    UTILITIES = 207
+    COMMUNICATION_SERVICES = 308
+    ENERGY = 309
+    INDUSTRIALS = 310
+    TECHNOLOGY = 311
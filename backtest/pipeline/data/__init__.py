@@ -0,0 +1,13 @@
+from . import morningstar
+from .builtin import USEquityPricing
+from .dataset import BoundColumn, Column, DataSet
+from .eventvestor import EarningsCalendar
+
+__all__ = [
+    'BoundColumn',
+    'Column',
+    'DataSet',
+    'EarningsCalendar',
+    'USEquityPricing',
+    'morningstar',
+]
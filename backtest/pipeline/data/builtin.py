@@ -0,0 +1,11 @@
+from .dataset import Column, DataSet
+
+
+class USEquityPricing(DataSet):
+    """Daily OHLCV bars, served from the engine's `DailyBarReader`."""
+
+    open = Column()
+    high = Column()
+    low = Column()
+    close = Column()
+    volume = Column()
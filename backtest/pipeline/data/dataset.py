@@ -0,0 +1,69 @@
+"""
+Datasets and the columns pipeline terms load from them.
+"""
+import numpy as np
+
+from ..term import LoadableTerm, MISSING_VALUES, bool_, float64, int64
+
+
+class Column(object):
+    """Declaration of a dataset column, bound to its dataset by the class."""
+
+    def __init__(self, dtype=float64):
+        self.dtype = np.dtype(dtype)
+
+
+class BoundColumn(LoadableTerm):
+    """A column of a specific dataset, usable as a pipeline input."""
+
+    def __init__(self, dataset, name, dtype):
+        self.dataset = dataset
+        self.name = name
+        self.dtype = dtype
+
+    def _static_params(self):
+        return (self.dataset, self.name)
+
+    @property
+    def qualname(self):
+        return '%s.%s' % (self.dataset.__name__, self.name)
+
+    @property
+    def latest(self):
+        """The most recently known value of this column for each asset."""
+        from ..factors.basic import Latest, LatestClassifier, LatestFilter
+        if self.dtype == bool_:
+            return LatestFilter(inputs=[self])
+        if self.dtype == int64:
+            return LatestClassifier(inputs=[self])
+        return Latest(inputs=[self])
+
+    @property
+    def missing_value(self):
+        return MISSING_VALUES[self.dtype]
+
+    def __repr__(self):
+        return self.qualname
+
+
+class DataSetMeta(type):
+
+    def __new__(mcls, name, bases, dict_):
+        cls = super(DataSetMeta, mcls).__new__(mcls, name, bases, dict_)
+        cls._columns = {}
+        for base in reversed(cls.__mro__[1:]):
+            cls._columns.update(getattr(base, '_columns', {}))
+        for attr, value in list(dict_.items()):
+            if isinstance(value, Column):
+                bound = BoundColumn(cls, attr, value.dtype)
+                setattr(cls, attr, bound)
+                cls._columns[attr] = bound
+        return cls
+
+    @property
+    def columns(cls):
+        return list(cls._columns.values())
+
+
+class DataSet(object, metaclass=DataSetMeta):
+    """Base class for datasets; declare fields as `Column` attributes."""
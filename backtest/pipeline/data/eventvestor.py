@@ -0,0 +1,8 @@
+from .dataset import Column, DataSet
+
+
+class EarningsCalendar(DataSet):
+    """Dates of the next and previous earnings announcement of each asset."""
+
+    next_announcement = Column('datetime64[ns]')
+    previous_announcement = Column('datetime64[ns]')
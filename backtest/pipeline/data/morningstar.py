@@ -0,0 +1,35 @@
+"""
+Morningstar fundamentals.
+
+There is no bundled data for these datasets; register a loader for each one
+you use. `backtest.pipeline.loaders.FundamentalsLoader` serves point-in-time
+change events (see `backtest.store.write_fundamentals` to keep them on disk);
+`ArrayLoader` serves arrays already aligned with the sessions.
+"""
+from .dataset import Column, DataSet
+
+
+class operation_ratios(DataSet):
+    roa = Column()
+    roe = Column()
+    roic = Column()
+    gross_margin = Column()
+    operation_margin = Column()
+    net_margin = Column()
+
+
+class valuation_ratios(DataSet):
+    pe_ratio = Column()
+    ps_ratio = Column()
+    pb_ratio = Column()
+    pcf_ratio = Column()
+    dividend_yield = Column()
+
+
+class valuation(DataSet):
+    market_cap = Column()
+    shares_outstanding = Column()
+
+
+class asset_classification(DataSet):
+    morningstar_sector_code = Column('int64')
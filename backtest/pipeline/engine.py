@@ -0,0 +1,235 @@
+"""
+Computes attached pipelines one simulation day at a time.
+"""
+import numpy as np
+import pandas as pd
+
+from ..errors import NoLoaderForColumn, UnsupportedPipelineTerm
+from ..profiler import term_label
+from .cache import cache_token, default_term_cache
+from .data.builtin import USEquityPricing
+from .graph import TermGraph
+from .loaders import USEquityPricingLoader
+from .output import PipelineOutput
+from .term import LoadableTerm
+
+
+class PipelineEngine(object):
+    """
+    Parameters
+    ----------
+    daily_reader : DailyBarReader
+        Source of sessions, assets and `USEquityPricing`.
+    loaders : dict[DataSet -> PipelineLoader], optional
+        Loaders for any other dataset used by a pipeline.
+    cache : TermCache, optional
+        Where computed terms are memoized. Defaults to the process-wide
+        cache, so engines over the same data share results. Pass
+        ``TermCache(max_bytes=0)`` to disable caching.
+    universes : UniverseMasks, optional
+        Precomputed filters to read instead of computing them.
+    """
+
+    def __init__(self, daily_reader, loaders=None, cache=None,
+                 universes=None):
+        self._reader = daily_reader
+        self.sessions = daily_reader.sessions
+        self.assets = daily_reader.asset_finder.equities
+        self.sids = daily_reader.asset_finder.sids
+        self._pricing_loader = USEquityPricingLoader(daily_reader)
+        self._loaders = dict(loaders or {})
+        self.cache = cache if cache is not None else default_term_cache()
+        self._namespace = None
+        # identity -> (kernel, session it was last advanced to)
+        self._kernels = {}
+        # identity -> (session, mask, state) of incremental custom terms
+        self._states = {}
+        # root identities -> TermGraph
+        self._graphs = {}
+        self._universes = None
+        # A backtest.profiler.Profiler timing each term computed.
+        self.profiler = None
+        if universes is not None:
+            self.register_universes(universes)
+
+    def register_loader(self, dataset, loader):
+        self._loaders[dataset] = loader
+        self._namespace = None
+
+    def register_universes(self, universes):
+        if not (np.array_equal(universes.sids, self.sids) and
+                universes.sessions.equals(self.sessions)):
+            raise ValueError("The universe masks were built for other "
+                             "sessions or assets.")
+        self._universes = universes
+        self._graphs.clear()
+
+    @property
+    def namespace(self):
+        """Cache-key prefix identifying the data this engine computes from."""
+        if self._namespace is None:
+            self._namespace = (
+                cache_token(self._reader),
+                tuple(sorted(
+                    (dataset.__name__, cache_token(loader))
+                    for dataset, loader in self._loaders.items()
+                )),
+            )
+        return self._namespace
+
+    def _loader_for(self, column):
+        if column.dataset is USEquityPricing:
+            return self._pricing_loader
+        try:
+            return self._loaders[column.dataset]
+        except KeyError:
+            raise NoLoaderForColumn(column)
+
+    def asset_exists(self, i):
+        """Assets that traded by, and did not delist before, session i - 1."""
+        last = i - 1
+        return ((self._reader.first_traded <= last) &
+                (self._reader.last_traded >= last))
+
+    def run_pipeline(self, pipeline, i):
+        """
+        Compute `pipeline` for session `i`, using data through session
+        ``i - 1``. Returns a `PipelineOutput` indexed by asset.
+
+        Only the screen is computed here. Each column, and the terms only it
+        needs, is computed when the column is first read.
+        """
+        today = self.sessions[i]
+        exists = self.asset_exists(i)
+        graph = self._graph(pipeline)
+        results = {}
+        keep = exists
+        if graph.screen is not None:
+            keep = keep & self._evaluate(graph, graph.screen, i, today,
+                                         exists, results)
+        rows = np.flatnonzero(keep)
+        index = pd.Index([self.assets[j] for j in rows], dtype=object)
+        columns = graph.columns
+
+        def load(name):
+            return self._evaluate(graph, columns[name], i, today, exists,
+                                  results)
+
+        return PipelineOutput(index, rows, list(pipeline.columns), load)
+
+    def _graph(self, pipeline):
+        key = TermGraph.key(pipeline)
+        graph = self._graphs.get(key)
+        if graph is None:
+            graph = self._graphs[key] = TermGraph(pipeline,
+                                                  self._universes)
+        return graph
+
+    def _evaluate(self, graph, identity, i, today, exists, results):
+        """Compute node `identity` of `graph`, and what it needs, for day i."""
+        value = results.get(identity)
+        if value is not None:
+            return value
+        term = graph.terms[identity]
+        if isinstance(term, LoadableTerm):
+            raise UnsupportedPipelineTerm(
+                "%r must be wrapped in a factor (e.g. `.latest`) before it "
+                "can be computed." % (term,)
+            )
+        key = (self.namespace, i, identity)
+        value = self.cache.get(key)
+        if value is None:
+            deps = [
+                self._evaluate(graph, dep, i, today, exists, results)
+                for dep in graph.dependencies(identity)
+            ]
+            profiler = self.profiler
+            if profiler is None or not profiler.enabled:
+                value = self._compute(term, identity, deps, i, today, exists)
+            else:
+                with profiler.span(term_label(term)):
+                    value = self._compute(term, identity, deps, i, today,
+                                          exists)
+            value = self.cache.put(key, value)
+        results[identity] = value
+        return value
+
+    def _compute(self, term, identity, deps, i, today, exists):
+        mask = exists
+        if term.mask is not None:
+            mask = mask & deps.pop()
+        if term.windowed:
+            value = self._compute_rolling(term, i, identity)
+            if value is not None:
+                return np.where(mask, value, term.missing_value)
+            if getattr(term, 'incremental', False):
+                return self._compute_incremental(term, i, identity, today,
+                                                 mask)
+            inputs = [
+                self._load_window(column, i - term.window_length, i)
+                for column in term.inputs
+            ]
+        else:
+            inputs = deps
+        return term._compute(inputs, today, self.sids, mask)
+
+    def _compute_rolling(self, term, i, identity):
+        """
+        Advance `term`'s streaming kernel to session `i`, reading only the
+        newest row when it was advanced to ``i - 1``. Returns None if the
+        term has no kernel.
+        """
+        state = self._kernels.get(identity)
+        if state is not None and state[1] == i - 1:
+            kernel = state[0]
+            value = kernel.update(*[
+                self._load_window(column, i - 1, i)[0]
+                for column in term.inputs
+            ])
+        else:
+            kernel = term.rolling_kernel()
+            if kernel is None:
+                return None
+            value = kernel.reset(*[
+                self._load_window(column, i - term.window_length, i)
+                for column in term.inputs
+            ])
+        self._kernels[identity] = (kernel, i)
+        return value
+
+    def _compute_incremental(self, term, i, identity, today, mask):
+        """
+        Advance an incremental custom term to session `i` with its `update`
+        step when it was last computed for ``i - 1`` over the same assets,
+        and with `init` over the full window otherwise.
+        """
+        wl = term.window_length
+        state = self._states.get(identity)
+        if state is not None and state[0] == i - 1 and \
+                np.array_equal(state[1], mask):
+            value, new = term._update(
+                state[2],
+                [self._load_window(c, i - 1, i)[0] for c in term.inputs],
+                [self._load_window(c, i - 1 - wl, i - wl)[0]
+                 for c in term.inputs],
+                today, self.sids, mask,
+            )
+        else:
+            value, new = term._init(
+                [self._load_window(c, i - wl, i) for c in term.inputs],
+                today, self.sids, mask,
+            )
+        self._states[identity] = (i, mask.copy(), new)
+        return value
+
+    def _load_window(self, column, start, stop):
+        loader = self._loader_for(column)
+        if getattr(loader, 'zero_copy', False):
+            return loader.load_window(column, start, stop)
+        key = (self.namespace, 'window', column.identity, start, stop)
+        window = self.cache.get(key)
+        if window is None:
+            window = self.cache.put(
+                key, loader.load_window(column, start, stop)
+            )
+        return window
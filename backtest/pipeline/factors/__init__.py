@@ -0,0 +1,17 @@
+from ..term import Factor
+from .basic import (
+    AverageDollarVolume,
+    CustomFactor,
+    Latest,
+    Returns,
+    SimpleMovingAverage,
+)
+
+__all__ = [
+    'AverageDollarVolume',
+    'CustomFactor',
+    'Factor',
+    'Latest',
+    'Returns',
+    'SimpleMovingAverage',
+]
@@ -0,0 +1,169 @@
+"""
+User-defined and built-in windowed factors.
+"""
+import numpy as np
+
+from ..data.builtin import USEquityPricing
+from ..rolling import RollingDollarVolume, RollingNanMean, RollingReturns
+from ..term import Classifier, Factor, Filter
+
+
+class CustomTermMixin(object):
+    """
+    Shared machinery for `CustomFactor` and `CustomFilter`.
+
+    Subclasses implement ``compute(self, today, assets, out, *inputs)``.
+    Each input is a ``window_length x n_assets`` array holding only the
+    assets that pass `mask`, and `out` must be filled in place.
+
+    A subclass may also implement the incremental protocol::
+
+        init(self, today, assets, out, *inputs) -> state
+        update(self, state, today, assets, out, entering, leaving) -> state
+
+    `init` sees the same windows as `compute` and returns whatever state it
+    wants kept. `update` is given that state, and for each input only the
+    row entering the window (``entering[k]``) and the row leaving it
+    (``leaving[k]``). The engine calls `update` when the window moved
+    forward one session over the same masked assets, and `init` again
+    otherwise. `backtest.pipeline.rolling.verify_incremental` checks that
+    both paths agree with `compute`.
+    """
+
+    params = ()
+
+    def __init__(self, inputs=None, window_length=None, mask=None, **kwargs):
+        unknown = set(kwargs) - set(self.params)
+        if unknown:
+            raise TypeError(
+                "%s got unexpected keyword arguments: %s"
+                % (type(self).__name__, sorted(unknown))
+            )
+        self.params_values = kwargs
+        super(CustomTermMixin, self).__init__(
+            inputs=inputs, window_length=window_length, mask=mask,
+        )
+        if not self.window_length:
+            raise ValueError(
+                "%s requires a positive window_length." % type(self).__name__
+            )
+
+    def _static_params(self):
+        params = tuple(sorted(self.params_values.items()))
+        try:
+            hash(params)
+        except TypeError:
+            # Unhashable parameters: this instance only matches itself.
+            return (id(self),)
+        return params
+
+    def compute(self, today, assets, out, *inputs):
+        raise NotImplementedError(type(self).__name__ + '.compute')
+
+    @property
+    def incremental(self):
+        """Whether this term implements `init` and `update`."""
+        return callable(getattr(self, 'init', None)) and \
+            callable(getattr(self, 'update', None))
+
+    def _compute(self, windows, today, assets, mask):
+        if not mask.all():
+            windows = [window[:, mask] for window in windows]
+        return self._masked(self.compute, (), today, assets, mask,
+                            windows)[0]
+
+    def _init(self, windows, today, assets, mask):
+        """`init` over the masked windows; returns ``(out, state)``."""
+        if not mask.all():
+            windows = [window[:, mask] for window in windows]
+        return self._masked(self.init, (), today, assets, mask, windows)
+
+    def _update(self, state, entering, leaving, today, assets, mask):
+        """`update` with the masked rows; returns ``(out, state)``."""
+        if not mask.all():
+            entering = [row[mask] for row in entering]
+            leaving = [row[mask] for row in leaving]
+        return self._masked(self.update, (state,), today, assets, mask,
+                            [entering, leaving])
+
+    def _masked(self, method, head, today, assets, mask, args):
+        out = np.full(len(assets), self.missing_value, dtype=self.dtype)
+        if mask.all():
+            result = method(*(head + (today, assets, out) + tuple(args)),
+                            **self.params_values)
+            return out, result
+        masked_out = out[mask]
+        result = method(
+            *(head + (today, assets[mask], masked_out) + tuple(args)),
+            **self.params_values
+        )
+        out[mask] = masked_out
+        return out, result
+
+
+class CustomFactor(CustomTermMixin, Factor):
+    """Base class for user-defined factors."""
+
+
+class Latest(CustomFactor):
+    """The most recent value of a column."""
+
+    window_length = 1
+
+    def compute(self, today, assets, out, data):
+        out[:] = data[-1]
+
+
+class LatestFilter(CustomTermMixin, Filter):
+    window_length = 1
+
+    def compute(self, today, assets, out, data):
+        out[:] = data[-1]
+
+
+class LatestClassifier(CustomTermMixin, Classifier):
+    window_length = 1
+
+    def compute(self, today, assets, out, data):
+        out[:] = data[-1]
+
+
+class Returns(CustomFactor):
+    """Percent change in close price over the window."""
+
+    inputs = [USEquityPricing.close]
+
+    def compute(self, today, assets, out, close):
+        out[:] = (close[-1] - close[0]) / close[0]
+
+    def rolling_kernel(self):
+        return RollingReturns(self.window_length)
+
+
+class SimpleMovingAverage(CustomFactor):
+    """Average value of an input over the window, ignoring NaNs."""
+
+    def compute(self, today, assets, out, data):
+        out[:] = _nanmean(data)
+
+    def rolling_kernel(self):
+        return RollingNanMean(self.window_length)
+
+
+class AverageDollarVolume(CustomFactor):
+    """Average daily close x volume over the window."""
+
+    inputs = [USEquityPricing.close, USEquityPricing.volume]
+
+    def compute(self, today, assets, out, close, volume):
+        out[:] = np.nansum(close * volume, axis=0) / len(close)
+
+    def rolling_kernel(self):
+        return RollingDollarVolume(self.window_length)
+
+
+def _nanmean(data):
+    valid = ~np.isnan(data)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, data, 0.0).sum(axis=0) / counts
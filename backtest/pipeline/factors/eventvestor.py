@@ -0,0 +1,43 @@
+"""
+Earnings-announcement factors.
+"""
+import numpy as np
+
+from ..data.eventvestor import EarningsCalendar
+from .basic import CustomFactor
+
+
+def _business_days(start, end):
+    start, end = np.broadcast_arrays(
+        np.asarray(start, dtype='datetime64[D]'),
+        np.asarray(end, dtype='datetime64[D]'),
+    )
+    known = ~(np.isnat(start) | np.isnat(end))
+    out = np.full(start.shape, np.nan)
+    out[known] = np.busday_count(start[known], end[known])
+    return out
+
+
+class BusinessDaysUntilNextEarnings(CustomFactor):
+    """
+    Business days from today to the next known earnings announcement. NaN
+    when the next date has not been announced yet.
+    """
+
+    inputs = [EarningsCalendar.next_announcement]
+    window_length = 1
+
+    def compute(self, today, assets, out, announce_dates):
+        out[:] = _business_days(np.datetime64(today.date()),
+                                announce_dates[-1])
+
+
+class BusinessDaysSincePreviousEarnings(CustomFactor):
+    """Business days since the most recent earnings announcement."""
+
+    inputs = [EarningsCalendar.previous_announcement]
+    window_length = 1
+
+    def compute(self, today, assets, out, announce_dates):
+        out[:] = _business_days(announce_dates[-1],
+                                np.datetime64(today.date()))
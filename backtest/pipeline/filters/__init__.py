@@ -0,0 +1,9 @@
+from ..factors.basic import CustomTermMixin
+from ..term import Filter
+
+
+class CustomFilter(CustomTermMixin, Filter):
+    """Base class for user-defined filters; `out` is a boolean array."""
+
+
+__all__ = ['CustomFilter', 'Filter']
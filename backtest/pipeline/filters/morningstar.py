@@ -0,0 +1,30 @@
+"""
+Tradeable-universe filters.
+
+The hosted versions also screen on share class, listing and sector
+concentration, which needs reference data we do not store; these rank by
+200-day average dollar volume among assets that traded on the last session.
+"""
+from ..data.builtin import USEquityPricing
+from ..factors.basic import AverageDollarVolume
+
+
+def make_us_equity_universe(target_size, rankby=None, mask=None):
+    """The `target_size` most liquid assets."""
+    if rankby is None:
+        rankby = AverageDollarVolume(window_length=200)
+    if mask is None:
+        mask = USEquityPricing.volume.latest > 0
+    return rankby.top(target_size, mask=mask)
+
+
+def Q500US():
+    return make_us_equity_universe(500)
+
+
+def Q1500US():
+    return make_us_equity_universe(1500)
+
+
+def Q3000US():
+    return make_us_equity_universe(3000)
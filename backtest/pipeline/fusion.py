@@ -0,0 +1,86 @@
+"""
+Rewrites common term patterns into cheaper equivalents before a pipeline is
+computed, so unmodified algorithms get the fused terms for free.
+
+* ``a.rank(mask=m) + b.rank(mask=m)`` becomes one `CombinedRank`.
+* ``f.percentile_between(0, low)`` and ``f.percentile_between(high, 100)``
+  on the same factor and mask become the two sides of one
+  `PercentileTails`, so both tails come from a single selection.
+
+Every substitute computes exactly the values of the term it replaces.
+"""
+from .term import (
+    BinaryFactor,
+    CombinedRank,
+    PercentileFilter,
+    Rank,
+    identity_of,
+)
+
+
+def walk(roots):
+    """Every term reachable from `roots`, keyed by identity."""
+    seen = {}
+    stack = [t for t in roots if t is not None]
+    while stack:
+        term = stack.pop()
+        if term.identity in seen:
+            continue
+        seen[term.identity] = term
+        stack.extend(term.dependencies())
+    return seen
+
+
+def fuse(roots):
+    """Map identity -> fused replacement for terms reachable from `roots`."""
+    terms = walk(roots)
+    substitutes = {}
+    tails = {}
+    for identity, term in terms.items():
+        if isinstance(term, BinaryFactor):
+            fused = _fuse_rank_sum(term)
+            if fused is not None:
+                substitutes[identity] = fused
+        elif isinstance(term, PercentileFilter):
+            key = (term.inputs[0].identity, identity_of(term.mask))
+            tails.setdefault(key, []).append(term)
+    for group in tails.values():
+        substitutes.update(_fuse_tails(group))
+    return substitutes
+
+
+def _fuse_rank_sum(term):
+    if term.op != '+' or len(term.inputs) != 2:
+        return None
+    left, right = term.inputs
+    if not (isinstance(left, Rank) and isinstance(right, Rank)):
+        return None
+    if left.identity[1] != right.identity[1] or \
+            identity_of(left.mask) != identity_of(right.mask):
+        return None
+    return CombinedRank(
+        [left.inputs[0], right.inputs[0]],
+        method=left.method,
+        ascending=left.ascending,
+        mask=left.mask,
+    )
+
+
+def _fuse_tails(filters):
+    bottoms = [f for f in filters
+               if f.min_percentile == 0 and f.max_percentile < 100]
+    tops = [f for f in filters
+            if f.max_percentile == 100 and f.min_percentile > 0]
+    lows = set(f.max_percentile for f in bottoms)
+    highs = set(f.min_percentile for f in tops)
+    if len(lows) != 1 or len(highs) != 1:
+        return {}
+    low, high = lows.pop(), highs.pop()
+    if not low < high:
+        return {}
+    sample = bottoms[0]
+    bottom, top = sample.inputs[0].percentile_tails(low, high,
+                                                    mask=sample.mask)
+    out = dict((f.identity, bottom) for f in bottoms)
+    out.update((f.identity, top) for f in tops)
+    return out
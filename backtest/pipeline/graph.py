@@ -0,0 +1,76 @@
+"""
+Compiles a `Pipeline` into a deduplicated graph of terms.
+
+Terms are nodes keyed by identity, so a subexpression built several times
+(``BusinessDaysUntilNextEarnings()`` in two places, the same mask on many
+factors) is one node and is computed once. Fused substitutes (see `fusion`)
+are applied while the graph is built. The engine computes a node by first
+computing the nodes it depends on, so terms that only feed columns nobody
+reads are never computed.
+"""
+from .fusion import fuse
+from .term import identity_of
+
+
+class TermGraph(object):
+    """
+    Attributes
+    ----------
+    columns : dict[str -> identity]
+        Node computing each pipeline column.
+    screen : identity or None
+        Node computing the screen.
+    terms : dict[identity -> Term]
+        Every node.
+
+    Filters stored in `universes` (a `UniverseMasks`) are read from it
+    instead of computed.
+    """
+
+    def __init__(self, pipeline, universes=None):
+        columns = pipeline.columns
+        roots = [t for _, t in sorted(columns.items())]
+        roots.append(pipeline.screen)
+        self._substitutes = fuse(roots)
+        if universes is not None:
+            self._substitutes.update(universes.substitutes(roots))
+        self.terms = {}
+        self._dependencies = {}
+        self.columns = dict(
+            (name, self._add(term)) for name, term in columns.items()
+        )
+        self.screen = (self._add(pipeline.screen)
+                       if pipeline.screen is not None else None)
+
+    @staticmethod
+    def key(pipeline):
+        """Identity of the graph `pipeline` compiles to."""
+        roots = [t for _, t in sorted(pipeline.columns.items())]
+        roots.append(pipeline.screen)
+        return tuple(identity_of(t) for t in roots)
+
+    def node(self, term):
+        """The node computing `term`'s values."""
+        identity = term.identity
+        substitute = self._substitutes.get(identity)
+        return substitute.identity if substitute is not None else identity
+
+    def dependencies(self, identity):
+        """Nodes whose values `identity` is computed from."""
+        return self._dependencies[identity]
+
+    def _add(self, term):
+        identity = self.node(term)
+        if identity in self.terms:
+            return identity
+        substitute = self._substitutes.get(term.identity)
+        if substitute is not None:
+            term = substitute
+        self.terms[identity] = term
+        # Windowed terms load their inputs from the data; only the mask is
+        # computed.
+        deps = [] if term.windowed else list(term.inputs)
+        if term.mask is not None:
+            deps.append(term.mask)
+        self._dependencies[identity] = [self._add(t) for t in deps]
+        return identity
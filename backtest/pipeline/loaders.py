@@ -0,0 +1,395 @@
+"""
+Pipeline loaders supply the raw windows of dataset columns.
+
+A loader's `load_window(column, start, stop)` returns rows ``[start, stop)``
+of a date x asset array aligned with the engine's sessions and assets. The
+last row of a window ending at `stop` is what is known before the market
+opens on session `stop`.
+"""
+import numpy as np
+import pandas as pd
+
+from .term import MISSING_VALUES
+
+
+class PipelineLoader(object):
+
+    # True when windows are views of resident arrays, so caching them saves
+    # nothing.
+    zero_copy = False
+
+    def load_window(self, column, start, stop):
+        raise NotImplementedError(type(self).__name__ + '.load_window')
+
+
+def _padded(values, start, stop, missing_value):
+    if start >= 0:
+        return values[start:stop]
+    pad = np.full((-start,) + values.shape[1:], missing_value,
+                  dtype=values.dtype)
+    return np.concatenate([pad, values[:max(stop, 0)]])
+
+
+class USEquityPricingLoader(PipelineLoader):
+    """Serves `USEquityPricing` columns straight from a `DailyBarReader`."""
+
+    zero_copy = True
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def load_window(self, column, start, stop):
+        return self._reader.window(column.name, start, stop)
+
+
+class ArrayLoader(PipelineLoader):
+    """
+    Serves columns from in-memory arrays.
+
+    Parameters
+    ----------
+    arrays : dict[BoundColumn -> np.ndarray]
+        One ``n_sessions x n_assets`` array per column.
+    """
+
+    def __init__(self, arrays):
+        self._arrays = {
+            column: np.asarray(values, dtype=column.dtype)
+            for column, values in arrays.items()
+        }
+
+    @property
+    def arrays(self):
+        return dict(self._arrays)
+
+    def load_window(self, column, start, stop):
+        return _padded(self._arrays[column], start, stop,
+                       MISSING_VALUES[column.dtype])
+
+
+_NS_PER_DAY = 86400 * 10 ** 9
+
+
+class EarningsCalendarIndex(object):
+    """
+    Every asset's announcement dates in one sorted array, grouped by asset
+    column (CSR layout: the dates of column j are
+    ``days[offsets[j]:offsets[j + 1]]``). Dates are day numbers, so the next
+    and previous announcement of every asset on a given day come from a
+    single `searchsorted`. Build one with `from_events`.
+    """
+
+    def __init__(self, sids, offsets, days, known):
+        self.sids = np.asarray(sids)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int64)
+        # When each date became known; NaT if always known.
+        self.known = np.asarray(known, dtype='datetime64[ns]')
+        base = self.days.min() if len(self.days) else 0
+        stride = (self.days.max() - base + 2) if len(self.days) else 1
+        self._base = base
+        self._stride = stride
+        columns = np.repeat(np.arange(len(self.sids)), np.diff(self.offsets))
+        self._keys = columns * stride + (self.days - base)
+        self._all_known = bool(np.isnat(self.known).all())
+        # Day offsets with a sentinel, so a cursor at the end can be read.
+        self._offsets_padded = np.r_[self.days - base, stride]
+        # side -> (day offset, per-column searchsorted positions)
+        self._cursors = {}
+
+    @classmethod
+    def from_events(cls, sids, events):
+        """
+        Parameters
+        ----------
+        sids : np.ndarray[int64]
+            The engine's asset columns.
+        events : pd.DataFrame
+            One row per announcement with ``sid`` and ``announcement_date``
+            columns, plus an optional ``timestamp`` column holding when the
+            date became known. Without it every date is treated as known in
+            advance. Events for other sids are ignored.
+        """
+        sids = np.asarray(sids)
+        columns = pd.Index(sids).get_indexer(events['sid'].values)
+        keep = columns >= 0
+        days = (events['announcement_date'].values[keep]
+                .astype('datetime64[D]').astype(np.int64))
+        if 'timestamp' in events:
+            known = events['timestamp'].values[keep].astype('datetime64[ns]')
+        else:
+            known = np.full(len(days), np.datetime64('NaT', 'ns'))
+        columns = columns[keep]
+        order = np.lexsort((days, columns))
+        offsets = np.zeros(len(sids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=len(sids)), out=offsets[1:])
+        return cls(sids, offsets, days[order], known[order])
+
+    def lookup(self, day, next_announcement=True):
+        """
+        The next (on or after `day`) or previous (on or before `day`)
+        announcement known by `day`, for every asset; NaT where there is
+        none.
+        """
+        n = len(self.sids)
+        out = np.full(n, np.datetime64('NaT', 'ns'))
+        if not len(self.days):
+            return out
+        day = np.datetime64(day, 'D')
+        offset = day.astype(np.int64) - self._base
+        # Clamp so the query stays inside each asset's key range.
+        offset = min(max(offset, -1), self._stride - 1)
+        if next_announcement:
+            pos = self._insertion(offset, 'left').copy()
+            found = pos < self.offsets[1:]
+        else:
+            pos = self._insertion(offset, 'right') - 1
+            found = pos >= self.offsets[:-1]
+        if not self._all_known:
+            self._skip_unknown(pos, found, np.datetime64(day, 'ns'),
+                               next_announcement)
+        out.view(np.int64)[found] = self.days[pos[found]] * _NS_PER_DAY
+        return out
+
+    def _insertion(self, offset, side):
+        """
+        Where day `offset` would be inserted in each column's dates. Moving
+        forward from the previous call's day, the positions are advanced in
+        place (almost always zero or one step per column) instead of searched
+        for again.
+        """
+        cursor = self._cursors.get(side)
+        if cursor is None or offset < cursor[0]:
+            queries = np.arange(len(self.sids)) * self._stride + offset
+            pos = np.searchsorted(self._keys, queries, side=side)
+        else:
+            pos = cursor[1]
+            ends = self.offsets[1:]
+            while True:
+                ahead = self._offsets_padded[pos]
+                if side == 'left':
+                    move = (ahead < offset) & (pos < ends)
+                else:
+                    move = (ahead <= offset) & (pos < ends)
+                if not move.any():
+                    break
+                pos = pos + move
+        self._cursors[side] = (offset, pos)
+        return pos
+
+    def _skip_unknown(self, pos, found, day, next_announcement):
+        # Rare: the nearest date was published after `day`. Walk on to the
+        # nearest one that was already known, if any.
+        known = self.known
+        hidden = np.flatnonzero(found)
+        hidden = hidden[known[pos[hidden]] > day]
+        step = 1 if next_announcement else -1
+        for j in hidden:
+            lo, hi = self.offsets[j], self.offsets[j + 1]
+            k = pos[j]
+            while lo <= k < hi and known[k] > day:
+                k += step
+            if lo <= k < hi:
+                pos[j] = k
+            else:
+                found[j] = False
+
+
+class EarningsCalendarLoader(PipelineLoader):
+    """
+    Next/previous earnings announcement dates, served from an
+    `EarningsCalendarIndex`.
+
+    Parameters
+    ----------
+    sessions : pd.DatetimeIndex
+        The engine's sessions.
+    sids : np.ndarray[int64]
+        The engine's asset columns.
+    events : pd.DataFrame or EarningsCalendarIndex
+        One row per announcement (see `EarningsCalendarIndex`), or an index
+        already built for `sids`.
+    """
+
+    def __init__(self, sessions, sids, events):
+        self._sessions = pd.DatetimeIndex(sessions).values.astype(
+            'datetime64[D]'
+        )
+        if isinstance(events, EarningsCalendarIndex):
+            if not np.array_equal(events.sids, sids):
+                raise ValueError("The earnings index was built for other "
+                                 "assets.")
+            self.index = events
+        else:
+            self.index = EarningsCalendarIndex.from_events(sids, events)
+
+    def load_window(self, column, start, stop):
+        # Row r describes the open of session start + r + 1.
+        nxt = column.name == 'next_announcement'
+        out = np.full((stop - start, len(self.index.sids)),
+                      np.datetime64('NaT', 'ns'))
+        for r, position in enumerate(range(start + 1, stop + 1)):
+            if 0 <= position < len(self._sessions):
+                out[r] = self.index.lookup(self._sessions[position], nxt)
+        return out
+
+
+class FundamentalsIndex(object):
+    """
+    Point-in-time history of one fundamentals field: for each asset column,
+    the days its value changed and the new values, sorted by day (CSR
+    layout like `EarningsCalendarIndex`). A value counts as known from the
+    first session after the day it was published, so a filing can never be
+    seen on the day it came out. Build one with `from_events`.
+    """
+
+    def __init__(self, offsets, days, values):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int64)
+        self.values = np.asarray(values)
+        base = self.days.min() if len(self.days) else 0
+        stride = (self.days.max() - base + 2) if len(self.days) else 1
+        self._base = base
+        self._stride = stride
+        columns = np.repeat(np.arange(len(self.offsets) - 1),
+                            np.diff(self.offsets))
+        self._keys = columns * stride + (self.days - base)
+        self._offsets_padded = np.r_[self.days - base, stride]
+        # (day offset, per-column insertion positions) of the last lookup
+        self._cursor = None
+
+    @classmethod
+    def from_events(cls, n_assets, columns, known, values):
+        """
+        Parameters
+        ----------
+        n_assets : int
+        columns : np.ndarray[int]
+            Asset column of each event.
+        known : np.ndarray[datetime64]
+            When each value was published.
+        values : np.ndarray
+            The published values. Missing values and repeats of the
+            asset's previous value are dropped.
+        """
+        columns = np.asarray(columns, dtype=np.int64)
+        days = (np.asarray(known).astype('datetime64[D]')
+                .astype(np.int64))
+        values = np.asarray(values)
+        keep = (columns >= 0) & (columns < n_assets)
+        if values.dtype.kind == 'f':
+            keep &= ~np.isnan(values)
+        columns, days, values = columns[keep], days[keep], values[keep]
+        # Stable, so the last event published on a day wins.
+        order = np.lexsort((days, columns))
+        columns, days, values = columns[order], days[order], values[order]
+        last = np.r_[(columns[1:] != columns[:-1]) |
+                     (days[1:] != days[:-1]), True]
+        columns, days, values = columns[last], days[last], values[last]
+        changed = np.r_[True, (columns[1:] != columns[:-1]) |
+                        (values[1:] != values[:-1])]
+        columns, days, values = (columns[changed], days[changed],
+                                 values[changed])
+        offsets = np.zeros(n_assets + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=n_assets), out=offsets[1:])
+        return cls(offsets, days, values)
+
+    def asof(self, days, missing_value):
+        """
+        The value of every asset as known at the open of each of `days`
+        (datetime64[D] or day numbers), shaped ``len(days) x n_assets``.
+        """
+        days = np.asarray(days).astype('datetime64[D]').astype(np.int64)
+        n = len(self.offsets) - 1
+        out = np.full((len(days), n), missing_value, dtype=self.values.dtype)
+        if not len(self.days):
+            return out
+        offset = np.clip(days - self._base, 0, self._stride - 1)
+        if len(offset) == 1:
+            pos = self._insertion(int(offset[0]))[None, :]
+        else:
+            queries = (np.arange(n) * self._stride)[None, :] + offset[:, None]
+            pos = np.searchsorted(self._keys, queries, side='left')
+        # Last change published strictly before the day.
+        pos = pos - 1
+        found = pos >= self.offsets[:-1]
+        out[found] = self.values[pos[found]]
+        return out
+
+    def _insertion(self, offset):
+        """
+        Where day `offset` would be inserted in each column's days, advanced
+        from the previous lookup's positions when the day moved forward (as
+        in `EarningsCalendarIndex._insertion`).
+        """
+        cursor = self._cursor
+        if cursor is None or offset < cursor[0]:
+            queries = np.arange(len(self.offsets) - 1) * self._stride + offset
+            pos = np.searchsorted(self._keys, queries, side='left')
+        else:
+            pos = cursor[1]
+            ends = self.offsets[1:]
+            while True:
+                move = (self._offsets_padded[pos] < offset) & (pos < ends)
+                if not move.any():
+                    break
+                pos = pos + move
+        self._cursor = (offset, pos)
+        return pos
+
+
+class FundamentalsLoader(PipelineLoader):
+    """
+    Point-in-time fundamentals for the columns of one dataset, served from
+    a `FundamentalsIndex` per column. Every window is a single as-of lookup
+    per column, forward-filling each asset's last known value.
+
+    Parameters
+    ----------
+    sessions : pd.DatetimeIndex
+        The engine's sessions.
+    indexes : dict[BoundColumn -> FundamentalsIndex]
+    """
+
+    def __init__(self, sessions, indexes):
+        self._sessions = pd.DatetimeIndex(sessions).values.astype(
+            'datetime64[D]'
+        )
+        self.indexes = dict(indexes)
+
+    @classmethod
+    def from_frame(cls, sessions, sids, dataset, frame):
+        """
+        Build a loader for `dataset` from a frame of change events.
+
+        `frame` has a ``sid`` column, a ``timestamp`` column holding when
+        the row was published, and one column per dataset field (NaN where
+        the row does not report the field). Rows for other sids are
+        ignored.
+        """
+        columns = pd.Index(np.asarray(sids)).get_indexer(frame['sid'].values)
+        known = frame['timestamp'].values
+        indexes = {}
+        for column in dataset.columns:
+            if column.name not in frame:
+                continue
+            values = frame[column.name].values
+            present = pd.notna(values)
+            indexes[column] = FundamentalsIndex.from_events(
+                len(sids), columns[present], known[present],
+                values[present].astype(column.dtype),
+            )
+        return cls(sessions, indexes)
+
+    def load_window(self, column, start, stop):
+        # Row r describes the open of session start + r + 1.
+        positions = np.arange(start + 1, stop + 1)
+        valid = (positions >= 0) & (positions < len(self._sessions))
+        index = self.indexes[column]
+        if valid.all():
+            return index.asof(self._sessions[positions], column.missing_value)
+        out = np.full((stop - start, len(index.offsets) - 1),
+                      column.missing_value, dtype=column.dtype)
+        out[valid] = index.asof(self._sessions[positions[valid]],
+                                column.missing_value)
+        return out
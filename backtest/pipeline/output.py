@@ -0,0 +1,95 @@
+"""
+The frame returned by ``pipeline_output``, with columns computed on demand.
+"""
+import numpy as np
+import pandas as pd
+
+
+class PipelineOutput(pd.DataFrame):
+    """
+    A DataFrame of pipeline results whose columns are computed the first
+    time they are needed.
+
+    ``output[name]`` computes only that column. ``output[mask]`` with a
+    boolean Series or array selects rows and stays lazy. ``output.index``,
+    ``len(output)`` and ``name in output`` need no columns. Anything else
+    (printing, ``.loc``, ``.values``, arithmetic on the frame, ...) computes
+    every remaining column first and then behaves exactly like the eager
+    frame.
+
+    Parameters
+    ----------
+    index : pd.Index
+        The assets passing the screen.
+    rows : np.ndarray[int]
+        Position of each of those assets in the engine's asset list.
+    names : list[str]
+        Column names, in output order.
+    load : callable
+        ``load(name)`` returns the column's values for every asset.
+    """
+
+    def __init__(self, index, rows, names, load):
+        pd.DataFrame.__init__(self, index=index)
+        object.__setattr__(self, '_lazy', (rows, list(names), load))
+
+    # pandas reaches the data of a frame through its private `_mgr`, so
+    # that is where the columns are computed; tests/test_pipeline_output.py
+    # covers the paths that rely on it across pandas versions.
+    @property
+    def _mgr(self):
+        if self.__dict__.get('_lazy') is not None:
+            self._materialize()
+        return self.__dict__['_mgr']
+
+    @_mgr.setter
+    def _mgr(self, value):
+        self.__dict__['_mgr'] = value
+
+    @property
+    def index(self):
+        return self.__dict__['_mgr'].axes[1]
+
+    @index.setter
+    def index(self, value):
+        pd.DataFrame.index.__set__(self, value)
+
+    def __getitem__(self, key):
+        lazy = self.__dict__.get('_lazy')
+        if lazy is None:
+            return pd.DataFrame.__getitem__(self, key)
+        rows, names, load = lazy
+        if isinstance(key, str) and key in names:
+            return pd.Series(load(key)[rows], index=self.index, name=key)
+        selector = self._row_selector(key)
+        if selector is not None:
+            return PipelineOutput(self.index[selector], rows[selector], names,
+                                  load)
+        return pd.DataFrame.__getitem__(self, key)
+
+    def __contains__(self, key):
+        lazy = self.__dict__.get('_lazy')
+        if lazy is None:
+            return pd.DataFrame.__contains__(self, key)
+        return key in lazy[1]
+
+    def _row_selector(self, key):
+        """`key` as a boolean row mask, or None if it is not one."""
+        if isinstance(key, pd.Series):
+            if key.dtype != bool or not key.index.equals(self.index):
+                return None
+            return key.values
+        if isinstance(key, np.ndarray) and key.dtype == bool and \
+                key.shape == (len(self.index),):
+            return key
+        return None
+
+    def _materialize(self):
+        rows, names, load = self.__dict__.pop('_lazy')
+        index = self.__dict__['_mgr'].axes[1]
+        frame = pd.DataFrame(
+            dict((name, load(name)[rows]) for name in names),
+            index=index,
+            columns=names,
+        )
+        self.__dict__['_mgr'] = frame._mgr
@@ -0,0 +1,47 @@
+from .term import ComputableTerm, Filter
+
+
+class Pipeline(object):
+    """
+    A collection of named terms to compute each day, optionally restricted
+    to the assets passing `screen`.
+    """
+
+    def __init__(self, columns=None, screen=None):
+        self._columns = {}
+        for name, term in (columns or {}).items():
+            self.add(term, name)
+        self._screen = None
+        if screen is not None:
+            self.set_screen(screen)
+
+    @property
+    def columns(self):
+        return dict(self._columns)
+
+    @property
+    def screen(self):
+        return self._screen
+
+    def add(self, term, name, overwrite=False):
+        if not isinstance(term, ComputableTerm):
+            raise TypeError(
+                "%r is not a computable term; use `.latest` to add the most "
+                "recent value of a column." % (term,)
+            )
+        if name in self._columns and not overwrite:
+            raise KeyError("Column %r already exists." % (name,))
+        self._columns[name] = term
+
+    def remove(self, name):
+        return self._columns.pop(name)
+
+    def set_screen(self, screen, overwrite=False):
+        if not isinstance(screen, Filter):
+            raise TypeError("A pipeline screen must be a Filter.")
+        if self._screen is not None and not overwrite:
+            raise ValueError(
+                "Pipeline already has a screen; pass overwrite=True to "
+                "replace it."
+            )
+        self._screen = screen
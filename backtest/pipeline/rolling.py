@@ -0,0 +1,239 @@
+"""
+Streaming kernels for windowed factors.
+
+A kernel keeps a ring buffer of the last `window_length` rows of each input
+plus running aggregates, so moving the window forward one session costs
+O(n_assets) instead of O(window_length x n_assets). Running sums are
+rebuilt from the ring every `resum_every` updates to bound floating point
+drift.
+"""
+import numpy as np
+
+
+def _nan_to_zero(values):
+    return np.where(np.isnan(values), 0.0, values)
+
+
+class RollingKernel(object):
+    """
+    Base class. Subclasses implement `_reset_state`, `_push` and `_output`.
+
+    Parameters
+    ----------
+    window_length : int
+    resum_every : int, optional
+        Rebuild running aggregates from the ring after this many updates.
+        Defaults to `window_length`, so the rebuild is amortised to O(1)
+        rows per update.
+    """
+
+    def __init__(self, window_length, resum_every=None):
+        self.window_length = window_length
+        self.resum_every = resum_every or window_length
+        self._rings = None
+        self._pos = 0
+        self._updates = 0
+
+    def reset(self, *windows):
+        """Start from full windows (``window_length x n_assets`` each)."""
+        self._rings = [np.array(w, dtype=np.float64) for w in windows]
+        self._pos = 0
+        self._updates = 0
+        self._reset_state()
+        return self._output()
+
+    def update(self, *rows):
+        """Slide the window forward by one row per input."""
+        leaving = [ring[self._pos].copy() for ring in self._rings]
+        for ring, row in zip(self._rings, rows):
+            ring[self._pos] = row
+        self._pos = (self._pos + 1) % self.window_length
+        self._updates += 1
+        if self._updates % self.resum_every == 0:
+            self._reset_state()
+        else:
+            self._push(rows, leaving)
+        return self._output()
+
+    def _reset_state(self):
+        raise NotImplementedError
+
+    def _push(self, rows, leaving):
+        raise NotImplementedError
+
+    def _output(self):
+        raise NotImplementedError
+
+
+class RollingNanMean(RollingKernel):
+    """Mean over the window, ignoring NaNs (`SimpleMovingAverage`)."""
+
+    def _reset_state(self):
+        ring = self._rings[0]
+        self._sums = _nan_to_zero(ring).sum(axis=0)
+        self._counts = (~np.isnan(ring)).sum(axis=0)
+
+    def _push(self, rows, leaving):
+        new, old = rows[0], leaving[0]
+        self._sums += _nan_to_zero(new) - _nan_to_zero(old)
+        self._counts += (~np.isnan(new)).astype(np.int64)
+        self._counts -= (~np.isnan(old)).astype(np.int64)
+        # Drop the rounding residue of an asset whose window is now all
+        # NaN, which would otherwise turn 0 / 0 into +-inf.
+        self._sums[self._counts == 0] = 0.0
+
+    def _output(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._sums / self._counts
+
+
+class RollingDollarVolume(RollingKernel):
+    """Sum of close x volume over the window, divided by its length."""
+
+    def reset(self, close, volume):
+        # Only the product is needed, so keep one ring instead of two.
+        return super(RollingDollarVolume, self).reset(close * volume)
+
+    def update(self, close, volume):
+        return super(RollingDollarVolume, self).update(close * volume)
+
+    def _reset_state(self):
+        ring = self._rings[0]
+        self._sums = _nan_to_zero(ring).sum(axis=0)
+        self._counts = (~np.isnan(ring)).sum(axis=0)
+
+    def _push(self, rows, leaving):
+        new, old = rows[0], leaving[0]
+        self._sums += _nan_to_zero(new) - _nan_to_zero(old)
+        self._counts += (~np.isnan(new)).astype(np.int64)
+        self._counts -= (~np.isnan(old)).astype(np.int64)
+        # An all-NaN window sums to exactly zero, as in `compute`.
+        self._sums[self._counts == 0] = 0.0
+
+    def _output(self):
+        return self._sums / self.window_length
+
+
+class RollingReturns(RollingKernel):
+    """Percent change between the first and last row of the window."""
+
+    def _reset_state(self):
+        pass
+
+    def _push(self, rows, leaving):
+        pass
+
+    def _output(self):
+        ring = self._rings[0]
+        first = ring[self._pos]
+        last = ring[self._pos - 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (last - first) / first
+
+
+def verify_rolling_kernel(term, *inputs, **kwargs):
+    """
+    Check a term's streaming kernel against its full-window `compute`.
+
+    `inputs` are full date x asset arrays, one per input of `term`. The
+    kernel is reset on the first window and updated row by row; every day's
+    output must match ``term._compute`` on the whole window (NaNs in the
+    same places, values to within floating point noise). Pass ``masks=`` (a
+    date x asset boolean array) to mask each day's output as the pipeline
+    engine does; the kernel itself always runs over every asset. Returns
+    the largest absolute difference seen, or raises AssertionError.
+    """
+    masks = kwargs.pop('masks', None)
+    if kwargs:
+        raise TypeError("unexpected keyword arguments: %s" % sorted(kwargs))
+    window_length = term.window_length
+    kernel = term.rolling_kernel()
+    n_days, n_assets = inputs[0].shape
+    assets = np.arange(n_assets)
+    if masks is None:
+        masks = np.ones((n_days, n_assets), dtype=bool)
+    worst = 0.0
+    for stop in range(window_length, n_days + 1):
+        start = stop - window_length
+        mask = masks[stop - 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if stop == window_length:
+                got = kernel.reset(*[x[start:stop] for x in inputs])
+            else:
+                got = kernel.update(*[x[stop - 1] for x in inputs])
+            got = np.where(mask, got, term.missing_value)
+            expected = term._compute([x[start:stop] for x in inputs],
+                                     None, assets, mask)
+        if not np.array_equal(np.isnan(got), np.isnan(expected)):
+            raise AssertionError(
+                "%r: NaN mismatch for the window ending at row %d"
+                % (term, stop - 1)
+            )
+        finite = ~np.isnan(expected)
+        if finite.any():
+            diff = np.abs(got[finite] - expected[finite])
+            scale = np.maximum(np.abs(expected[finite]), 1.0)
+            if (diff > 1e-9 * scale).any():
+                raise AssertionError(
+                    "%r: kernel drifted from the full-window result by %g "
+                    "for the window ending at row %d"
+                    % (term, diff.max(), stop - 1)
+                )
+            worst = max(worst, diff.max())
+    return worst
+
+
+def verify_incremental(term, *inputs, **kwargs):
+    """
+    Check a custom term's `init` / `update` steps against its `compute`.
+
+    `inputs` are full date x asset arrays, one per input of `term`. Pass
+    ``masks=`` (a date x asset boolean array) to also exercise universe
+    changes: the state is carried forward with `update` while a day's mask
+    equals the previous one, and rebuilt with `init` when it changes, as the
+    pipeline engine does. Every day's output must match ``term._compute``
+    on the full window. Returns the number of `update` steps taken, or
+    raises AssertionError.
+    """
+    masks = kwargs.pop('masks', None)
+    if kwargs:
+        raise TypeError("unexpected keyword arguments: %s" % sorted(kwargs))
+    wl = term.window_length
+    n_days, n_assets = inputs[0].shape
+    assets = np.arange(n_assets)
+    if masks is None:
+        masks = np.ones((n_days, n_assets), dtype=bool)
+    state = None
+    updates = 0
+    for stop in range(wl, n_days + 1):
+        mask = masks[stop - 1]
+        windows = [x[stop - wl:stop] for x in inputs]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if state is not None and np.array_equal(masks[stop - 2], mask):
+                got, state = term._update(
+                    state,
+                    [x[stop - 1] for x in inputs],
+                    [x[stop - 1 - wl] for x in inputs],
+                    None, assets, mask,
+                )
+                updates += 1
+            else:
+                got, state = term._init(windows, None, assets, mask)
+            expected = term._compute(windows, None, assets, mask)
+        got = np.asarray(got, dtype=np.float64)
+        expected = np.asarray(expected, dtype=np.float64)
+        if not np.array_equal(np.isnan(got), np.isnan(expected)):
+            raise AssertionError(
+                "%r: NaN mismatch for the window ending at row %d"
+                % (term, stop - 1)
+            )
+        finite = ~np.isnan(expected)
+        if finite.any():
+            diff = np.abs(got[finite] - expected[finite])
+            scale = np.maximum(np.abs(expected[finite]), 1.0)
+            if (diff > 1e-9 * scale).any():
+                raise AssertionError(
+                    "%r: update drifted from compute by %g for the window "
+                    "ending at row %d" % (term, diff.max(), stop - 1)
+                )
+    return updates
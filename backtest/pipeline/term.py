@@ -0,0 +1,699 @@
+"""
+Pipeline terms.
+
+Every term produces one value per asset for the simulation day being
+computed. Windowed terms (``window_length > 0``) receive trailing windows of
+their input columns; all other terms receive the one-dimensional results of
+their input terms.
+"""
+import hashlib
+import sys
+import types
+
+import numpy as np
+
+from ..errors import UnsupportedPipelineTerm
+
+float64 = np.dtype('float64')
+int64 = np.dtype('int64')
+bool_ = np.dtype('bool')
+datetime64 = np.dtype('datetime64[ns]')
+
+MISSING_VALUES = {
+    float64: np.nan,
+    int64: -1,
+    bool_: False,
+    datetime64: np.datetime64('NaT'),
+}
+
+
+class Term(object):
+    """
+    Base class for factors, filters, classifiers and loadable columns.
+
+    Subclasses set `dtype` and implement `_compute(inputs, today, assets,
+    mask)`, returning an array with one entry per asset.
+    """
+
+    inputs = ()
+    window_length = 0
+    mask = None
+    dtype = float64
+
+    @property
+    def missing_value(self):
+        return MISSING_VALUES[self.dtype]
+
+    @property
+    def windowed(self):
+        return self.window_length > 0
+
+    def _static_params(self):
+        """Hashable parameters that, with type and inputs, define the term."""
+        return ()
+
+    @property
+    def identity(self):
+        """
+        Structural key of the term: equal for any two terms of the same type,
+        parameters, inputs, window_length and mask, which therefore always
+        compute the same values.
+        """
+        identity = self.__dict__.get('_identity')
+        if identity is None:
+            identity = (
+                type_key(type(self)),
+                self._static_params(),
+                tuple(identity_of(t) for t in self.inputs),
+                self.window_length,
+                identity_of(self.mask),
+            )
+            self._identity = identity
+        return identity
+
+    def dependencies(self):
+        """Terms that must be computed before this one."""
+        deps = list(self.inputs)
+        if self.mask is not None:
+            deps.append(self.mask)
+        return deps
+
+    def _compute(self, inputs, today, assets, mask):
+        raise NotImplementedError(type(self).__name__ + '._compute')
+
+    def rolling_kernel(self):
+        """
+        A `RollingKernel` computing this windowed term for every asset, or
+        None if the term must be recomputed from its full window each day.
+        """
+        return None
+
+    def __repr__(self):
+        return '%s(%s)' % (
+            type(self).__name__,
+            ', '.join(repr(i) for i in self.inputs),
+        )
+
+
+def type_key(cls):
+    """
+    Hashable key for a term class.
+
+    Classes importable from a module are their own key. Classes defined in
+    algorithm scripts are keyed by their body (method bytecode and class
+    constants) and by the current values of the globals their methods read,
+    so the same factor pasted into several scripts, or one script executed
+    twice, is recognised as the same term, while runs of a script with
+    different parameters are not.
+    """
+    key = cls.__dict__.get('_type_key')
+    if key is not None:
+        return key
+    if _importable(cls):
+        # Script globals can change between runs, so only importable
+        # classes cache their key.
+        cls._type_key = key = cls
+        return key
+    return _class_key(cls, set())
+
+
+def _importable(value):
+    module = sys.modules.get(getattr(value, '__module__', None))
+    name = getattr(value, '__qualname__', None)
+    return (module is not None and isinstance(name, str)
+            and getattr(module, name, None) is value)
+
+
+def _class_key(cls, seen):
+    if id(cls) in seen:
+        return ('recursive', cls.__qualname__)
+    seen.add(id(cls))
+    return (cls.__qualname__,
+            tuple(base if _importable(base) else _class_key(base, seen)
+                  for base in cls.__bases__),
+            _body_key(cls, seen))
+
+
+def _body_key(cls, seen):
+    items = []
+    for name, value in sorted(vars(cls).items()):
+        if name.startswith('__') or name == '_type_key':
+            continue
+        if isinstance(value, (staticmethod, classmethod)):
+            value = value.__func__
+        if isinstance(value, types.FunctionType):
+            value = _function_key(value, seen)
+        else:
+            try:
+                hash(value)
+            except TypeError:
+                value = repr(value)
+        items.append((name, value))
+    return tuple(items)
+
+
+def _function_key(func, seen):
+    if id(func) in seen:
+        return ('recursive', func.__qualname__)
+    seen.add(id(func))
+    code = func.__code__
+    namespace = func.__globals__
+    names = sorted(name for name in _global_names(code) if name in namespace)
+    return (_code_key(code),
+            tuple((name, _value_key(namespace[name], seen)) for name in names))
+
+
+def _global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(_global_names(const))
+    return names
+
+
+_SCALARS = (type(None), bool, int, float, complex, str, bytes, np.generic)
+
+
+def _value_key(value, seen):
+    # Keys stay picklable (they are written into checkpoints with the
+    # engine's state), so modules and importable objects go by name.
+    if isinstance(value, types.ModuleType):
+        return ('module', value.__name__)
+    if isinstance(value, _SCALARS):
+        return (type(value).__name__, repr(value))
+    if isinstance(value, types.MethodType):
+        value = value.__func__
+    if _importable(value):
+        return ('ref', value.__module__, value.__qualname__)
+    if isinstance(value, types.FunctionType):
+        return _function_key(value, seen)
+    if isinstance(value, type):
+        return _class_key(value, seen)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        items = [_value_key(v, seen) for v in value]
+        if isinstance(value, (set, frozenset)):
+            items.sort(key=repr)
+        return (type(value).__name__, tuple(items))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted(
+            ((_value_key(k, seen), _value_key(v, seen))
+             for k, v in value.items()), key=repr)))
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        digest = hashlib.sha1(np.ascontiguousarray(value).tobytes())
+        return ('ndarray', value.dtype.str, value.shape, digest.hexdigest())
+    # Anything else is only equal to itself, so the term is not shared.
+    return ('object', type(value).__qualname__, id(value))
+
+
+def _code_key(code):
+    # Like code equality, but ignoring line numbers.
+    return (
+        code.co_code,
+        tuple(_code_key(c) if isinstance(c, types.CodeType) else c
+              for c in code.co_consts),
+        code.co_names,
+        code.co_varnames,
+    )
+
+
+def identity_of(value):
+    """`Term.identity` for terms; scalars and None identify themselves."""
+    if isinstance(value, Term):
+        return value.identity
+    return value
+
+
+class LoadableTerm(Term):
+    """A term whose values come from a pipeline loader (a dataset column)."""
+
+
+class ComputableTerm(Term):
+
+    def __init__(self, inputs=None, window_length=None, mask=None):
+        if inputs is not None:
+            self.inputs = tuple(inputs)
+        else:
+            self.inputs = tuple(type(self).inputs)
+        if window_length is not None:
+            self.window_length = window_length
+        if mask is not None:
+            self.mask = mask
+        if self.windowed:
+            for term in self.inputs:
+                if not isinstance(term, LoadableTerm):
+                    raise UnsupportedPipelineTerm(
+                        "%s has window_length=%d, so its inputs must be "
+                        "dataset columns, not %r."
+                        % (type(self).__name__, self.window_length, term)
+                    )
+
+
+# Factor -----------------------------------------------------------------
+
+_ARITHMETIC = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.divide,
+    '**': np.power,
+}
+
+_COMPARISONS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+
+def _binary(cls, op, left, right):
+    if not isinstance(left, Term) and not isinstance(right, Term):
+        raise TypeError("At least one operand must be a pipeline term.")
+    return cls(op, left, right)
+
+
+class Factor(ComputableTerm):
+    """A term producing a float per asset."""
+
+    dtype = float64
+
+    def __add__(self, other):
+        return _binary(BinaryFactor, '+', self, other)
+
+    def __radd__(self, other):
+        return _binary(BinaryFactor, '+', other, self)
+
+    def __sub__(self, other):
+        return _binary(BinaryFactor, '-', self, other)
+
+    def __rsub__(self, other):
+        return _binary(BinaryFactor, '-', other, self)
+
+    def __mul__(self, other):
+        return _binary(BinaryFactor, '*', self, other)
+
+    def __rmul__(self, other):
+        return _binary(BinaryFactor, '*', other, self)
+
+    def __truediv__(self, other):
+        return _binary(BinaryFactor, '/', self, other)
+
+    def __rtruediv__(self, other):
+        return _binary(BinaryFactor, '/', other, self)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __pow__(self, other):
+        return _binary(BinaryFactor, '**', self, other)
+
+    def __neg__(self):
+        return _binary(BinaryFactor, '-', 0.0, self)
+
+    def __gt__(self, other):
+        return _binary(ComparisonFilter, '>', self, other)
+
+    def __ge__(self, other):
+        return _binary(ComparisonFilter, '>=', self, other)
+
+    def __lt__(self, other):
+        return _binary(ComparisonFilter, '<', self, other)
+
+    def __le__(self, other):
+        return _binary(ComparisonFilter, '<=', self, other)
+
+    def eq(self, other):
+        return _binary(ComparisonFilter, '==', self, other)
+
+    def isnan(self):
+        return NaNFilter(self, 'isnan')
+
+    def notnan(self):
+        return NaNFilter(self, 'notnan')
+
+    def isfinite(self):
+        return NaNFilter(self, 'isfinite')
+
+    def rank(self, method='ordinal', ascending=True, mask=None):
+        return Rank(self, method=method, ascending=ascending, mask=mask)
+
+    def percentile_between(self, min_percentile, max_percentile, mask=None):
+        return PercentileFilter(self, min_percentile, max_percentile,
+                                mask=mask)
+
+    def percentile_tails(self, low, high, mask=None):
+        """
+        ``(bottom, top)`` filters equal to ``percentile_between(0, low)`` and
+        ``percentile_between(high, 100)``, selected together in one pass.
+        """
+        tails = PercentileTails(self, low, high, mask=mask)
+        bottom = tails.element_of([tails.BOTTOM, tails.BOTH])
+        top = tails.element_of([tails.TOP, tails.BOTH])
+        return bottom, top
+
+    def quantiles(self, bins, mask=None):
+        return Quantiles(self, bins, mask=mask)
+
+    def quartiles(self, mask=None):
+        return self.quantiles(4, mask=mask)
+
+    def quintiles(self, mask=None):
+        return self.quantiles(5, mask=mask)
+
+    def deciles(self, mask=None):
+        return self.quantiles(10, mask=mask)
+
+    def top(self, N, mask=None):
+        return self.rank(ascending=False, mask=mask) <= N
+
+    def bottom(self, N, mask=None):
+        return self.rank(ascending=True, mask=mask) <= N
+
+
+class BinaryFactor(Factor):
+    """Elementwise arithmetic between factors and/or scalars."""
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.operands = (left, right)
+        super(BinaryFactor, self).__init__(
+            inputs=[t for t in self.operands if isinstance(t, Term)],
+            window_length=0,
+        )
+
+    def _static_params(self):
+        return (self.op, tuple(identity_of(t) for t in self.operands))
+
+    def _compute(self, inputs, today, assets, mask):
+        values = iter(inputs)
+        left, right = [next(values) if isinstance(t, Term) else t
+                       for t in self.operands]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            out = _ARITHMETIC[self.op](left, right, dtype=np.float64)
+        return np.where(mask, out, np.nan)
+
+    def __repr__(self):
+        return '(%r %s %r)' % (self.operands[0], self.op, self.operands[1])
+
+
+class Rank(Factor):
+    """Cross-sectional rank of a factor; masked-out and NaN inputs rank NaN."""
+
+    def __init__(self, factor, method='ordinal', ascending=True, mask=None):
+        if method not in ('ordinal', 'average', 'min', 'max', 'dense'):
+            raise ValueError("Unknown rank method %r" % (method,))
+        self.method = method
+        self.ascending = ascending
+        super(Rank, self).__init__(inputs=[factor], window_length=0,
+                                   mask=mask)
+
+    def _static_params(self):
+        return (self.method, self.ascending)
+
+    def _compute(self, inputs, today, assets, mask):
+        return _masked_rank(inputs[0], mask, self.method, self.ascending)
+
+
+class CombinedRank(Factor):
+    """
+    Sum of several factors' ranks under one mask, i.e.
+    ``a.rank(mask=m) + b.rank(mask=m)`` computed as a single term. Each
+    input is ranked over its own non-NaN values; an asset missing from any
+    input gets NaN.
+    """
+
+    def __init__(self, factors, method='ordinal', ascending=True, mask=None):
+        if method not in ('ordinal', 'average', 'min', 'max', 'dense'):
+            raise ValueError("Unknown rank method %r" % (method,))
+        self.method = method
+        self.ascending = ascending
+        super(CombinedRank, self).__init__(inputs=factors, window_length=0,
+                                           mask=mask)
+
+    def _static_params(self):
+        return (self.method, self.ascending)
+
+    def _compute(self, inputs, today, assets, mask):
+        out = np.zeros(len(mask))
+        for values in inputs:
+            out += _masked_rank(values, mask, self.method, self.ascending)
+        return out
+
+
+def _masked_rank(values, mask, method, ascending):
+    valid = mask & ~np.isnan(values)
+    out = np.full(len(values), np.nan)
+    data = values[valid]
+    if not ascending:
+        data = -data
+    out[valid] = rankdata(data, method)
+    return out
+
+
+def rankdata(values, method='ordinal'):
+    """Ranks (1-based) of a 1D array without NaNs, mirroring scipy."""
+    n = len(values)
+    order = np.argsort(values, kind='mergesort')
+    ranks = np.empty(n, dtype=np.float64)
+    if method == 'ordinal':
+        ranks[order] = np.arange(1, n + 1)
+        return ranks
+    sorted_values = values[order]
+    new_group = np.r_[True, sorted_values[1:] != sorted_values[:-1]]
+    group = np.cumsum(new_group) - 1
+    if method == 'dense':
+        ranks[order] = group + 1
+        return ranks
+    starts = np.flatnonzero(new_group)
+    ends = np.r_[starts[1:], n]
+    if method == 'min':
+        per_group = starts + 1.0
+    elif method == 'max':
+        per_group = ends.astype(np.float64)
+    else:
+        per_group = (starts + 1 + ends) / 2.0
+    ranks[order] = per_group[group]
+    return ranks
+
+
+# Filter -----------------------------------------------------------------
+
+class Filter(ComputableTerm):
+    """A term producing a boolean per asset."""
+
+    dtype = bool_
+
+    def __and__(self, other):
+        if not isinstance(other, Filter):
+            raise TypeError("Can only combine a Filter with another Filter.")
+        return BooleanFilter('&', self, other)
+
+    def __or__(self, other):
+        if not isinstance(other, Filter):
+            raise TypeError("Can only combine a Filter with another Filter.")
+        return BooleanFilter('|', self, other)
+
+    def __invert__(self):
+        return BooleanFilter('~', self)
+
+
+class ComparisonFilter(Filter):
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.operands = (left, right)
+        super(ComparisonFilter, self).__init__(
+            inputs=[t for t in self.operands if isinstance(t, Term)],
+            window_length=0,
+        )
+
+    def _static_params(self):
+        return (self.op, tuple(identity_of(t) for t in self.operands))
+
+    def _compute(self, inputs, today, assets, mask):
+        values = iter(inputs)
+        left, right = [next(values) if isinstance(t, Term) else t
+                       for t in self.operands]
+        with np.errstate(invalid='ignore'):
+            return _COMPARISONS[self.op](left, right) & mask
+
+    def __repr__(self):
+        return '(%r %s %r)' % (self.operands[0], self.op, self.operands[1])
+
+
+class BooleanFilter(Filter):
+
+    def __init__(self, op, *operands):
+        self.op = op
+        super(BooleanFilter, self).__init__(inputs=operands, window_length=0)
+
+    def _static_params(self):
+        return (self.op,)
+
+    def _compute(self, inputs, today, assets, mask):
+        if self.op == '~':
+            return ~inputs[0] & mask
+        if self.op == '&':
+            return inputs[0] & inputs[1]
+        return inputs[0] | inputs[1]
+
+    def __repr__(self):
+        if self.op == '~':
+            return '~%r' % (self.inputs[0],)
+        return '(%r %s %r)' % (self.inputs[0], self.op, self.inputs[1])
+
+
+class NaNFilter(Filter):
+
+    def __init__(self, factor, kind):
+        self.kind = kind
+        super(NaNFilter, self).__init__(inputs=[factor], window_length=0)
+
+    def _static_params(self):
+        return (self.kind,)
+
+    def _compute(self, inputs, today, assets, mask):
+        values = inputs[0]
+        if self.kind == 'isnan':
+            out = np.isnan(values)
+        elif self.kind == 'notnan':
+            out = ~np.isnan(values)
+        else:
+            out = np.isfinite(values)
+        return out & mask
+
+
+class PercentileFilter(Filter):
+    """
+    True where a factor lies between two cross-sectional percentiles
+    (inclusive), computed over the masked, non-NaN values.
+    """
+
+    def __init__(self, factor, min_percentile, max_percentile, mask=None):
+        if not 0.0 <= min_percentile < max_percentile <= 100.0:
+            raise ValueError(
+                "Invalid percentile bounds: min_percentile=%r, "
+                "max_percentile=%r" % (min_percentile, max_percentile)
+            )
+        self.min_percentile = min_percentile
+        self.max_percentile = max_percentile
+        super(PercentileFilter, self).__init__(inputs=[factor],
+                                               window_length=0, mask=mask)
+
+    def _static_params(self):
+        return (self.min_percentile, self.max_percentile)
+
+    def _compute(self, inputs, today, assets, mask):
+        data = np.where(mask, inputs[0], np.nan)
+        finite = data[~np.isnan(data)]
+        if not len(finite):
+            return np.zeros(len(data), dtype=bool)
+        lower, upper = np.percentile(
+            finite, [self.min_percentile, self.max_percentile]
+        )
+        with np.errstate(invalid='ignore'):
+            return (lower <= data) & (data <= upper)
+
+
+class ElementOf(Filter):
+    """True where a classifier's label is one of `choices`."""
+
+    def __init__(self, classifier, choices):
+        self.choices = tuple(sorted(choices))
+        super(ElementOf, self).__init__(inputs=[classifier], window_length=0)
+
+    def _static_params(self):
+        return (self.choices,)
+
+    def _compute(self, inputs, today, assets, mask):
+        return np.isin(inputs[0], self.choices) & mask
+
+
+# Classifier -------------------------------------------------------------
+
+class Classifier(ComputableTerm):
+    """A term producing an integer label per asset (-1 when missing)."""
+
+    dtype = int64
+
+    def eq(self, other):
+        return _binary(ComparisonFilter, '==', self, other)
+
+    def isnull(self):
+        return _binary(ComparisonFilter, '==', self, self.missing_value)
+
+    def notnull(self):
+        return _binary(ComparisonFilter, '!=', self, self.missing_value)
+
+    def element_of(self, choices):
+        return ElementOf(self, choices)
+
+
+class Quantiles(Classifier):
+    """Bucket label (0 .. bins - 1) of a factor's cross-sectional quantile."""
+
+    def __init__(self, factor, bins, mask=None):
+        self.bins = bins
+        super(Quantiles, self).__init__(inputs=[factor], window_length=0,
+                                        mask=mask)
+
+    def _static_params(self):
+        return (self.bins,)
+
+    def _compute(self, inputs, today, assets, mask):
+        data = np.where(mask, inputs[0], np.nan)
+        valid = ~np.isnan(data)
+        out = np.full(len(data), -1, dtype=np.int64)
+        if not valid.any():
+            return out
+        values = data[valid]
+        # Same edges and right-closed bins as pandas.qcut(labels=False).
+        edges = np.percentile(values, np.linspace(0, 100, self.bins + 1))
+        labels = np.searchsorted(edges, values, side='left') - 1
+        out[valid] = np.clip(labels, 0, self.bins - 1)
+        return out
+
+
+class PercentileTails(Classifier):
+    """
+    Labels the bottom (``0 .. low``) and top (``high .. 100``) percentile
+    tails of a factor. BOTTOM (or BOTH) and TOP (or BOTH) select exactly
+    what ``percentile_between(0, low)`` and ``percentile_between(high, 100)``
+    would; BOTH only occurs when ties make the two cut points equal, and
+    everything else is -1. Both cut points come from one partition-based
+    selection instead of one per filter.
+    """
+
+    BOTTOM = 0
+    TOP = 1
+    BOTH = 2
+
+    def __init__(self, factor, low, high, mask=None):
+        if not 0.0 < low < high < 100.0:
+            raise ValueError(
+                "Invalid percentile tails: low=%r, high=%r" % (low, high)
+            )
+        self.low = low
+        self.high = high
+        super(PercentileTails, self).__init__(inputs=[factor],
+                                              window_length=0, mask=mask)
+
+    def _static_params(self):
+        return (self.low, self.high)
+
+    def _compute(self, inputs, today, assets, mask):
+        data = np.where(mask, inputs[0], np.nan)
+        out = np.full(len(data), -1, dtype=np.int64)
+        finite = data[~np.isnan(data)]
+        if not len(finite):
+            return out
+        lower, upper = np.percentile(finite, [self.low, self.high])
+        with np.errstate(invalid='ignore'):
+            bottom = data <= lower
+            top = data >= upper
+        out[bottom] = self.BOTTOM
+        out[top] = self.TOP
+        out[bottom & top] = self.BOTH
+        return out
@@ -0,0 +1,180 @@
+"""
+Universe filters precomputed offline and stored as bit-packed bitsets.
+
+Screens like ``Q500US()`` or ``AverageDollarVolume(30).percentile_between(
+90, 100)`` change slowly but are otherwise recomputed by every backtest.
+`build_universe_masks` computes them once per session and packs each into a
+``session x ceil(assets / 8)`` bitset (see `backtest.store.
+write_universe_masks`). An engine given the masks recognises those filters
+by their structure wherever they appear in a pipeline and reads them
+instead. A conjunction of several stored filters is one AND of their packed
+rows, unpacked once.
+"""
+import numpy as np
+import pandas as pd
+
+from .cache import TermCache, cache_token
+from .data.builtin import USEquityPricing
+from .engine import PipelineEngine
+from .factors.basic import AverageDollarVolume
+from .filters.morningstar import Q500US, Q1500US, Q3000US
+from .fusion import walk
+from .pipeline import Pipeline
+from .term import BooleanFilter, Filter
+
+
+def _top_adv(window_length, percentile, traded=False):
+    def make():
+        mask = USEquityPricing.volume.latest > 0 if traded else None
+        adv = AverageDollarVolume(window_length=window_length, mask=mask)
+        return adv.percentile_between(percentile, 100)
+    return make
+
+
+# The screens used by the algorithms in this repository.
+DEFAULT_UNIVERSES = {
+    'Q500US': Q500US,
+    'Q1500US': Q1500US,
+    'Q3000US': Q3000US,
+    # dollarVolume.py, Filter.py
+    'adv30_top10': _top_adv(30, 90),
+    # momentumReversal-EarningsCall.py
+    'adv30_traded_top5': _top_adv(30, 95, traded=True),
+    # meanReversion.py
+    'adv1_top5': _top_adv(1, 95),
+}
+
+
+def term_key(term):
+    """Text form of `term`'s identity, stable across processes."""
+    return repr(term.identity)
+
+
+class UniverseMasks(object):
+    """
+    Bit-packed filter values for every session.
+
+    Parameters
+    ----------
+    sessions : pd.DatetimeIndex
+    sids : np.ndarray[int64]
+    bits : dict[str -> np.ndarray[uint8]]
+        ``n_sessions x ceil(n_assets / 8)`` packed values of each mask
+        (`np.packbits` bit order).
+    keys : dict[str -> str]
+        `term_key` of the filter each mask was computed from.
+    """
+
+    def __init__(self, sessions, sids, bits, keys):
+        self.sessions = pd.DatetimeIndex(sessions)
+        self.sids = np.asarray(sids)
+        self.bits = dict(bits)
+        self.keys = dict(keys)
+        self._names = dict((key, name) for name, key in self.keys.items())
+        self._rows = dict(
+            (day, i) for i, day in enumerate(self.sessions.values)
+        )
+
+    def name_of(self, term):
+        """The mask stored for `term`, or None."""
+        if not isinstance(term, Filter):
+            return None
+        return self._names.get(term_key(term))
+
+    def row(self, names, session):
+        """Values of the AND of masks `names` on `session`, per asset."""
+        i = self._rows[np.datetime64(session, 'ns')]
+        packed = self.bits[names[0]][i]
+        for name in names[1:]:
+            packed = packed & self.bits[name][i]
+        return np.unpackbits(packed, count=len(self.sids)).view(bool)
+
+    def substitutes(self, roots):
+        """
+        Map identity -> `StoredFilter` for the terms reachable from `roots`
+        that are stored, and for AND-chains with two or more stored
+        operands.
+        """
+        out = {}
+        for identity, term in walk(roots).items():
+            name = self.name_of(term)
+            if name is not None:
+                out[identity] = StoredFilter(self, (name,))
+            elif isinstance(term, BooleanFilter) and term.op == '&':
+                fused = self._fuse_and(term)
+                if fused is not None:
+                    out[identity] = fused
+        return out
+
+    def _fuse_and(self, term):
+        operands = []
+        stack = [term]
+        while stack:
+            t = stack.pop()
+            if isinstance(t, BooleanFilter) and t.op == '&' and \
+                    self.name_of(t) is None:
+                stack.extend(t.inputs)
+            else:
+                operands.append(t)
+        names = [self.name_of(t) for t in operands]
+        stored = tuple(sorted(set(n for n in names if n is not None)))
+        if len(stored) < 2:
+            return None
+        fused = StoredFilter(self, stored)
+        for t, name in zip(operands, names):
+            if name is None:
+                fused = BooleanFilter('&', fused, t)
+        return fused
+
+
+class StoredFilter(Filter):
+    """The AND of stored masks `names`, read from `masks`."""
+
+    window_length = 0
+
+    def __init__(self, masks, names):
+        self.masks = masks
+        self.names = tuple(names)
+        super(StoredFilter, self).__init__(inputs=())
+
+    def _static_params(self):
+        return (cache_token(self.masks), self.names)
+
+    def _compute(self, inputs, today, assets, mask):
+        return self.masks.row(self.names, today) & mask
+
+    def __repr__(self):
+        return 'StoredFilter(%s)' % ' & '.join(self.names)
+
+
+def build_universe_masks(daily_reader, universes=None, loaders=None):
+    """
+    Compute `universes` (name -> Filter, or a callable returning one;
+    `DEFAULT_UNIVERSES` by default) for every session of `daily_reader`.
+    Returns a `UniverseMasks`; write it with
+    `backtest.store.write_universe_masks`.
+    """
+    universes = dict(universes or DEFAULT_UNIVERSES)
+    filters = dict(
+        (name, term() if callable(term) and not isinstance(term, Filter)
+         else term)
+        for name, term in universes.items()
+    )
+    engine = PipelineEngine(daily_reader, loaders,
+                            cache=TermCache(max_bytes=0))
+    graph = engine._graph(Pipeline(filters))
+    sessions = daily_reader.sessions
+    n_assets = len(engine.sids)
+    bits = dict(
+        (name, np.zeros((len(sessions), (n_assets + 7) // 8), np.uint8))
+        for name in filters
+    )
+    for i, today in enumerate(sessions):
+        exists = engine.asset_exists(i)
+        results = {}
+        for name in filters:
+            values = engine._evaluate(graph, graph.columns[name], i, today,
+                                      exists, results)
+            bits[name][i] = np.packbits(values)
+    keys = dict((name, term_key(term)) for name, term in filters.items())
+    return UniverseMasks(sessions, engine.sids, bits, keys)
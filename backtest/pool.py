@@ -0,0 +1,137 @@
+"""
+Process pools that run backtests over one shared copy of the data, used by
+`backtest.sweep` and `backtest.shard`.
+
+Workers do not receive copies of the market data. Every worker memory-maps
+the same bar store. Bars passed in as in-memory readers, and the arrays of
+any `ArrayLoader`, `FundamentalsLoader` or `EarningsCalendarLoader`, are
+first written to a scratch store in shared memory (``/dev/shm`` where it
+exists), so all workers read one set of physical pages. Other loaders are
+pickled to each worker.
+
+A job function reads the data, script and keyword arguments from `worker`,
+which `run_jobs` fills in each process before the first job.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from .pipeline.loaders import (
+    ArrayLoader,
+    EarningsCalendarLoader,
+    FundamentalsLoader,
+)
+from .store import (
+    open_array_loader,
+    open_daily_bars,
+    open_earnings_index,
+    open_fundamentals,
+    open_minute_bars,
+    write_array_loader,
+    write_daily_bars,
+    write_earnings_index,
+    write_fundamentals,
+    write_minute_bars,
+)
+
+SHM = '/dev/shm'
+
+# Per-process state: 'daily', 'minute', 'loaders', 'script' and 'kwargs'.
+worker = {}
+
+
+def share(scratch, bars, minute_bars, loaders):
+    """Put the data in stores the workers can map; returns their locations."""
+    shared = {'daily': bars, 'minute': minute_bars, 'arrays': {},
+              'fundamentals': {}, 'earnings': {}, 'loaders': {}}
+    if not isinstance(bars, str):
+        shared['daily'] = os.path.join(scratch, 'daily')
+        write_daily_bars(shared['daily'], bars)
+    if minute_bars is not None and not isinstance(minute_bars, str):
+        shared['minute'] = os.path.join(scratch, 'minute')
+        write_minute_bars(shared['minute'], minute_bars)
+    for dataset, loader in (loaders or {}).items():
+        if isinstance(loader, ArrayLoader):
+            path = os.path.join(scratch, 'arrays', dataset.__name__)
+            write_array_loader(path, loader)
+            shared['arrays'][dataset] = path
+        elif isinstance(loader, FundamentalsLoader):
+            path = os.path.join(scratch, 'fundamentals', dataset.__name__)
+            write_fundamentals(path, loader)
+            shared['fundamentals'][dataset] = path
+        elif isinstance(loader, EarningsCalendarLoader):
+            path = os.path.join(scratch, 'earnings', dataset.__name__)
+            write_earnings_index(path, loader.index)
+            shared['earnings'][dataset] = path
+        else:
+            shared['loaders'][dataset] = loader
+    return shared
+
+
+def resolve(bars, minute_bars, loaders):
+    """Open `bars` and `minute_bars` if they are store directories."""
+    daily = open_daily_bars(bars) if isinstance(bars, str) else bars
+    if isinstance(minute_bars, str):
+        minute_bars = open_minute_bars(minute_bars, daily.calendar)
+    return {'daily': daily, 'minute': minute_bars,
+            'loaders': dict(loaders or {})}
+
+
+def init_worker(shared, script, kwargs):
+    """Pool initializer: open the stores written by `share` into `worker`."""
+    loaders = dict(shared['loaders'])
+    for dataset, path in shared['arrays'].items():
+        loaders[dataset] = open_array_loader(path, dataset)
+    resolved = resolve(shared['daily'], shared['minute'], loaders)
+    # The loaders were built for the engine's sessions, which are the bars'.
+    sessions = resolved['daily'].sessions
+    for dataset, path in shared['fundamentals'].items():
+        resolved['loaders'][dataset] = open_fundamentals(path, dataset,
+                                                         sessions)
+    for dataset, path in shared['earnings'].items():
+        index = open_earnings_index(path)
+        resolved['loaders'][dataset] = EarningsCalendarLoader(
+            sessions, index.sids, index)
+    worker.update(resolved)
+    worker.update(script=script, kwargs=kwargs)
+
+
+def run_jobs(func, jobs, script, kwargs, bars, minute_bars=None,
+             loaders=None, processes=1, ordered=True):
+    """
+    Yield ``func(job)`` for every job, on a pool of `processes` workers
+    sharing the data (in this process when `processes` is 1). With
+    ``ordered=False`` results come as they finish.
+    """
+    if processes == 1:
+        worker.update(resolve(bars, minute_bars, loaders))
+        worker.update(script=script, kwargs=kwargs)
+        try:
+            for job in jobs:
+                yield func(job)
+        finally:
+            worker.clear()
+        return
+
+    scratch = tempfile.mkdtemp(
+        prefix='backtest-pool-',
+        dir=SHM if os.path.isdir(SHM) else None,
+    )
+    try:
+        shared = share(scratch, bars, minute_bars, loaders)
+        pool = multiprocessing.Pool(
+            processes, init_worker, (shared, script, kwargs),
+        )
+        try:
+            if ordered:
+                results = pool.imap(func, jobs, chunksize=1)
+            else:
+                results = pool.imap_unordered(func, jobs)
+            for result in results:
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
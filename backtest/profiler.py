@@ -0,0 +1,188 @@
+"""
+Call counts, latencies and allocations of a backtest's hot paths.
+
+A `Profiler` passed to `TradingAlgorithm(profiler=...)` times every
+``before_trading_start`` and ``handle_data`` call, every scheduled function
+(``schedule:<name>``), every API call (``api:order_target_percent``,
+``api:pipeline_output``, ...) and every pipeline term computed
+(``term:CrossSectionalMomentum``, ``term:PercentileFilter``, ...). It can be
+switched with `enable` / `disable` at any point of a run; while it is off, or
+when no profiler is given, each hook costs one attribute check.
+
+`summary` gives a table of calls, total, mean, p50 and p99 seconds and the
+largest allocation peak per name. `folded` gives the self time of every
+stack of names in the collapsed format read by ``flamegraph.pl`` and
+speedscope.
+"""
+import functools
+import random
+import time
+import tracemalloc
+from array import array
+
+import numpy as np
+import pandas as pd
+
+SUMMARY_COLUMNS = ('calls', 'total', 'mean', 'p50', 'p99',
+                   'alloc_peak_bytes')
+
+
+def term_label(term):
+    """Profile name of a pipeline term."""
+    name = type(term).__name__
+    if getattr(term, 'windowed', False):
+        name += '[%d]' % term.window_length
+    return 'term:' + name
+
+
+class _Stat(object):
+    __slots__ = ('calls', 'total', 'samples', 'alloc_peak')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.samples = array('d')
+        self.alloc_peak = None
+
+
+class Profiler(object):
+    """
+    Parameters
+    ----------
+    enabled : bool
+        Whether to start recording immediately.
+    allocations : bool
+        Also record, per name, the largest peak of memory allocated during
+        one call (traced with `tracemalloc`, which slows the run down
+        severalfold).
+    max_samples : int
+        Latencies kept per name for percentiles; beyond that a uniform
+        sample of this size is kept.
+    """
+
+    def __init__(self, enabled=True, allocations=False, max_samples=100000):
+        self.allocations = allocations
+        self.max_samples = max_samples
+        self.enabled = False
+        self.stats = {}
+        # stack of names -> self seconds
+        self.stacks = {}
+        # [name, start, child seconds, traced memory at entry, peak so far]
+        self._frames = []
+        self._random = random.Random(0)
+        self._tracing = False
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def reset(self):
+        self.stats.clear()
+        self.stacks.clear()
+
+    def span(self, name):
+        """Context manager timing one call under `name`."""
+        return _Span(self, name)
+
+    def wrap(self, name, func):
+        """`func`, timed under `name` whenever the profiler is enabled."""
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            with _Span(self, name):
+                return func(*args, **kwargs)
+        return profiled
+
+    def _enter(self, name):
+        frames = self._frames
+        if self.allocations and tracemalloc.is_tracing():
+            # tracemalloc keeps one peak: fold it into the enclosing frame
+            # before resetting it for this one.
+            current, peak = tracemalloc.get_traced_memory()
+            if frames:
+                frames[-1][4] = max(frames[-1][4], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = None
+        frames.append([name, time.perf_counter(), 0.0, current, 0])
+
+    def _exit(self):
+        end = time.perf_counter()
+        frames = self._frames
+        stack = tuple(frame[0] for frame in frames)
+        name, start, child, base, peak = frames.pop()
+        elapsed = end - start
+        if frames:
+            frames[-1][2] += elapsed
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - child
+
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = _Stat()
+        stat.calls += 1
+        stat.total += elapsed
+        if len(stat.samples) < self.max_samples:
+            stat.samples.append(elapsed)
+        else:
+            k = self._random.randrange(stat.calls)
+            if k < self.max_samples:
+                stat.samples[k] = elapsed
+        if base is not None and tracemalloc.is_tracing():
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if frames:
+                frames[-1][4] = max(frames[-1][4], peak)
+            stat.alloc_peak = max(stat.alloc_peak or 0, peak - base)
+
+    def summary(self):
+        """One row per name, slowest total first (times in seconds)."""
+        rows = []
+        for name, stat in self.stats.items():
+            samples = np.frombuffer(stat.samples, dtype=np.float64)
+            p50, p99 = (np.percentile(samples, [50, 99]) if len(samples)
+                        else (np.nan, np.nan))
+            rows.append((name, stat.calls, stat.total,
+                         stat.total / stat.calls, p50, p99, stat.alloc_peak))
+        frame = pd.DataFrame(rows, columns=('name',) + SUMMARY_COLUMNS)
+        return frame.set_index('name').sort_values('total', ascending=False)
+
+    def folded(self):
+        """
+        Collapsed stacks, one ``outer;inner microseconds`` line per stack of
+        names, with the time spent in that frame itself.
+        """
+        return '\n'.join(
+            '%s %d' % (';'.join(n.replace(';', ',') for n in stack),
+                       round(seconds * 1e6))
+            for stack, seconds in sorted(self.stacks.items())
+        ) + '\n'
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            f.write(self.folded())
+
+
+class _Span(object):
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit()
+        return False
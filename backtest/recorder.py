@@ -0,0 +1,190 @@
+"""
+Buffers the values passed to ``record()``.
+
+Every call writes into typed columns instead of building dicts. A name gets
+a column the first time it is recorded. Per-day aggregates are updated in
+place, and at the end of each session they are folded into one row of a
+session x name matrix, which is the value reported for the day in the
+performance frame. Optionally every recorded value is also kept, with the
+bar it was recorded on, in flat arrays that grow a chunk at a time. Both
+can be written to a compact ``.npz`` file with `Recorder.flush` and read
+back with `load_records`.
+"""
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLE = ('last', 'mean', 'max')
+
+
+class Recorder(object):
+    """
+    Parameters
+    ----------
+    how : {'last', 'mean', 'max'}
+        How the values recorded during a session are reduced to the
+        session's value. A name not recorded in a session keeps its
+        previous value.
+    keep_bars : bool
+        Also keep every recorded value and when it was recorded.
+    chunk_size : int
+        Rows added to a buffer whenever it fills up.
+    """
+
+    def __init__(self, how='last', keep_bars=False, chunk_size=4096):
+        if how not in DOWNSAMPLE:
+            raise ValueError("how must be one of %s, not %r"
+                             % (', '.join(DOWNSAMPLE), how))
+        self.how = how
+        self.keep_bars = keep_bars
+        self.chunk_size = chunk_size
+        self.names = []
+        self._columns = {}
+        # Aggregates of the current session, one slot per name.
+        self._last = np.full(0, np.nan)
+        self._sum = np.zeros(0)
+        self._count = np.zeros(0, dtype=np.int64)
+        self._max = np.full(0, -np.inf)
+        # Session x name matrix of reduced values.
+        self._sessions = []
+        self._daily = np.full((0, 0), np.nan)
+        # Every recorded value, when `keep_bars`.
+        self.clock = np.datetime64('NaT', 'ns')
+        self._n_bars = 0
+        self._bar_dt = np.empty(0, dtype='datetime64[ns]')
+        self._bar_column = np.empty(0, dtype=np.int32)
+        self._bar_value = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def record(self, name, value):
+        col = self._columns.get(name)
+        if col is None:
+            col = self._add_column(name)
+        value = float(value)
+        self._last[col] = value
+        self._sum[col] += value
+        self._count[col] += 1
+        if value > self._max[col]:
+            self._max[col] = value
+        if self.keep_bars:
+            n = self._n_bars
+            if n == len(self._bar_value):
+                self._grow_bars()
+            self._bar_dt[n] = self.clock
+            self._bar_column[n] = col
+            self._bar_value[n] = value
+            self._n_bars = n + 1
+
+    def end_session(self, session):
+        """
+        Close the current session and return its reduced value for every
+        name recorded so far.
+        """
+        n_names = len(self.names)
+        row = len(self._sessions)
+        if row == len(self._daily) or n_names > self._daily.shape[1]:
+            self._grow_daily(row + 1, n_names)
+        seen = self._count[:n_names] > 0
+        if self.how == 'last':
+            values = self._last[:n_names]
+        elif self.how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = self._sum[:n_names] / self._count[:n_names]
+        else:
+            values = self._max[:n_names]
+        daily = self._daily[row, :n_names]
+        if row:
+            daily[:] = self._daily[row - 1, :n_names]
+        daily[seen] = values[seen]
+        self._sessions.append(session)
+        self._sum[:] = 0.0
+        self._count[:] = 0
+        self._max[:] = -np.inf
+        return dict(zip(self.names, daily.tolist()))
+
+    def daily_frame(self):
+        """Reduced values, one row per session and one column per name."""
+        return pd.DataFrame(
+            self._daily[:len(self._sessions), :len(self.names)],
+            index=pd.DatetimeIndex(self._sessions),
+            columns=list(self.names),
+        )
+
+    def bars_frame(self):
+        """Every recorded value: ``dt``, ``name`` and ``value`` columns."""
+        n = self._n_bars
+        return pd.DataFrame({
+            'dt': self._bar_dt[:n],
+            'name': np.asarray(self.names, dtype=object)[self._bar_column[:n]],
+            'value': self._bar_value[:n],
+        })
+
+    def flush(self, path):
+        """Write the daily values (and every recorded value) to `path`."""
+        n = self._n_bars
+        np.savez(
+            path,
+            how=np.array(self.how),
+            names=np.array(self.names, dtype=str),
+            sessions=np.array(self._sessions, dtype='datetime64[ns]'),
+            daily=self._daily[:len(self._sessions), :len(self.names)],
+            bar_dt=self._bar_dt[:n],
+            bar_column=self._bar_column[:n],
+            bar_value=self._bar_value[:n],
+        )
+
+    def __getstate__(self):
+        # Pickled (in checkpoints) without the unused rows of the buffers.
+        state = dict(self.__dict__)
+        state['_daily'] = self._daily[:len(self._sessions)]
+        n = self._n_bars
+        for name in ('_bar_dt', '_bar_column', '_bar_value'):
+            state[name] = state[name][:n]
+        return state
+
+    def _add_column(self, name):
+        col = len(self.names)
+        self.names.append(name)
+        self._columns[name] = col
+        if col == len(self._last):
+            extra = max(8, col)
+            self._last = np.r_[self._last, np.full(extra, np.nan)]
+            self._sum = np.r_[self._sum, np.zeros(extra)]
+            self._count = np.r_[self._count, np.zeros(extra, np.int64)]
+            self._max = np.r_[self._max, np.full(extra, -np.inf)]
+        return col
+
+    def _grow_daily(self, rows, cols):
+        old = self._daily
+        rows = max(rows, len(old) + (self.chunk_size if rows > len(old)
+                                     else 0))
+        daily = np.full((rows, max(cols, old.shape[1])), np.nan)
+        daily[:old.shape[0], :old.shape[1]] = old
+        self._daily = daily
+
+    def _grow_bars(self):
+        extra = self.chunk_size
+        self._bar_dt = np.r_[self._bar_dt,
+                             np.empty(extra, dtype='datetime64[ns]')]
+        self._bar_column = np.r_[self._bar_column,
+                                 np.empty(extra, dtype=np.int32)]
+        self._bar_value = np.r_[self._bar_value, np.empty(extra)]
+
+
+def load_records(path):
+    """
+    Read a file written by `Recorder.flush`. Returns the daily frame and
+    the frame of every recorded value (empty unless bars were kept).
+    """
+    with np.load(path, allow_pickle=False) as npz:
+        names = [str(n) for n in npz['names']]
+        daily = pd.DataFrame(npz['daily'],
+                             index=pd.DatetimeIndex(npz['sessions']),
+                             columns=names)
+        bars = pd.DataFrame({
+            'dt': npz['bar_dt'],
+            'name': np.asarray(names, dtype=object)[npz['bar_column']],
+            'value': npz['bar_value'],
+        })
+    return daily, bars
@@ -0,0 +1,234 @@
+"""
+``schedule_function`` rules.
+
+Date rules select sessions; time rules select the minute bar inside a
+session, as an offset from the first bar (09:31). Once registration is over
+the rules are compiled into a `TriggerCalendar` listing every firing of
+every function, so the simulation never evaluates a rule per session or per
+minute.
+"""
+import datetime
+
+import numpy as np
+
+from .calendar import MARKET_OPEN
+
+
+class DateRule(object):
+
+    def session_mask(self, calendar):
+        """Boolean array: does the rule fire on each session of `calendar`."""
+        raise NotImplementedError(type(self).__name__ + '.session_mask')
+
+
+class EveryDay(DateRule):
+
+    def session_mask(self, calendar):
+        return np.ones(len(calendar), dtype=bool)
+
+
+class NthTradingDayOfWeek(DateRule):
+
+    def __init__(self, n, from_end=False):
+        self.n = n
+        self.from_end = from_end
+
+    def session_mask(self, calendar):
+        return calendar.position_in_week(self.from_end) == self.n
+
+
+class NthTradingDayOfMonth(DateRule):
+
+    def __init__(self, n, from_end=False):
+        self.n = n
+        self.from_end = from_end
+
+    def session_mask(self, calendar):
+        return calendar.position_in_month(self.from_end) == self.n
+
+
+class date_rules(object):
+
+    @staticmethod
+    def every_day():
+        return EveryDay()
+
+    @staticmethod
+    def week_start(days_offset=0):
+        return NthTradingDayOfWeek(days_offset)
+
+    @staticmethod
+    def week_end(days_offset=0):
+        return NthTradingDayOfWeek(days_offset, from_end=True)
+
+    @staticmethod
+    def month_start(days_offset=0):
+        return NthTradingDayOfMonth(days_offset)
+
+    @staticmethod
+    def month_end(days_offset=0):
+        return NthTradingDayOfMonth(days_offset, from_end=True)
+
+
+class TimeRule(object):
+
+    def bar_index(self, n_minutes):
+        """
+        Index of the minute bar this rule fires on in an `n_minutes` session
+        (or array of such indices, for an array of session lengths).
+        """
+        raise NotImplementedError(type(self).__name__ + '.bar_index')
+
+
+class AfterOpen(TimeRule):
+
+    def __init__(self, offset):
+        self.minutes = _whole_minutes(offset)
+
+    def bar_index(self, n_minutes):
+        return np.minimum(self.minutes, n_minutes) - 1
+
+
+class BeforeClose(TimeRule):
+
+    def __init__(self, offset):
+        self.minutes = _whole_minutes(offset)
+
+    def bar_index(self, n_minutes):
+        return np.maximum(n_minutes - 1 - self.minutes, 0)
+
+
+def _whole_minutes(offset):
+    # An offset of zero means "the first (or last full) bar".
+    return max(int(offset.total_seconds() // 60), 1)
+
+
+def _build_offset(offset, hours, minutes):
+    if offset is not None:
+        return offset
+    return datetime.timedelta(hours=hours or 0, minutes=minutes or 0)
+
+
+class time_rules(object):
+
+    @staticmethod
+    def market_open(offset=None, hours=None, minutes=None):
+        return AfterOpen(_build_offset(offset, hours, minutes))
+
+    @staticmethod
+    def market_close(offset=None, hours=None, minutes=None):
+        return BeforeClose(_build_offset(offset, hours, minutes))
+
+
+class Event(object):
+
+    __slots__ = ('func', 'date_rule', 'time_rule', 'half_days', 'sessions')
+
+    def __init__(self, func, date_rule, time_rule, half_days, sessions):
+        self.func = func
+        self.date_rule = date_rule
+        self.time_rule = time_rule
+        self.half_days = half_days
+        # Boolean mask over the calendar's sessions.
+        self.sessions = sessions
+
+
+class TriggerCalendar(object):
+    """
+    Every firing of a list of events, sorted by minute and then by
+    registration order.
+
+    Attributes
+    ----------
+    minutes : np.ndarray[datetime64[ns]]
+        Label of the minute bar of each trigger.
+    sessions, bars : np.ndarray[int64]
+        Session index of each trigger, and its bar index in the session.
+    events : np.ndarray[int64]
+        Position of each trigger's event in the registration order.
+    offsets : np.ndarray[int64]
+        Triggers of session i are ``offsets[i]:offsets[i + 1]``.
+    """
+
+    def __init__(self, funcs, sessions, bars, events, calendar):
+        order = np.lexsort((events, bars, sessions))
+        self.funcs = list(funcs)
+        self.sessions = sessions[order]
+        self.bars = bars[order]
+        self.events = events[order]
+        self.minutes = (calendar.sessions.values[self.sessions] +
+                        MARKET_OPEN.to_timedelta64() +
+                        self.bars.astype('timedelta64[m]'))
+        self.offsets = np.searchsorted(self.sessions,
+                                       np.arange(len(calendar) + 1))
+
+    @classmethod
+    def compile(cls, events, calendar):
+        lengths = calendar.session_lengths()
+        sessions, bars, ids = [], [], []
+        for k, event in enumerate(events):
+            days = np.flatnonzero(event.sessions)
+            sessions.append(days)
+            bars.append(np.asarray(event.time_rule.bar_index(lengths[days]),
+                                   dtype=np.int64))
+            ids.append(np.full(len(days), k, dtype=np.int64))
+        empty = [np.zeros(0, dtype=np.int64)]
+        return cls(
+            [e.func for e in events],
+            np.concatenate(sessions + empty),
+            np.concatenate(bars + empty),
+            np.concatenate(ids + empty),
+            calendar,
+        )
+
+    def __len__(self):
+        return len(self.events)
+
+    def for_session(self, i):
+        """``(bar_index, func)`` pairs due in session `i`, in firing order."""
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        funcs = self.funcs
+        return [(int(bar), funcs[k])
+                for bar, k in zip(self.bars[lo:hi], self.events[lo:hi])]
+
+    def minute_rows(self, reader):
+        """
+        Row of `reader` (a `MinuteBarReader`) each trigger fires on: the
+        first bar at or after its minute. A trigger with no such bar in its
+        session gets the session's stop row, so it never fires.
+        """
+        rows = reader.minutes.values.searchsorted(self.minutes)
+        stops = reader.session_stops[self.sessions]
+        return np.minimum(rows, stops).astype(np.int64)
+
+
+class EventManager(object):
+    """Registered scheduled functions, in registration order."""
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self.events = []
+        self._triggers = None
+
+    def add(self, func, date_rule=None, time_rule=None, half_days=True):
+        date_rule = date_rule or EveryDay()
+        time_rule = time_rule or AfterOpen(datetime.timedelta(minutes=1))
+        sessions = date_rule.session_mask(self.calendar)
+        if not half_days:
+            sessions = sessions & ~self.calendar.is_early_close
+        self.events.append(
+            Event(func, date_rule, time_rule, half_days, sessions)
+        )
+        self._triggers = None
+
+    @property
+    def triggers(self):
+        """The `TriggerCalendar` of the events registered so far."""
+        if self._triggers is None:
+            self._triggers = TriggerCalendar.compile(self.events,
+                                                     self.calendar)
+        return self._triggers
+
+    def events_for_session(self, i):
+        """``(bar_index, func)`` pairs due in session `i`, in firing order."""
+        return self.triggers.for_session(i)
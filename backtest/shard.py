@@ -0,0 +1,239 @@
+"""
+Split one long backtest into date shards run on a process pool::
+
+    python -m backtest.shard cross-sectionalMomentum.py --bars daily/ \\
+        --start 2006-01-03 --end 2016-12-30 --shards 4 --check
+
+Pipeline windows always read their full history from the bar store, so a
+shard needs no data warm-up. What it lacks is the state a serial run would
+have built up: positions, and whatever the algorithm keeps on ``context``.
+Every shard after the first therefore starts trading `warmup` sessions
+before its own first session, and only its rows from that session on are
+kept. The shards' daily returns are then chained into one performance frame.
+Dollar columns are rescaled to the chained portfolio value, statistics of
+the returns so far (cumulative returns, rolling Sharpe ratio and beta,
+drawdown) are recomputed over the chained returns, and leverage, exposure,
+turnover, counts and recorded values are taken as the shard reports them.
+
+Sharding is an approximation. Only the first shard is exact. A later shard
+matches a serial run only as far as the algorithm's book is determined by
+the last `warmup` sessions of data, which roughly holds for target-weight
+rebalancers. Even then share rounding and minimum commissions at a
+different account size make it drift, and anything the algorithm
+accumulates over longer than the warm-up is lost. On synthetic benchmark
+bars, three shards with a 60-session warm-up have ended as much as 4.7%
+away from the serial run. `verify_sharded` measures the gap for a given
+script and warm-up; check it before relying on sharded results.
+"""
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .algorithm import TradingAlgorithm
+from .analytics import rolling_metrics
+from .compat import install_quantopian_aliases
+from .pool import resolve, run_jobs, worker
+from .store import open_daily_bars, open_loaders
+from .sweep import summarize
+
+log = logging.getLogger(__name__)
+
+DOLLAR_COLUMNS = ('cash', 'positions_value')
+
+
+def shard_bounds(first, last, shards, warmup):
+    """
+    ``(warm_start, start, end)`` session indices of each shard of sessions
+    ``first`` through ``last``.
+    """
+    shards = max(1, min(shards, last - first + 1))
+    bounds = []
+    for chunk in np.array_split(np.arange(first, last + 1), shards):
+        start, end = int(chunk[0]), int(chunk[-1])
+        warm = start if start == first else max(first, start - warmup)
+        bounds.append((warm, start, end))
+    return bounds
+
+
+def stitch(perfs, capital_base, analytics_window=126):
+    """
+    Chain the daily returns of consecutive shard frames into one frame
+    starting from `capital_base`.
+    """
+    perf = pd.concat(perfs)
+    if not len(perf):
+        return perf
+    shard_value = perf['portfolio_value'].values
+    value = capital_base * np.cumprod(1.0 + perf['returns'].values)
+    scale = value / shard_value
+    for name in DOLLAR_COLUMNS:
+        perf[name] = perf[name].values * scale
+    perf['portfolio_value'] = value
+    perf['pnl'] = np.diff(np.r_[capital_base, value])
+    if 'sharpe' in perf:
+        benchmark = (perf['benchmark_returns'].values
+                     if 'benchmark_returns' in perf else None)
+        metrics = rolling_metrics(perf['returns'].values, benchmark,
+                                  window=analytics_window)
+        for name, values in metrics.items():
+            perf[name] = values
+    return perf
+
+
+def run_sharded(script, bars, shards=None, warmup=252, processes=None,
+                minute_bars=None, loaders=None, start=None, end=None,
+                capital_base=1e6, **kwargs):
+    """
+    Backtest `script` from `start` to `end` as `shards` date shards (one per
+    core by default) and return the stitched daily performance frame.
+
+    Parameters
+    ----------
+    script : str
+        Algorithm source code or a path to a ``.py`` file.
+    bars : str or DailyBarReader
+        A daily bar store directory, or bars to share with the workers.
+    shards : int, optional
+    warmup : int
+        Sessions each shard after the first trades before its first
+        session, to rebuild the portfolio and ``context`` state.
+    processes : int, optional
+        Pool size; defaults to one per shard. With 1 the shards run in this
+        process.
+    minute_bars, loaders
+        As for `backtest.sweep.run_sweep`.
+    **kwargs
+        Passed to every `TradingAlgorithm`.
+    """
+    if '\n' not in script and script.endswith('.py'):
+        kwargs.setdefault('algo_filename', script)
+        with open(script) as f:
+            script = f.read()
+    shards = shards or os.cpu_count() or 1
+    kwargs['capital_base'] = capital_base
+    window = kwargs.get('analytics_window', 126)
+    calendar = resolve(bars, minute_bars, loaders)['daily'].calendar
+    first = calendar.session_index(start) if start is not None else 0
+    last = (calendar.session_index(end, 'right') - 1 if end is not None
+            else len(calendar.sessions) - 1)
+    jobs = list(enumerate(shard_bounds(first, last, shards, warmup)))
+    processes = min(processes or len(jobs), len(jobs))
+    perfs = list(run_jobs(_run_shard, jobs, script, kwargs, bars,
+                          minute_bars, loaders, processes))
+    return stitch(perfs, capital_base, window)
+
+
+def _run_shard(job):
+    index, (warm, start, end) = job
+    install_quantopian_aliases()
+    kwargs = dict(worker['kwargs'])
+    if worker['minute'] is not None:
+        kwargs.setdefault('minute_reader', worker['minute'])
+    daily = worker['daily']
+    sessions = daily.calendar.sessions
+    started = time.time()
+    algo = TradingAlgorithm(
+        daily, script=worker['script'], loaders=worker['loaders'],
+        start=sessions[warm], end=sessions[end], **kwargs
+    )
+    perf = algo.run()
+    log.info("Shard %d (%s to %s, %d warm-up sessions) took %.1fs", index,
+             sessions[start].date(), sessions[end].date(), start - warm,
+             time.time() - started)
+    return perf.loc[sessions[start]:]
+
+
+def verify_sharded(script, bars, shards=None, warmup=252, rtol=1e-3,
+                   **kwargs):
+    """
+    Run `script` both sharded and serially and compare them. Returns a dict
+    with the largest daily returns difference, the relative difference of
+    the ending values and both summaries, or raises AssertionError if the
+    ending values differ by more than `rtol` (0.1% by default).
+    """
+    sharded = run_sharded(script, bars, shards=shards, warmup=warmup,
+                          **kwargs)
+    kwargs.pop('processes', None)
+    serial = run_sharded(script, bars, shards=1, processes=1, **kwargs)
+    if not sharded.index.equals(serial.index):
+        raise AssertionError("Sharded and serial runs cover different "
+                             "sessions.")
+    capital_base = kwargs.get('capital_base', 1e6)
+    report = {
+        'sessions': len(serial),
+        'max_returns_diff': float(np.abs(
+            sharded['returns'].values - serial['returns'].values
+        ).max()) if len(serial) else 0.0,
+        'ending_value_rdiff': float(
+            sharded['portfolio_value'].values[-1] /
+            serial['portfolio_value'].values[-1] - 1.0
+        ) if len(serial) else 0.0,
+        'sharded': summarize(sharded, capital_base),
+        'serial': summarize(serial, capital_base),
+    }
+    if abs(report['ending_value_rdiff']) > rtol:
+        raise AssertionError(
+            "Sharded ending value differs from the serial run by %.3g "
+            "(rtol %g)." % (report['ending_value_rdiff'], rtol)
+        )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest.shard')
+    parser.add_argument('algofile')
+    parser.add_argument('--bars', required=True,
+                        help='daily bar store directory')
+    parser.add_argument('--minute-bars', help='minute bar store directory')
+    parser.add_argument('--shards', type=int)
+    parser.add_argument('--warmup', type=int, default=252,
+                        help='sessions traded before each later shard')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--earnings',
+                        help='earnings calendar store directory written by '
+                             'backtest.store.write_earnings_index')
+    parser.add_argument('--fundamentals', action='append', default=[],
+                        help='fundamentals store directory written by '
+                             'backtest.store.write_fundamentals (repeat for '
+                             'each dataset)')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--capital-base', type=float, default=1e6)
+    parser.add_argument('--output', help='write daily performance to CSV')
+    parser.add_argument('--check', action='store_true',
+                        help='also run serially and fail if the ending '
+                             'values differ by more than --rtol')
+    parser.add_argument('--rtol', type=float, default=1e-3,
+                        help='relative tolerance of --check on the ending '
+                             'value (default: %(default)g, i.e. 0.1%%)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    kwargs = dict(minute_bars=args.minute_bars, start=args.start,
+                  end=args.end, capital_base=args.capital_base)
+    if args.minute_bars:
+        kwargs['data_frequency'] = 'minute'
+    if args.earnings or args.fundamentals:
+        kwargs['loaders'] = open_loaders(open_daily_bars(args.bars),
+                                         args.earnings, args.fundamentals)
+    if args.check:
+        report = verify_sharded(args.algofile, args.bars, shards=args.shards,
+                                warmup=args.warmup, processes=args.processes,
+                                rtol=args.rtol, **kwargs)
+        for name, value in sorted(report.items()):
+            print('%s: %s' % (name, value))
+        return
+    perf = run_sharded(args.algofile, args.bars, shards=args.shards,
+                       warmup=args.warmup, processes=args.processes, **kwargs)
+    if args.output:
+        perf.to_csv(args.output)
+    else:
+        print(perf.tail())
+
+
+if __name__ == '__main__':
+    main()
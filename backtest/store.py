@@ -0,0 +1,336 @@
+"""
+Memory-mapped columnar storage for bars.
+
+A store is a directory holding one contiguous ``.npy`` array per field laid
+out date x asset (C order, so a window of sessions is one contiguous
+block), plus the sid index and trading calendar::
+
+    daily/
+        meta.json
+        sessions.npy  early_closes.npy  sids.npy  symbols.npy
+        first_traded.npy  last_traded.npy
+        open.npy  high.npy  low.npy  close.npy  volume.npy  price.npy
+
+The columns of an `ArrayLoader` (fundamentals aligned with the daily bars)
+are stored the same way, one ``<column>.npy`` per column, and so is an
+`EarningsCalendarIndex` (``sids``, ``offsets``, ``days`` and ``known``).
+A `FundamentalsLoader` keeps only change events, as ``<column>.offsets``,
+``<column>.days`` and ``<column>.values`` per column. `UniverseMasks` are
+one bit-packed ``<name>.npy`` per mask, next to ``sessions`` and ``sids``.
+
+Field arrays are opened with ``mmap_mode='r'``: opening a store reads only
+the index arrays, window reads are views into the mapping, and concurrent
+backtests reading the same store share the OS page cache.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .assets import Equity
+from .data import OHLCV_FIELDS, DailyBarReader, MinuteBarReader
+from .pipeline.data import DataSet, EarningsCalendar, morningstar
+from .pipeline.loaders import (
+    ArrayLoader,
+    EarningsCalendarIndex,
+    EarningsCalendarLoader,
+    FundamentalsIndex,
+    FundamentalsLoader,
+)
+from .pipeline.universe import UniverseMasks
+
+FORMAT_VERSION = 1
+_FIELDS = OHLCV_FIELDS + ('price',)
+
+
+def _create_fields(path, shape):
+    return dict(
+        (field, np.lib.format.open_memmap(
+            os.path.join(path, field + '.npy'), mode='w+',
+            dtype=np.float64, shape=shape))
+        for field in _FIELDS
+    )
+
+
+def _write_fields(path, reader, n_rows, n_assets, chunk_rows):
+    for field, out in _create_fields(path, (n_rows, n_assets)).items():
+        source = reader.field(field)
+        for start in range(0, n_rows, chunk_rows):
+            out[start:start + chunk_rows] = source[start:start + chunk_rows]
+        out.flush()
+        del out
+
+
+def _write_meta(path, kind, shape, fields=_FIELDS, dtype='float64',
+                **extra):
+    meta = {
+        'version': FORMAT_VERSION,
+        'kind': kind,
+        'fields': list(fields),
+        'shape': list(shape),
+        'dtype': dtype,
+    }
+    meta.update(extra)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def _read_meta(path, kind):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION or meta.get('kind') != kind:
+        raise ValueError(
+            "%s is not a version %d %s bar store" % (path, FORMAT_VERSION,
+                                                      kind)
+        )
+    return meta
+
+
+def _load(path, name, mmap=False):
+    return np.load(os.path.join(path, name + '.npy'),
+                   mmap_mode='r' if mmap else None, allow_pickle=False)
+
+
+def _write_daily_index(path, sessions, sids, symbols, first_traded,
+                       last_traded, early_closes):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'sessions.npy'),
+            pd.DatetimeIndex(sessions).values.astype('datetime64[ns]'))
+    np.save(os.path.join(path, 'early_closes.npy'),
+            pd.DatetimeIndex(early_closes).values.astype('datetime64[ns]'))
+    np.save(os.path.join(path, 'sids.npy'), np.asarray(sids, dtype=np.int64))
+    np.save(os.path.join(path, 'symbols.npy'), np.array(symbols, dtype=str))
+    np.save(os.path.join(path, 'first_traded.npy'), first_traded)
+    np.save(os.path.join(path, 'last_traded.npy'), last_traded)
+    _write_meta(path, 'daily', (len(sessions), len(sids)))
+
+
+def write_daily_bars(path, reader, chunk_rows=4096):
+    """Write a `DailyBarReader` to a store directory at `path`."""
+    finder = reader.asset_finder
+    _write_daily_index(path, reader.sessions, finder.sids,
+                       [e.symbol for e in finder.equities],
+                       reader.first_traded, reader.last_traded,
+                       reader.calendar.early_closes)
+    _write_fields(path, reader, len(reader.sessions), len(finder),
+                  chunk_rows)
+
+
+def create_daily_bars(path, sessions, sids, symbols, first_traded,
+                      last_traded, early_closes=()):
+    """
+    Lay out a daily store at `path` for bars too large to hold in memory.
+    `first_traded` and `last_traded` are each asset's first and last
+    session index. Returns a writable memory map of shape ``(sessions,
+    assets)`` for each OHLCV field and ``price`` (the close carried
+    forward over missing bars); fill and flush them, then open the store
+    with `open_daily_bars`.
+    """
+    _write_daily_index(path, sessions, sids, symbols, first_traded,
+                       last_traded, early_closes)
+    return _create_fields(path, (len(sessions), len(sids)))
+
+
+def open_daily_bars(path):
+    """Open a daily store as a `DailyBarReader` backed by memory maps."""
+    meta = _read_meta(path, 'daily')
+    symbols = _load(path, 'symbols')
+    equities = [Equity(sid, str(symbol))
+                for sid, symbol in zip(_load(path, 'sids'), symbols)]
+    arrays = {f: _load(path, f, mmap=True) for f in _FIELDS}
+    reader = DailyBarReader(
+        pd.DatetimeIndex(_load(path, 'sessions')),
+        equities,
+        arrays,
+        pd.DatetimeIndex(_load(path, 'early_closes')),
+        derived={
+            'price': arrays['price'],
+            'first_traded': _load(path, 'first_traded'),
+            'last_traded': _load(path, 'last_traded'),
+        },
+    )
+    if list(reader.shape) != meta['shape']:
+        raise ValueError("Corrupt bar store at %s" % path)
+    return reader
+
+
+def write_minute_bars(path, reader, chunk_rows=65536):
+    """Write a `MinuteBarReader` to a store directory at `path`."""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'minutes.npy'),
+            reader.minutes.values.astype('datetime64[ns]'))
+    np.save(os.path.join(path, 'session_starts.npy'), reader.session_starts)
+    np.save(os.path.join(path, 'session_stops.npy'), reader.session_stops)
+    shape = reader.field('close').shape
+    _write_fields(path, reader, shape[0], shape[1], chunk_rows)
+    _write_meta(path, 'minute', shape)
+
+
+def open_minute_bars(path, calendar):
+    """
+    Open a minute store as a `MinuteBarReader` backed by memory maps.
+    `calendar` must be the calendar of the daily bars it was written with.
+    """
+    _read_meta(path, 'minute')
+    arrays = {f: _load(path, f, mmap=True) for f in _FIELDS}
+    return MinuteBarReader(
+        pd.DatetimeIndex(_load(path, 'minutes')),
+        arrays,
+        calendar,
+        derived={
+            'price': arrays['price'],
+            'session_starts': _load(path, 'session_starts'),
+            'session_stops': _load(path, 'session_stops'),
+        },
+    )
+
+
+def write_array_loader(path, loader):
+    """Write the columns of an `ArrayLoader` to a store directory at `path`."""
+    os.makedirs(path, exist_ok=True)
+    names = []
+    shape = None
+    for column, values in loader.arrays.items():
+        np.save(os.path.join(path, column.name + '.npy'), values)
+        names.append(column.name)
+        shape = values.shape
+    _write_meta(path, 'arrays', shape or (0, 0), fields=names, dtype=None)
+
+
+def open_array_loader(path, dataset):
+    """
+    Open a store written by `write_array_loader` as an `ArrayLoader` for
+    the columns of `dataset`, backed by memory maps.
+    """
+    meta = _read_meta(path, 'arrays')
+    return ArrayLoader({
+        getattr(dataset, name): _load(path, name, mmap=True)
+        for name in meta['fields']
+    })
+
+
+_EARNINGS_ARRAYS = ('sids', 'offsets', 'days', 'known')
+
+
+def write_earnings_index(path, index):
+    """Write an `EarningsCalendarIndex` to a store directory at `path`."""
+    os.makedirs(path, exist_ok=True)
+    for name in _EARNINGS_ARRAYS:
+        np.save(os.path.join(path, name + '.npy'), getattr(index, name))
+    _write_meta(path, 'earnings', index.days.shape,
+                fields=_EARNINGS_ARRAYS, dtype=None)
+
+
+def open_earnings_index(path):
+    """Open a store written by `write_earnings_index`."""
+    _read_meta(path, 'earnings')
+    return EarningsCalendarIndex(*[_load(path, name)
+                                   for name in _EARNINGS_ARRAYS])
+
+
+_FUNDAMENTALS_ARRAYS = ('offsets', 'days', 'values')
+
+
+def write_fundamentals(path, loader):
+    """
+    Write the columns of a `FundamentalsLoader` to a store directory at
+    `path`. Only change events are stored; days are kept as int32 day
+    numbers.
+    """
+    os.makedirs(path, exist_ok=True)
+    names = []
+    datasets = set()
+    for column, index in loader.indexes.items():
+        np.save(os.path.join(path, column.name + '.offsets.npy'),
+                index.offsets)
+        np.save(os.path.join(path, column.name + '.days.npy'),
+                index.days.astype(np.int32))
+        np.save(os.path.join(path, column.name + '.values.npy'),
+                index.values)
+        names.append(column.name)
+        datasets.add(column.dataset.__name__)
+    extra = {}
+    if len(datasets) == 1:
+        extra['dataset'] = datasets.pop()
+    _write_meta(path, 'fundamentals', (len(names),), fields=names,
+                dtype=None, **extra)
+
+
+def open_fundamentals(path, dataset, sessions):
+    """
+    Open a store written by `write_fundamentals` as a `FundamentalsLoader`
+    for the columns of `dataset`, with the values memory-mapped.
+    """
+    meta = _read_meta(path, 'fundamentals')
+    indexes = {}
+    for name in meta['fields']:
+        indexes[getattr(dataset, name)] = FundamentalsIndex(
+            _load(path, name + '.offsets'),
+            _load(path, name + '.days'),
+            _load(path, name + '.values', mmap=True),
+        )
+    return FundamentalsLoader(sessions, indexes)
+
+
+def fundamentals_dataset(path):
+    """
+    The `morningstar` dataset a `write_fundamentals` store holds: the one
+    recorded in the store, or else the one named like its directory.
+    """
+    meta = _read_meta(path, 'fundamentals')
+    name = meta.get('dataset') or os.path.basename(os.path.normpath(path))
+    dataset = getattr(morningstar, name, None)
+    if not (isinstance(dataset, type) and issubclass(dataset, DataSet)):
+        raise ValueError("%s holds fundamentals for %r, which is not a "
+                         "morningstar dataset." % (path, name))
+    return dataset
+
+
+def open_loaders(daily, earnings=None, fundamentals=()):
+    """
+    Pipeline loaders for `run_algorithm(..., loaders=...)` over the bars of
+    `daily`: an `EarningsCalendarLoader` from an `earnings` store written
+    by `write_earnings_index`, and a `FundamentalsLoader` per store in
+    `fundamentals` written by `write_fundamentals` (see
+    `fundamentals_dataset`).
+    """
+    loaders = {}
+    if earnings is not None:
+        loaders[EarningsCalendar] = EarningsCalendarLoader(
+            daily.sessions, daily.asset_finder.sids,
+            open_earnings_index(earnings))
+    for path in fundamentals:
+        dataset = fundamentals_dataset(path)
+        loaders[dataset] = open_fundamentals(path, dataset, daily.sessions)
+    return loaders
+
+
+def write_universe_masks(path, masks):
+    """Write `UniverseMasks` to a store directory at `path`."""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'sessions.npy'), masks.sessions.values)
+    np.save(os.path.join(path, 'sids.npy'), masks.sids)
+    for name, bits in masks.bits.items():
+        np.save(os.path.join(path, name + '.npy'), bits)
+    _write_meta(path, 'universes', (len(masks.sessions), len(masks.sids)),
+                fields=list(masks.bits), dtype='uint8')
+    with open(os.path.join(path, 'keys.json'), 'w') as f:
+        json.dump(masks.keys, f, indent=2)
+
+
+def open_universe_masks(path):
+    """
+    Open a store written by `write_universe_masks`, with the bitsets
+    memory-mapped so concurrent backtests share one copy.
+    """
+    meta = _read_meta(path, 'universes')
+    with open(os.path.join(path, 'keys.json')) as f:
+        keys = json.load(f)
+    return UniverseMasks(
+        _load(path, 'sessions'),
+        _load(path, 'sids'),
+        dict((name, _load(path, name, mmap=True))
+             for name in meta['fields']),
+        keys,
+    )
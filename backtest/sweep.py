@@ -0,0 +1,214 @@
+"""
+Run one algorithm over a grid of parameter values on a process pool::
+
+    python -m backtest.sweep cross-sectionalMomentum.py --bars daily/ \\
+        --param MIN_PRICE=5,10 --param LONG_PERCENTILE=90,95 \\
+        --output sweep.csv
+
+Parameters are the algorithm's module-level constants or ``context``
+attributes (see `TradingAlgorithm`'s `params`).
+
+Workers do not receive copies of the market data; they memory-map one
+shared copy (see `backtest.pool`).
+"""
+import argparse
+import ast
+import csv
+import itertools
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .algorithm import TradingAlgorithm
+from .analytics import tear_sheet
+from .compat import install_quantopian_aliases
+from .pool import run_jobs, worker
+from .store import open_daily_bars, open_loaders
+
+log = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ('days', 'ending_value', 'total_returns', 'annual_return',
+                  'annual_volatility', 'sharpe', 'sortino', 'max_drawdown',
+                  'calmar', 'beta', 'alpha', 'max_leverage', 'turnover',
+                  'transactions', 'seconds', 'error')
+
+
+def expand_grid(grid):
+    """Every combination of `grid` (name -> list of values), as dicts."""
+    names = sorted(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[n] for n in names])]
+
+
+def summarize(perf, capital_base):
+    """
+    Headline statistics of a daily performance frame (a finished run's
+    ``algo.analytics.summary()`` gives the same without the frame).
+    """
+    if not len(perf):
+        return {'days': 0}
+    value = perf['portfolio_value'].values
+    benchmark = (perf['benchmark_returns'].values
+                 if 'benchmark_returns' in perf else None)
+    stats = tear_sheet(perf['returns'].values, benchmark).iloc[0].to_dict()
+    stats.update(
+        days=len(perf),
+        ending_value=value[-1],
+        total_returns=value[-1] / capital_base - 1.0,
+        max_leverage=perf['gross_leverage'].max(),
+        turnover=(perf['turnover'].mean() if 'turnover' in perf
+                  else np.nan),
+    )
+    return stats
+
+
+def run_sweep(script, bars, grid, processes=None, minute_bars=None,
+              loaders=None, output=None, **kwargs):
+    """
+    Backtest `script` once per combination in `grid` and return one summary
+    row per run, in grid order.
+
+    Parameters
+    ----------
+    script : str
+        Algorithm source code or a path to a ``.py`` file.
+    bars : str or DailyBarReader
+        A daily bar store directory, or bars to share with the workers.
+    grid : dict[str -> list] or list[dict]
+        Parameter values to sweep, or the explicit list of configurations.
+    processes : int, optional
+        Pool size; defaults to every core. With 1 the runs happen in this
+        process.
+    minute_bars : str or MinuteBarReader, optional
+        Minute bars, for ``data_frequency='minute'``.
+    loaders : dict[DataSet -> PipelineLoader], optional
+    output : str, optional
+        CSV file that rows are appended to as runs finish.
+    **kwargs
+        Passed to every `TradingAlgorithm` (start, end, capital_base, ...).
+
+    Runs that raise are reported with an ``error`` and no statistics.
+    """
+    if '\n' not in script and script.endswith('.py'):
+        kwargs.setdefault('algo_filename', script)
+        with open(script) as f:
+            script = f.read()
+    configs = expand_grid(grid) if isinstance(grid, dict) else list(grid)
+    processes = min(processes or os.cpu_count() or 1, len(configs)) or 1
+
+    names = sorted(set(k for config in configs for k in config))
+    writer = _SummaryWriter(['run'] + names + list(SUMMARY_FIELDS), output)
+    rows = run_jobs(_run_one, enumerate(configs), script, kwargs, bars,
+                    minute_bars, loaders, processes, ordered=False)
+    for row in rows:
+        writer.add(row)
+    return writer.frame()
+
+
+class _SummaryWriter(object):
+    """Collects summary rows column by column, optionally streaming to CSV."""
+
+    def __init__(self, fields, path=None):
+        self.columns = dict((name, []) for name in fields)
+        self._path = path
+        if path is not None:
+            with open(path, 'w', newline='') as f:
+                csv.writer(f).writerow(fields)
+
+    def add(self, row):
+        values = [row.get(name) for name in self.columns]
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+        if self._path is not None:
+            with open(self._path, 'a', newline='') as f:
+                csv.writer(f).writerow(values)
+
+    def frame(self):
+        return pd.DataFrame(self.columns).set_index('run').sort_index()
+
+
+def _run_one(job):
+    index, params = job
+    install_quantopian_aliases()
+    kwargs = dict(worker['kwargs'])
+    if worker['minute'] is not None:
+        kwargs.setdefault('minute_reader', worker['minute'])
+    row = {'run': index}
+    row.update(params)
+    started = time.time()
+    try:
+        algo = TradingAlgorithm(
+            worker['daily'], script=worker['script'],
+            loaders=worker['loaders'], params=params, **kwargs
+        )
+        algo.run()
+    except Exception as e:
+        log.warning("Run %d (%r) failed: %s", index, params, e)
+        row['error'] = '%s: %s' % (type(e).__name__, e)
+    else:
+        row.update(algo.analytics.summary())
+        row['transactions'] = len(algo.transactions)
+    row['seconds'] = time.time() - started
+    return row
+
+
+def _parse_param(text):
+    name, _, values = text.partition('=')
+    if not name or not values:
+        raise argparse.ArgumentTypeError(
+            "expected NAME=VALUE[,VALUE...], got %r" % (text,)
+        )
+    parsed = []
+    for value in values.split(','):
+        try:
+            parsed.append(ast.literal_eval(value))
+        except (SyntaxError, ValueError):
+            parsed.append(value)
+    return name, parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest.sweep')
+    parser.add_argument('algofile')
+    parser.add_argument('--bars', required=True,
+                        help='daily bar store directory')
+    parser.add_argument('--minute-bars', help='minute bar store directory')
+    parser.add_argument('--param', action='append', type=_parse_param,
+                        default=[], help='NAME=VALUE[,VALUE...]')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--earnings',
+                        help='earnings calendar store directory written by '
+                             'backtest.store.write_earnings_index')
+    parser.add_argument('--fundamentals', action='append', default=[],
+                        help='fundamentals store directory written by '
+                             'backtest.store.write_fundamentals (repeat for '
+                             'each dataset)')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--capital-base', type=float, default=1e6)
+    parser.add_argument('--output', help='stream the summary to CSV')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    kwargs = {}
+    if args.minute_bars:
+        kwargs['data_frequency'] = 'minute'
+    loaders = None
+    if args.earnings or args.fundamentals:
+        loaders = open_loaders(open_daily_bars(args.bars), args.earnings,
+                               args.fundamentals)
+    summary = run_sweep(
+        args.algofile, args.bars, dict(args.param),
+        processes=args.processes, minute_bars=args.minute_bars,
+        loaders=loaders,
+        output=args.output, start=args.start, end=args.end,
+        capital_base=args.capital_base, **kwargs
+    )
+    print(summary.to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Precompute universe masks for a bar store::
+
+    python -m backtest.universe --bars daily/ --output universes/
+
+Pass the output directory to ``python -m backtest --universes`` (or
+``universes=`` of `TradingAlgorithm`) and the screens it holds are read from
+the bitsets instead of being computed. See `backtest.pipeline.universe`.
+"""
+import argparse
+import logging
+import time
+
+from .pipeline.universe import DEFAULT_UNIVERSES, build_universe_masks
+from .store import open_daily_bars, write_universe_masks
+
+log = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest.universe')
+    parser.add_argument('--bars', required=True,
+                        help='daily bar store directory')
+    parser.add_argument('--output', required=True,
+                        help='universe mask store directory to write')
+    parser.add_argument('--only', action='append',
+                        choices=sorted(DEFAULT_UNIVERSES),
+                        help='build only these masks (repeatable)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    daily = open_daily_bars(args.bars)
+    names = args.only or sorted(DEFAULT_UNIVERSES)
+    started = time.time()
+    masks = build_universe_masks(
+        daily, dict((name, DEFAULT_UNIVERSES[name]) for name in names),
+    )
+    write_universe_masks(args.output, masks)
+    log.info("Wrote %d masks over %d sessions to %s in %.1fs", len(names),
+             len(daily.sessions), args.output, time.time() - started)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 
 from quantopian.algorithm import attach_pipeline, pipeline_output
+import quantopian.optimize as opt
 from quantopian.pipeline import Pipeline
 from quantopian.pipeline.classifiers.morningstar import Sector
 from quantopian.pipeline.data import morningstar as mstar
@@ -10,6 +11,75 @@ from quantopian.pipeline.factors import AverageDollarVolume, Returns, CustomFact
 from quantopian.pipeline.factors.eventvestor import BusinessDaysUntilNextEarnings
 from quantopian.pipeline.filters.morningstar import Q500US
 
+class HoldingRecord(object):
+    """
+    Names picked on each of the last few days, newest first, in a fixed ring of
+    `max_days_to_hold` slots. Rotating in a new day only touches the slots that
+    drop out, and a per-name count makes membership checks O(1).
+    """
+
+    def __init__(self, days_to_hold, max_days_to_hold):
+        self.days_to_hold = days_to_hold
+        self.slots = [()] * max(days_to_hold, max_days_to_hold)
+        self.head = 0
+        # Starts with `days_to_hold` empty days, like [[]] * days_to_hold did.
+        self.length = days_to_hold
+        self.filled_days = 0
+        self.size = 0
+        self.counts = {}
+
+    def __len__(self):
+        # Picks over all held days, counting a name once per day it was picked.
+        return self.size
+
+    def __contains__(self, asset):
+        return asset in self.counts
+
+    def push(self, picks):
+        """Add today's picks and drop the days that fall out of the window."""
+        capacity = len(self.slots)
+        self.head = (self.head - 1) % capacity
+        if self.length == capacity:
+            self._forget(self.slots[self.head])
+        else:
+            self.length += 1
+        self.slots[self.head] = tuple(picks)
+        self._remember(self.slots[self.head])
+        while self.length > self.days_to_hold and not self._oldest():
+            self._drop_oldest()
+        if self.filled_days > self.days_to_hold:
+            self._drop_oldest()
+
+    def weights(self, gross, max_in_one):
+        """Equal weight per distinct name, `gross` split over all picks and capped."""
+        if not self.size:
+            return pd.Series([], dtype=float)
+        return pd.Series(min(gross / self.size, max_in_one), index=list(self.counts))
+
+    def _oldest(self):
+        return self.slots[(self.head + self.length - 1) % len(self.slots)]
+
+    def _drop_oldest(self):
+        self._forget(self._oldest())
+        self.slots[(self.head + self.length - 1) % len(self.slots)] = ()
+        self.length -= 1
+
+    def _remember(self, picks):
+        for asset in picks:
+            self.counts[asset] = self.counts.get(asset, 0) + 1
+        self.size += len(picks)
+        self.filled_days += 1 if picks else 0
+
+    def _forget(self, picks):
+        for asset in picks:
+            if self.counts[asset] == 1:
+                del self.counts[asset]
+            else:
+                self.counts[asset] -= 1
+        self.size -= len(picks)
+        self.filled_days -= 1 if picks else 0
+
+
 def make_pipeline(context):
     adv = AverageDollarVolume(
         window_length=30,
@@ -34,8 +104,8 @@ def initialize(context):
     context.max_days_to_hold = 6
     context.max_in_one = 1
 
-    context.longs = [[]] * context.days_to_hold
-    context.shorts = [[]] * context.days_to_hold
+    context.longs = HoldingRecord(context.days_to_hold, context.max_days_to_hold)
+    context.shorts = HoldingRecord(context.days_to_hold, context.max_days_to_hold)
 
     attach_pipeline(make_pipeline(context), 'my_pipeline')
 
@@ -44,37 +114,20 @@ def initialize(context):
 def before_trading_start(context, data):
     context.output = pipeline_output('my_pipeline')
 
-    def update_record(record, new_item):
-        record.insert(0, new_item)
-        if len(record) > context.max_days_to_hold:
-            del(record[-1])
-        while len(record) > context.days_to_hold and len(record[-1]) == 0:
-            del(record[-1])
-        if sum(map(lambda l: 0 if len(l) == 0 else 1, record)) > context.days_to_hold:
-            del(record[-1])
-
-    update_record(context.longs, context.output.index[
+    context.longs.push(context.output.index[
         context.output['quantile_returns'] == 0
     ])
-    update_record(context.shorts, context.output.index[
+    context.shorts.push(context.output.index[
         context.output['quantile_returns'] ==
             context.returns_quantiles - 1
     ])
 
 def reversal(context, data):
-    long_list = [equity for sublist in context.longs for equity in sublist]
-    short_list = [equity for sublist in context.shorts for equity in sublist]
-
-    for equity in long_list:
-        if data.can_trade(equity):
-            order_target_percent(equity, min(0.5 / len(long_list), context.max_in_one))
-    for equity in short_list:
-        if data.can_trade(equity):
-            order_target_percent(equity, -min(0.5 / len(short_list), context.max_in_one))
-
-    for position in context.portfolio.positions:
-        if position not in long_list + short_list:
-            order_target_percent(position, 0)
+    # Long the bottom-quantile names and short the top-quantile names picked over
+    # the held days, in one batch. Anything else in the portfolio is closed.
+    weights = context.longs.weights(0.5, context.max_in_one).sub(
+        context.shorts.weights(0.5, context.max_in_one), fill_value=0)
+    order_optimal_portfolio(opt.TargetWeights(weights), constraints=[])
 
 def handle_data(context, data):
     pass
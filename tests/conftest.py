@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.assets import Equity
+from backtest.compat import install_quantopian_aliases
+from backtest.data import DailyBarReader, MinuteBarReader
+from backtest.finance import order as order_module
+
+
+def make_bars(n_assets=30, n_days=300, seed=0):
+    """Random-walk daily bars with a few missing values."""
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_assets)),
+                             axis=0)) * rng.uniform(5, 100, n_assets)
+    volume = rng.uniform(1e5, 1e6, (n_days, n_assets)).round()
+    missing = rng.random(close.shape) < 0.01
+    close[missing] = np.nan
+    volume[missing] = np.nan
+    sessions = pd.bdate_range('2012-01-02', periods=n_days)
+    equities = [Equity(sid, 'S%d' % sid) for sid in range(1, n_assets + 1)]
+    return DailyBarReader(sessions, equities, dict(
+        open=close, high=close * 1.01, low=close * 0.99, close=close,
+        volume=volume))
+
+
+def make_minutes(daily, n_sessions, seed=1):
+    """Minute bars wandering around the daily closes of `daily`."""
+    rng = np.random.default_rng(seed)
+    calendar = daily.calendar
+    minutes = pd.DatetimeIndex(np.concatenate([
+        calendar.minutes_for_session(i).values for i in range(n_sessions)
+    ]))
+    close = np.repeat(daily.field('close')[:n_sessions], 390, axis=0)
+    close = close[:len(minutes)] * np.exp(
+        rng.normal(0, 0.001, (len(minutes), daily.shape[1])))
+    volume = np.full(close.shape, 1e4)
+    return MinuteBarReader(minutes, dict(
+        open=close, high=close, low=close, close=close, volume=volume),
+        calendar)
+
+
+@pytest.fixture(autouse=True)
+def quantopian_aliases():
+    install_quantopian_aliases()
+    order_module.set_next_order_id(1)
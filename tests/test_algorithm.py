@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from backtest.algorithm import load_algorithm, run_algorithm
+from backtest.errors import DatesOutsideData, UnknownParameter
+
+from conftest import make_bars, make_minutes
+
+SCRIPT = '''
+WEIGHT = 0.5
+
+def initialize(context):
+    context.target = 0
+
+def handle_data(context, data):
+    order_target_percent(symbol('S%d' % (context.target + 1)), WEIGHT)
+    record(target=context.target, weight=WEIGHT)
+'''
+
+
+def test_params_override_globals_and_context():
+    bars = make_bars(n_days=40)
+    perf = run_algorithm(SCRIPT, bars, params={'WEIGHT': 0.25, 'target': 2})
+    assert (perf['weight'] == 0.25).all()
+    assert (perf['target'] == 2).all()
+
+
+def test_unknown_param_fails_the_run():
+    bars = make_bars(n_days=40)
+    with pytest.raises(UnknownParameter) as error:
+        run_algorithm(SCRIPT, bars, params={'WIEGHT': 0.25})
+    assert error.value.names == {'WIEGHT'}
+
+
+MINUTE_SCRIPT = '''
+def initialize(context):
+    context.asset = symbol('S1')
+
+def handle_data(context, data):
+    if not context.portfolio.positions:
+        order(context.asset, 100)
+    position = context.portfolio.positions[context.asset]
+    record(value=context.portfolio.portfolio_value,
+           expected=context.portfolio.cash
+           + position.amount * data.current(context.asset, 'price'))
+'''
+
+
+def test_minute_mode_marks_positions_intraday():
+    bars = make_bars(n_assets=3, n_days=5)
+    algo = load_algorithm(MINUTE_SCRIPT, bars, data_frequency='minute',
+                          minute_reader=make_minutes(bars, 3),
+                          end=bars.sessions[2], record_bars=True)
+    algo.run()
+    recorded = algo.recorder.bars_frame().pivot(
+        index='dt', columns='name', values='value')
+    assert len(recorded) == 3 * 390
+    np.testing.assert_allclose(recorded['value'], recorded['expected'],
+                               rtol=1e-12)
+
+
+@pytest.mark.parametrize('dates', [
+    {'start': '2030-01-01'},
+    {'end': '2000-01-01'},
+    {'start': '2012-03-01', 'end': '2012-02-01'},
+])
+def test_dates_outside_the_data(dates):
+    bars = make_bars(n_days=40)
+    with pytest.raises(ValueError) as error:
+        run_algorithm(SCRIPT, bars, **dates)
+    assert isinstance(error.value, DatesOutsideData)
+    assert '2012-01-02 to 2012-02-24' in str(error.value)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from backtest.analytics import PerformanceTracker, verify_tracker
+
+
+def returns(seed, n_days=300, missing=0.05):
+    rng = np.random.default_rng(seed)
+    benchmark = rng.normal(0.0004, 0.01, n_days)
+    # Fat tails, so large returns enter and leave the rolling window.
+    strategy = 0.8 * benchmark + 0.01 * rng.standard_t(3, n_days)
+    benchmark[rng.random(n_days) < missing] = np.nan
+    return strategy, benchmark
+
+
+@pytest.mark.parametrize('window', [2, 3, 5, 21, 126])
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_batch(window, seed):
+    strategy, benchmark = returns(seed)
+    verify_tracker(strategy, benchmark, window=window)
+
+
+def test_without_benchmark():
+    strategy, _ = returns(5)
+    verify_tracker(strategy, window=20)
+
+
+def test_nearly_flat_window():
+    # Consecutive returns that differ in the last few digits are where
+    # running sums of squares cancel.
+    strategy, benchmark = returns(6, n_days=60, missing=0.0)
+    strategy[20:30] = 0.001 + 1e-9 * np.arange(10)
+    benchmark[20:30] = 0.002 - 1e-9 * np.arange(10)
+    verify_tracker(strategy, benchmark, window=3)
+
+
+def test_detects_a_broken_tracker(monkeypatch):
+    strategy, benchmark = returns(7)
+    monkeypatch.setattr(PerformanceTracker, '_resum', lambda self: None)
+    with pytest.raises(AssertionError):
+        verify_tracker(strategy, benchmark, window=10)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from backtest.finance.blotter import verify_fill_models
+from backtest.finance.commission import PerDollar, PerShare, PerTrade
+from backtest.finance.slippage import FixedSlippage, VolumeShareSlippage
+
+SLIPPAGE = [
+    VolumeShareSlippage(),
+    VolumeShareSlippage(volume_limit=0.1, price_impact=0.5),
+    FixedSlippage(spread=0.02),
+]
+COMMISSION = [PerShare(), PerShare(min_trade_cost=0), PerTrade(cost=1.5),
+              PerDollar(cost=0.0015)]
+
+
+@pytest.mark.parametrize('commission', COMMISSION, ids=repr)
+@pytest.mark.parametrize('slippage', SLIPPAGE, ids=repr)
+@pytest.mark.parametrize('seed', [0, 1])
+def test_batched_fills_match(slippage, commission, seed):
+    assert verify_fill_models(slippage, commission, seed=seed) > 0
+
+
+class OffByOne(VolumeShareSlippage):
+
+    def process_orders(self, price, volume, open_amount, volume_before):
+        fill_price, amount = VolumeShareSlippage.process_orders(
+            self, price, volume, open_amount, volume_before)
+        return fill_price, np.where(amount > 1, amount - 1, amount)
+
+
+def test_detects_a_broken_model():
+    with pytest.raises(AssertionError):
+        verify_fill_models(OffByOne(), PerShare())
@@ -0,0 +1,67 @@
+import pytest
+
+from backtest.checkpoint import verify_resume
+
+from conftest import make_bars, make_minutes
+
+SCRIPT = '''
+from quantopian.algorithm import attach_pipeline, pipeline_output
+from quantopian.pipeline import Pipeline
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.factors import Returns, SimpleMovingAverage
+
+def initialize(context):
+    context.rebalances = 0
+    context.history = []
+    sma = SimpleMovingAverage(inputs=[USEquityPricing.close],
+                              window_length=10)
+    attach_pipeline(Pipeline({'sma': sma, 'returns': Returns(
+        window_length=5)}), 'signals')
+    schedule_function(rebalance, date_rules.week_start(),
+                      time_rules.market_open(minutes=30))
+
+def before_trading_start(context, data):
+    context.output = pipeline_output('signals').dropna()
+
+def rebalance(context, data):
+    context.rebalances += 1
+    ranked = context.output.sort_values('returns')
+    longs, shorts = ranked.index[-3:], ranked.index[:3]
+    for asset in context.portfolio.positions:
+        if asset not in longs and asset not in shorts:
+            order_target_percent(asset, 0)
+    for asset in longs:
+        order_target_percent(asset, 0.15)
+    for asset in shorts:
+        order_target_percent(asset, -0.1)
+    context.history.append(len(context.portfolio.positions))
+    record(rebalances=context.rebalances,
+           leverage=context.account.leverage)
+'''
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_resumed_run_matches(seed):
+    bars = make_bars(n_days=120, seed=seed)
+    assert verify_resume(SCRIPT, bars, bars.sessions[60]) > 0
+
+
+def test_minute_mode():
+    bars = make_bars(n_assets=10, n_days=45)
+    assert verify_resume(SCRIPT, bars, bars.sessions[25],
+                         data_frequency='minute',
+                         minute_reader=make_minutes(bars, 45)) > 0
+
+
+def test_detects_lost_state():
+    # Module globals are not part of a checkpoint, so a script that keeps
+    # its count in one resumes with the count reset.
+    bars = make_bars(n_days=80)
+    script = SCRIPT.replace(
+        'def rebalance(context, data):\n',
+        'REBALANCES = 0\n\ndef rebalance(context, data):\n'
+        '    global REBALANCES\n    REBALANCES += 1\n',
+    ).replace('record(rebalances=context.rebalances',
+              'record(rebalances=REBALANCES')
+    with pytest.raises(AssertionError):
+        verify_resume(script, bars, bars.sessions[40])
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.assets import Equity
+from backtest.compat import install_quantopian_aliases
+from backtest.data import DailyBarReader
+from backtest.pipeline import Pipeline
+from backtest.pipeline.cache import TermCache
+from backtest.pipeline.data.builtin import USEquityPricing
+from backtest.pipeline.engine import PipelineEngine
+from backtest.pipeline.rolling import verify_incremental
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+N_DAYS = 600
+N_ASSETS = 40
+
+
+def script_namespace(filename):
+    install_quantopian_aliases()
+    path = os.path.join(ROOT, filename)
+    with open(path) as f:
+        source = f.read()
+    namespace = {}
+    exec(compile(source, path, 'exec'), namespace)
+    return namespace
+
+
+def class_source(filename, name):
+    path = os.path.join(ROOT, filename)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    start = lines.index('class %s(CustomFactor):' % name)
+    stop = start + 1
+    while stop < len(lines) and (not lines[stop] or lines[stop][0] == ' '):
+        stop += 1
+    return '\n'.join(lines[start:stop]).rstrip()
+
+
+@pytest.fixture(scope='module')
+def momentum():
+    return script_namespace('cross-sectionalMomentum.py')[
+        'CrossSectionalMomentum']
+
+
+@pytest.mark.parametrize('filename', [
+    'Momentum+Filter.py',
+    'Oliver Guy - Algo Code.py',
+])
+def test_script_copies(filename):
+    # These scripts do not compile as a whole, so they are checked to carry
+    # the same CrossSectionalMomentum as cross-sectionalMomentum.py.
+    assert class_source(filename, 'CrossSectionalMomentum') == \
+        class_source('cross-sectionalMomentum.py', 'CrossSectionalMomentum')
+
+
+def closes(seed):
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (N_DAYS, N_ASSETS)),
+                             axis=0)) * rng.uniform(3, 100, N_ASSETS)
+    close[rng.random(close.shape) < 0.03] = np.nan
+    close[200:320, 5] = np.nan
+    return close
+
+
+def reader(seed):
+    close = closes(seed)
+    # Late listings and early delistings change the engine's universe.
+    close[:300, 0] = np.nan
+    close[:450, 1] = np.nan
+    close[380:, 2] = np.nan
+    volume = np.where(np.isnan(close), np.nan, 1e5)
+    sessions = pd.bdate_range('2012-01-02', periods=N_DAYS)
+    equities = [Equity(sid, 'S%d' % sid) for sid in range(1, N_ASSETS + 1)]
+    return DailyBarReader(sessions, equities, dict(
+        open=close, high=close, low=close, close=close, volume=volume))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_compute(momentum, seed):
+    rng = np.random.default_rng(seed)
+    masks = np.ones((N_DAYS, N_ASSETS), dtype=bool)
+    for day in sorted(rng.integers(0, N_DAYS, 6)):
+        masks[day:] = rng.random(N_ASSETS) > 0.2
+    term = momentum()
+    updates = verify_incremental(term, closes(seed), masks=masks)
+    # Most days roll forward with update; the mask changes force an init.
+    windows = N_DAYS - term.window_length + 1
+    assert windows - 7 <= updates < windows
+
+
+def test_full_universe(momentum):
+    term = momentum()
+    updates = verify_incremental(term, closes(3))
+    assert updates == N_DAYS - term.window_length
+
+
+def test_engine(momentum):
+    bars = reader(4)
+    engine = PipelineEngine(bars, cache=TermCache(max_bytes=0))
+    term = momentum()
+    calls = {'init': 0, 'update': 0}
+
+    def counted(name):
+        method = getattr(term, name)
+
+        def wrapper(*args):
+            calls[name] += 1
+            return method(*args)
+        return wrapper
+
+    term.init = counted('init')
+    term.update = counted('update')
+    pipeline = Pipeline({'momentum': term})
+    wl = term.window_length
+    sessions = list(range(wl + 1, N_DAYS))
+    # Skipped sessions must rebuild the state with init.
+    for gap in (300, 301, 302, 420, 500):
+        sessions.remove(gap)
+    reference = momentum()
+    expected_inits = 0
+    previous = None
+    for i in sessions:
+        got = engine.run_pipeline(pipeline, i)['momentum'].values
+        mask = engine.asset_exists(i)
+        if previous is None or previous[0] != i - 1 or \
+                not np.array_equal(previous[1], mask):
+            expected_inits += 1
+        previous = (i, mask)
+        window = engine._load_window(USEquityPricing.close, i - wl, i)
+        expected = reference._compute([window], bars.sessions[i],
+                                      engine.sids, mask)[mask]
+        np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-12)
+    # The first session, each gap and each listing or delisting.
+    assert expected_inits >= 6
+    assert calls['init'] == expected_inits
+    assert calls['update'] == len(sessions) - expected_inits
@@ -0,0 +1,93 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.pipeline.output import PipelineOutput
+
+N_ASSETS = 8
+
+
+@pytest.fixture
+def output():
+    values = {
+        'sma': np.arange(N_ASSETS, dtype=float),
+        'returns': np.linspace(-0.1, 0.1, N_ASSETS),
+        'longs': np.arange(N_ASSETS) % 2 == 0,
+    }
+    loaded = []
+
+    def load(name):
+        loaded.append(name)
+        return values[name]
+
+    rows = np.array([1, 2, 4, 5, 7])
+    index = pd.Index(['A%d' % row for row in rows])
+    out = PipelineOutput(index, rows, ['sma', 'returns', 'longs'], load)
+    expected = pd.DataFrame(dict((name, v[rows])
+                                 for name, v in values.items()),
+                            index=index, columns=['sma', 'returns', 'longs'])
+    return out, expected, loaded
+
+
+def test_metadata_is_free(output):
+    out, expected, loaded = output
+    assert out.index.equals(expected.index)
+    assert len(out) == len(expected)
+    assert 'sma' in out and 'missing' not in out
+    assert loaded == []
+
+
+def test_column_loads_only_that_column(output):
+    out, expected, loaded = output
+    pd.testing.assert_series_equal(out['returns'], expected['returns'])
+    assert loaded == ['returns']
+
+
+def test_boolean_mask_stays_lazy(output):
+    out, expected, loaded = output
+    mask = out['longs']
+    selected = out[mask]
+    assert isinstance(selected, PipelineOutput)
+    assert loaded == ['longs']
+    pd.testing.assert_series_equal(selected['sma'], expected[mask]['sma'])
+    assert loaded == ['longs', 'sma']
+    pd.testing.assert_frame_equal(out[mask.values], expected[mask.values],
+                                  check_frame_type=False)
+
+
+def test_attribute_access_materializes(output):
+    out, expected, loaded = output
+    pd.testing.assert_series_equal(out.sma, expected.sma)
+    assert sorted(loaded) == ['longs', 'returns', 'sma']
+    pd.testing.assert_frame_equal(out, expected, check_frame_type=False)
+
+
+def test_setitem(output):
+    out, expected, _ = output
+    out['score'] = out['sma'] * 2
+    expected['score'] = expected['sma'] * 2
+    pd.testing.assert_frame_equal(out, expected, check_frame_type=False)
+    out['sma'] = 0.0
+    assert (out['sma'] == 0.0).all()
+
+
+def test_eager_operations(output):
+    out, expected, _ = output
+    pd.testing.assert_frame_equal(out.loc[out.index[1:3]],
+                                  expected.loc[expected.index[1:3]],
+                                  check_frame_type=False)
+    np.testing.assert_array_equal(out[['sma', 'returns']].values,
+                                  expected[['sma', 'returns']].values)
+    assert repr(out) == repr(expected)
+
+
+def test_pickle(output):
+    out, expected, _ = output
+    selected = out[out['longs']]
+    restored = pickle.loads(pickle.dumps(selected))
+    pd.testing.assert_frame_equal(restored, expected[expected['longs']],
+                                  check_frame_type=False)
+    restored['extra'] = 1
+    assert 'extra' in restored
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from backtest.pipeline.data.builtin import USEquityPricing
+from backtest.pipeline.factors import (
+    AverageDollarVolume,
+    Returns,
+    SimpleMovingAverage,
+)
+from backtest.pipeline.rolling import verify_rolling_kernel
+
+N_DAYS = 400
+N_ASSETS = 30
+
+
+def bars(seed):
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (N_DAYS, N_ASSETS)),
+                             axis=0)) * rng.uniform(3, 100, N_ASSETS)
+    volume = rng.uniform(1e4, 1e6, (N_DAYS, N_ASSETS)).round()
+    missing = rng.random(close.shape) < 0.05
+    # Whole stretches of missing data as well as scattered holes, so some
+    # windows are entirely NaN for an asset.
+    missing[50:120, 3] = True
+    missing[:, 7] = True
+    close[missing] = np.nan
+    volume[missing] = np.nan
+    return close, volume
+
+
+def universe(seed):
+    rng = np.random.default_rng(seed)
+    masks = np.ones((N_DAYS, N_ASSETS), dtype=bool)
+    for day in sorted(rng.integers(0, N_DAYS, 8)):
+        masks[day:] = rng.random(N_ASSETS) > 0.2
+    return masks
+
+
+@pytest.mark.parametrize('window_length', [1, 2, 10, 63])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_simple_moving_average(window_length, seed):
+    close, _ = bars(seed)
+    term = SimpleMovingAverage(inputs=[USEquityPricing.close],
+                               window_length=window_length)
+    verify_rolling_kernel(term, close, masks=universe(seed))
+
+
+@pytest.mark.parametrize('window_length', [1, 2, 10, 63])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_average_dollar_volume(window_length, seed):
+    close, volume = bars(seed)
+    term = AverageDollarVolume(window_length=window_length)
+    verify_rolling_kernel(term, close, volume, masks=universe(seed))
+
+
+@pytest.mark.parametrize('window_length', [2, 10, 63])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_returns(window_length, seed):
+    close, _ = bars(seed)
+    term = Returns(window_length=window_length)
+    verify_rolling_kernel(term, close, masks=universe(seed))
+
+
+def test_unmasked():
+    close, volume = bars(2)
+    verify_rolling_kernel(AverageDollarVolume(window_length=20),
+                          close, volume)
+
+
+def test_crosses_resum_boundary():
+    # The kernels rebuild their sums every window_length updates; the
+    # verification must run through several rebuilds.
+    term = SimpleMovingAverage(inputs=[USEquityPricing.close],
+                               window_length=63)
+    assert (N_DAYS - term.window_length) // term.window_length >= 5
+    verify_rolling_kernel(term, bars(3)[0], masks=universe(3))
+
+
+def test_detects_a_broken_kernel():
+    close, _ = bars(4)
+    term = SimpleMovingAverage(inputs=[USEquityPricing.close],
+                               window_length=10)
+    kernel = term.rolling_kernel()
+    kernel._push = lambda rows, leaving: None
+    term.rolling_kernel = lambda: kernel
+    with pytest.raises(AssertionError):
+        verify_rolling_kernel(term, close)